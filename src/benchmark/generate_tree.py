@@ -0,0 +1,188 @@
+import argparse
+import json
+import os
+import random
+
+
+# Builds a synthetic source tree for benchmarking packageaware.py: a directory tree of
+# configurable size, depth and fan-out with ordinary source files in every directory and
+# manifests of every supported type sprinkled in at a configurable density.
+#
+# Usage: python generate_tree.py --root /tmp/bench-tree --dirs 5000 --depth 8 --manifest-density 0.05
+
+
+class BenchmarkTreeGenerator:
+
+    # One name per entry of PackageAware.MANIFEST_FILES
+    MANIFEST_NAMES = [
+        "Gemfile",
+        "requirements.txt",
+        "package.json",
+        "pom.xml",
+        "pipfile",
+        "Packages.config",
+        "Service.csproj",
+        "yarn.lock",
+        "package-lock.json",
+        "Pipfile.lock",
+        "poetry.lock",
+        "go.mod",
+        "Cargo.lock",
+        "build.gradle",
+        "build.gradle.kts"
+    ]
+
+    DEFAULT_DIRS = 2000
+    DEFAULT_DEPTH = 6
+    DEFAULT_FANOUT = 6
+    DEFAULT_FILES_PER_DIR = 8
+    DEFAULT_MANIFEST_DENSITY = 0.05
+    DEFAULT_MANIFEST_BYTES = 4096
+    DEFAULT_HIDDEN_DIRS = 10
+
+    def __init__(self, root, dirs=DEFAULT_DIRS, depth=DEFAULT_DEPTH, fanout=DEFAULT_FANOUT,
+                 files_per_dir=DEFAULT_FILES_PER_DIR, manifest_density=DEFAULT_MANIFEST_DENSITY,
+                 manifest_bytes=DEFAULT_MANIFEST_BYTES, hidden_dirs=DEFAULT_HIDDEN_DIRS, seed=0):
+
+        self.root = root
+        self.dirs = max(dirs, 1)
+        self.depth = max(depth, 1)
+        self.fanout = max(fanout, 1)
+        self.files_per_dir = max(files_per_dir, 0)
+        self.manifest_density = min(max(manifest_density, 0.0), 1.0)
+        self.manifest_bytes = max(manifest_bytes, 1)
+        self.hidden_dirs = max(hidden_dirs, 0)
+
+        # Same arguments, same tree
+        self.random = random.Random(seed)
+
+    def generate(self):
+
+        stats = {"root": self.root, "dirs": 0, "files": 0, "manifests": 0, "manifest_bytes": 0}
+
+        os.makedirs(self.root, exist_ok=True)
+
+        # Breadth first, so every level fills up before the tree gets deeper
+        pending_dirs = [(self.root, 0)]
+        created_dirs = []
+
+        while len(pending_dirs) > 0 and len(created_dirs) < self.dirs:
+
+            current_dir, current_depth = pending_dirs.pop(0)
+            created_dirs.append(current_dir)
+
+            if current_depth >= self.depth:
+                continue
+
+            for child in range(self.random.randint(1, self.fanout)):
+                if len(created_dirs) + len(pending_dirs) >= self.dirs:
+                    break
+
+                child_dir = os.path.join(current_dir, "module_" + str(current_depth) + "_" + str(child))
+                os.makedirs(child_dir, exist_ok=True)
+                pending_dirs.append((child_dir, current_depth + 1))
+
+        for current_dir, current_depth in pending_dirs:
+            created_dirs.append(current_dir)
+
+        for current_dir in created_dirs:
+
+            stats["dirs"] += 1
+
+            for file_number in range(self.files_per_dir):
+                self.write_file(os.path.join(current_dir, "source_" + str(file_number) + ".py"), b"pass\n")
+                stats["files"] += 1
+
+            if self.random.random() < self.manifest_density:
+                manifest_name = self.random.choice(BenchmarkTreeGenerator.MANIFEST_NAMES)
+                manifest_size = self.write_file(os.path.join(current_dir, manifest_name), self.manifest_content())
+
+                stats["files"] += 1
+                stats["manifests"] += 1
+                stats["manifest_bytes"] += manifest_size
+
+        # Hidden folders hold manifests the scan must skip
+        for hidden_number in range(self.hidden_dirs):
+            hidden_dir = os.path.join(self.random.choice(created_dirs), ".cache_" + str(hidden_number))
+            os.makedirs(hidden_dir, exist_ok=True)
+            self.write_file(os.path.join(hidden_dir, "package.json"), self.manifest_content())
+            stats["files"] += 1
+
+        return stats
+
+    def manifest_content(self):
+
+        lines = []
+        size = 0
+        dependency = 0
+
+        while size < self.manifest_bytes:
+            line = "dependency-" + str(dependency) + "==1." + str(self.random.randint(0, 99)) + ".0\n"
+            lines.append(line)
+            size += len(line)
+            dependency += 1
+
+        return "".join(lines).encode("utf-8")[:self.manifest_bytes]
+
+    @staticmethod
+    def write_file(path, content):
+
+        with open(path, "wb") as the_file:
+            the_file.write(content)
+
+        return len(content)
+
+    @staticmethod
+    def register_arguments(parser):
+
+        parser.add_argument("--dirs", dest="dirs", help="Number of directories. Default: " +
+                            str(BenchmarkTreeGenerator.DEFAULT_DIRS), type=int,
+                            default=BenchmarkTreeGenerator.DEFAULT_DIRS)
+        parser.add_argument("--depth", dest="depth", help="Maximum directory depth. Default: " +
+                            str(BenchmarkTreeGenerator.DEFAULT_DEPTH), type=int,
+                            default=BenchmarkTreeGenerator.DEFAULT_DEPTH)
+        parser.add_argument("--fanout", dest="fanout", help="Maximum sub-directories per directory. Default: " +
+                            str(BenchmarkTreeGenerator.DEFAULT_FANOUT), type=int,
+                            default=BenchmarkTreeGenerator.DEFAULT_FANOUT)
+        parser.add_argument("--files-per-dir", dest="files_per_dir",
+                            help="Non-manifest files per directory. Default: " +
+                                 str(BenchmarkTreeGenerator.DEFAULT_FILES_PER_DIR), type=int,
+                            default=BenchmarkTreeGenerator.DEFAULT_FILES_PER_DIR)
+        parser.add_argument("--manifest-density", dest="manifest_density",
+                            help="Fraction of directories holding a manifest. Default: " +
+                                 str(BenchmarkTreeGenerator.DEFAULT_MANIFEST_DENSITY), type=float,
+                            default=BenchmarkTreeGenerator.DEFAULT_MANIFEST_DENSITY)
+        parser.add_argument("--manifest-bytes", dest="manifest_bytes",
+                            help="Size of each manifest in bytes. Default: " +
+                                 str(BenchmarkTreeGenerator.DEFAULT_MANIFEST_BYTES), type=int,
+                            default=BenchmarkTreeGenerator.DEFAULT_MANIFEST_BYTES)
+        parser.add_argument("--hidden-dirs", dest="hidden_dirs",
+                            help="Hidden directories holding manifests that must be skipped. Default: " +
+                                 str(BenchmarkTreeGenerator.DEFAULT_HIDDEN_DIRS), type=int,
+                            default=BenchmarkTreeGenerator.DEFAULT_HIDDEN_DIRS)
+        parser.add_argument("--seed", dest="seed", help="Random seed. Default: 0", type=int, default=0)
+
+    @staticmethod
+    def from_arguments(root, args):
+        return BenchmarkTreeGenerator(
+            root,
+            dirs=args.dirs,
+            depth=args.depth,
+            fanout=args.fanout,
+            files_per_dir=args.files_per_dir,
+            manifest_density=args.manifest_density,
+            manifest_bytes=args.manifest_bytes,
+            hidden_dirs=args.hidden_dirs,
+            seed=args.seed
+        )
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic source tree for Package Aware benchmarks")
+    parser.add_argument("--root", dest="root", help="Directory to create the tree in", type=str, required=True)
+    BenchmarkTreeGenerator.register_arguments(parser)
+
+    args = parser.parse_args()
+
+    print(json.dumps(BenchmarkTreeGenerator.from_arguments(args.root, args).generate(), indent=2))
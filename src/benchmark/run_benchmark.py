@@ -0,0 +1,349 @@
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "cli"))
+
+from packageaware import (  # noqa: E402
+    PackageAware, PackageAwareApiClient, PackageAwareRetryPolicy, PackageAwareStructureAPI,
+    PackageAwareAnalysisStartAPI, PackageAwareModeOfOperation, PackageAwareOnFailure
+)
+
+from generate_tree import BenchmarkTreeGenerator  # noqa: E402
+
+
+# Measures packageaware.py against a synthetic tree and the local stub API:
+#   discovery      find_manifest_files over the tree (median of --repeat runs); with
+#                  --discovery-workers above 1 also the serial walk, for the speedup
+#   upload         send_manifests: wall time, manifests per second and MB per second
+#   result wait    wait_for_analysis_result (what analysis_result_exec exits with)
+#   end to end     run_analysis: structure -> manifests -> start -> result
+#
+# Usage: python run_benchmark.py --dirs 5000 --latency-ms 30 --upload-workers 8 --output result.json
+#        python run_benchmark.py --dirs 5000 --fs-latency-ms 2 --discovery-workers 16
+#        python run_benchmark.py ... --baseline result.json --max-regression 20
+# With --baseline the run exits with 1 when a timing is slower than the baseline by more
+# than --max-regression percent.
+
+
+class BenchmarkRunner:
+
+    STUB_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub_server.py")
+
+    # Timings compared against a baseline; lower is better
+    COMPARED_TIMINGS = ["discovery_seconds", "upload_seconds", "result_wait_seconds", "end_to_end_seconds"]
+
+    def __init__(self, args):
+        self.args = args
+        self.stub_process = None
+        self.base_uri = None
+
+    def start_stub(self):
+
+        self.stub_process = subprocess.Popen(
+            [
+                sys.executable, BenchmarkRunner.STUB_SERVER,
+                "--latency-ms", str(self.args.latency_ms),
+                "--jitter-ms", str(self.args.jitter_ms),
+                "--error-rate", str(self.args.error_rate),
+                "--analysis-seconds", str(self.args.analysis_seconds),
+                "--seed", str(self.args.seed)
+            ],
+            stdout=subprocess.PIPE
+        )
+
+        listening = self.stub_process.stdout.readline().decode("utf-8").split()
+        self.base_uri = "http://127.0.0.1:" + listening[1] + "/api/"
+
+    def stop_stub(self):
+
+        if self.stub_process is not None:
+            self.stub_process.terminate()
+            self.stub_process.wait()
+
+    def stub_stats(self):
+
+        with urllib.request.urlopen(self.base_uri.replace("/api/", "/stats")) as response:
+            return json.loads(response.read().decode("utf-8"))
+
+    def create_package_aware(self, tree_root):
+
+        package_aware = PackageAware()
+
+        package_aware.context.base_uri = self.base_uri
+        package_aware.context.source_code_path = tree_root
+        package_aware.context.project_name = "benchmark"
+        package_aware.context.client_id = "benchmark-client"
+        package_aware.context.api_key = "benchmark-key"
+
+        script = package_aware.script
+        script.mode = PackageAwareModeOfOperation.RUN_AND_WAIT
+        script.on_failure = PackageAwareOnFailure.FAIL_THE_BUILD
+        script.directories_to_exclude = []
+        script.files_to_exclude = []
+        script.upload_workers = self.args.upload_workers
+        package_aware.discovery_workers = self.args.discovery_workers
+        script.dedup_enabled = not self.args.no_dedup
+        script.analysis_result_max_wait = self.args.analysis_seconds + 60
+        script.analysis_result_polling_interval = self.args.polling_interval
+        script.analysis_result_initial_polling_interval = self.args.initial_polling_interval
+
+        package_aware.client = PackageAwareApiClient(
+            package_aware.context,
+            pool_size=max(PackageAwareApiClient.DEFAULT_POOL_SIZE, self.args.upload_workers),
+            retry_policy=PackageAwareRetryPolicy()
+        )
+
+        return package_aware
+
+    @contextlib.contextmanager
+    def file_system_latency(self):
+
+        # Stands in for a network mount: every directory listing waits --fs-latency-ms first
+        if self.args.fs_latency_ms <= 0:
+            yield
+            return
+
+        scan_directory = PackageAware.scan_directory
+
+        def slow_scan_directory(current_dir):
+            time.sleep(self.args.fs_latency_ms / 1000.0)
+            return scan_directory(current_dir)
+
+        PackageAware.scan_directory = staticmethod(slow_scan_directory)
+        try:
+            yield
+        finally:
+            PackageAware.scan_directory = staticmethod(scan_directory)
+
+    def time_discovery(self, package_aware):
+
+        # Median seconds of --repeat discoveries, every time, and the manifests found
+        discovery_times = []
+
+        with self.file_system_latency():
+            for repeat in range(max(self.args.repeat, 1)):
+                start_time = time.perf_counter()
+                manifest_files = package_aware.find_manifest_files([], [])
+                discovery_times.append(time.perf_counter() - start_time)
+
+        return statistics.median(discovery_times), discovery_times, manifest_files
+
+    def console(self):
+
+        # The script logs every request; keep that out of the report unless asked for
+        if self.args.verbose:
+            return contextlib.redirect_stdout(sys.stderr)
+
+        return contextlib.redirect_stdout(open(os.devnull, "w"))
+
+    def run(self, tree_root):
+
+        results = {"tree": {"root": tree_root}}
+
+        package_aware = self.create_package_aware(tree_root)
+
+        try:
+            with self.console():
+
+                discovery_seconds, discovery_times, manifest_files = self.time_discovery(package_aware)
+
+                if package_aware.discovery_workers > 1:
+                    package_aware.discovery_workers = 1
+                    serial_seconds, serial_times, serial_manifest_files = self.time_discovery(package_aware)
+                    package_aware.discovery_workers = self.args.discovery_workers
+
+                    results["discovery_serial_seconds"] = serial_seconds
+                    results["discovery_speedup"] = serial_seconds / discovery_seconds if discovery_seconds > 0 else None
+                    results["discovery_matches_serial"] = serial_manifest_files == manifest_files
+
+                manifest_bytes = sum(os.path.getsize(m['path']) for m in manifest_files)
+
+                structure_response = PackageAwareStructureAPI.exec(package_aware.context, package_aware.client)
+
+                start_time = time.perf_counter()
+                uploaded_count = package_aware.send_manifests(
+                    structure_response.project_id, structure_response.analysis_id, [], [],
+                    self.args.upload_workers
+                )
+                upload_seconds = time.perf_counter() - start_time
+
+                PackageAwareAnalysisStartAPI.exec(
+                    package_aware.context, package_aware.client,
+                    structure_response.project_id, structure_response.analysis_id
+                )
+
+                start_time = time.perf_counter()
+                result_exit_code = package_aware.wait_for_analysis_result(
+                    structure_response.report_status_url,
+                    package_aware.script.analysis_result_max_wait,
+                    package_aware.script.analysis_result_polling_interval,
+                    package_aware.script.analysis_result_initial_polling_interval
+                )
+                result_wait_seconds = time.perf_counter() - start_time
+
+                start_time = time.perf_counter()
+                end_to_end_exit_code = package_aware.run_analysis()
+                end_to_end_seconds = time.perf_counter() - start_time
+
+        finally:
+            package_aware.client.close()
+
+        results["tree"]["manifests"] = len(manifest_files)
+        results["tree"]["manifest_bytes"] = manifest_bytes
+
+        results["discovery_workers"] = self.args.discovery_workers
+        results["discovery_seconds"] = discovery_seconds
+        results["discovery_seconds_all"] = discovery_times
+
+        results["uploaded_manifests"] = uploaded_count
+        results["upload_seconds"] = upload_seconds
+        results["upload_manifests_per_second"] = uploaded_count / upload_seconds if upload_seconds > 0 else None
+        results["upload_megabytes_per_second"] = \
+            manifest_bytes / 1024.0 / 1024.0 / upload_seconds if upload_seconds > 0 else None
+
+        results["result_wait_seconds"] = result_wait_seconds
+        results["result_exit_code"] = result_exit_code
+
+        results["end_to_end_seconds"] = end_to_end_seconds
+        results["end_to_end_exit_code"] = end_to_end_exit_code
+
+        results["stub"] = self.stub_stats()
+
+        return results
+
+    @staticmethod
+    def compare(results, baseline, max_regression):
+
+        regressions = []
+
+        for timing in BenchmarkRunner.COMPARED_TIMINGS:
+
+            if baseline.get(timing) is None or results.get(timing) is None or baseline[timing] <= 0:
+                continue
+
+            change = (results[timing] - baseline[timing]) / baseline[timing] * 100.0
+
+            print("  %-22s %10.3fs  baseline %10.3fs  %+7.1f%%" % (timing, results[timing], baseline[timing], change))
+
+            if change > max_regression:
+                regressions.append(timing)
+
+        return regressions
+
+    @staticmethod
+    def print_report(results):
+
+        print("Manifests:           %d (%d bytes)" % (results["tree"]["manifests"], results["tree"]["manifest_bytes"]))
+        print("Discovery:           %.3fs (median of %d, %d workers)" % (
+            results["discovery_seconds"], len(results["discovery_seconds_all"]), results["discovery_workers"]
+        ))
+        if results.get("discovery_serial_seconds") is not None:
+            print("Serial discovery:    %.3fs, %.1fx speedup, %s" % (
+                results["discovery_serial_seconds"], results["discovery_speedup"] or 0,
+                "same manifests" if results["discovery_matches_serial"] else "MANIFESTS DIFFER"
+            ))
+        print("Upload:              %.3fs for %d manifests, %.1f manifests/s, %.2f MB/s" % (
+            results["upload_seconds"], results["uploaded_manifests"],
+            results["upload_manifests_per_second"] or 0, results["upload_megabytes_per_second"] or 0
+        ))
+        print("Result wait:         %.3fs (exit code %d)" % (results["result_wait_seconds"], results["result_exit_code"]))
+        print("End to end:          %.3fs (exit code %d)" % (results["end_to_end_seconds"], results["end_to_end_exit_code"]))
+        print("Stub requests:       " + json.dumps(results["stub"]["requests"], sort_keys=True))
+        print("Stub status codes:   " + json.dumps(results["stub"]["status_codes"], sort_keys=True))
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark packageaware.py against a synthetic tree and stub API")
+
+    parser.add_argument("--tree", dest="tree",
+                        help="Existing source tree to benchmark. Default: generate one in a temporary directory",
+                        type=str, default=None)
+    BenchmarkTreeGenerator.register_arguments(parser)
+
+    parser.add_argument("--latency-ms", dest="latency_ms", help="Stub latency per request. Default: 20",
+                        type=float, default=20.0)
+    parser.add_argument("--jitter-ms", dest="jitter_ms", help="Stub latency jitter. Default: 5",
+                        type=float, default=5.0)
+    parser.add_argument("--error-rate", dest="error_rate", help="Fraction of stub requests failing with 503. "
+                        "Default: 0", type=float, default=0.0)
+    parser.add_argument("--analysis-seconds", dest="analysis_seconds",
+                        help="Seconds a stub analysis runs. Default: 2", type=float, default=2.0)
+
+    parser.add_argument("--upload-workers", dest="upload_workers", help="Concurrent uploads. Default: 1",
+                        type=int, default=1)
+    parser.add_argument("--discovery-workers", dest="discovery_workers",
+                        help="Directories listed concurrently during discovery. Default: 1", type=int, default=1)
+    parser.add_argument("--fs-latency-ms", dest="fs_latency_ms",
+                        help="Added latency per directory listing, as on a network file system. Default: 0",
+                        type=float, default=0.0)
+    parser.add_argument("--no-dedup", dest="no_dedup", help="Upload every copy of identical manifests",
+                        action="store_true")
+    parser.add_argument("--polling-interval", dest="polling_interval",
+                        help="Maximum analysis result polling interval in seconds. Default: 1",
+                        type=float, default=1.0)
+    parser.add_argument("--initial-polling-interval", dest="initial_polling_interval",
+                        help="First analysis result polling interval in seconds. Default: 0.25",
+                        type=float, default=0.25)
+    parser.add_argument("--repeat", dest="repeat", help="Discovery runs to take the median of. Default: 3",
+                        type=int, default=3)
+
+    parser.add_argument("--output", dest="output", help="Write the results as JSON to this file",
+                        type=str, default=None)
+    parser.add_argument("--baseline", dest="baseline", help="Results JSON of an earlier run to compare against",
+                        type=str, default=None)
+    parser.add_argument("--max-regression", dest="max_regression",
+                        help="Percent a timing may exceed the baseline before the run fails. Default: 20",
+                        type=float, default=20.0)
+    parser.add_argument("--verbose", dest="verbose", help="Show the script's own log on stderr",
+                        action="store_true")
+
+    args = parser.parse_args()
+
+    generated_root = None
+    tree_root = args.tree
+
+    if tree_root is None:
+        generated_root = tempfile.mkdtemp(prefix="packageaware-benchmark-")
+        tree_root = os.path.join(generated_root, "tree")
+        print("Generating tree: " + json.dumps(BenchmarkTreeGenerator.from_arguments(tree_root, args).generate()))
+
+    runner = BenchmarkRunner(args)
+
+    try:
+        runner.start_stub()
+        benchmark_results = runner.run(tree_root)
+    finally:
+        runner.stop_stub()
+        if generated_root is not None:
+            shutil.rmtree(generated_root)
+
+    BenchmarkRunner.print_report(benchmark_results)
+
+    if args.output is not None:
+        with open(args.output, "w") as the_file:
+            the_file.write(json.dumps(benchmark_results, indent=2))
+
+    if args.baseline is not None:
+
+        with open(args.baseline, "r") as the_file:
+            baseline_results = json.loads(the_file.read())
+
+        print("Compared to " + args.baseline + ":")
+
+        regressed = BenchmarkRunner.compare(benchmark_results, baseline_results, args.max_regression)
+
+        if len(regressed) > 0:
+            print("REGRESSION: " + ", ".join(regressed))
+            sys.exit(1)
+
+    sys.exit(0)
@@ -0,0 +1,263 @@
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+
+# A local stand-in for the Package Aware API with configurable latency and error rates.
+# Implements the endpoints called by PackageAwareStructureAPI, PackageAwareManifestAPI,
+# PackageAwareAnalysisStartAPI and PackageAwareAnalysisResultAPI, plus GET /stats with
+# request counters.
+#
+# Usage: python stub_server.py --port 8765 --latency-ms 40 --error-rate 0.01 --analysis-seconds 5
+# --fail-first N answers the first N API requests with 503, --failing-projects names the
+# projects whose analyses finish with violations: tests use them for deterministic failures.
+# The first line written to stdout is "LISTENING <port>".
+
+
+class BenchmarkStubState:
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, retry_after=0, analysis_seconds=0.0,
+                 seed=0, fail_first=0, failing_projects=None):
+
+        self.latency_ms = max(latency_ms, 0.0)
+        self.jitter_ms = max(jitter_ms, 0.0)
+        self.error_rate = min(max(error_rate, 0.0), 1.0)
+        self.retry_after = retry_after
+        self.analysis_seconds = max(analysis_seconds, 0.0)
+        self.fail_first = max(fail_first, 0)
+        self.failing_projects = set(failing_projects or [])
+
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+        self.analysis_count = 0
+        self.analysis_started_at = {}
+        self.analysis_projects = {}
+
+        self.stats = {
+            "requests": {},
+            "status_codes": {},
+            "errors_injected": 0,
+            "manifest_bytes": 0
+        }
+
+    def delay(self):
+
+        with self.lock:
+            delay_ms = self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms)
+            inject_error = self.random.random() < self.error_rate
+
+            if self.fail_first > 0:
+                self.fail_first -= 1
+                inject_error = True
+
+        time.sleep(max(delay_ms, 0.0) / 1000.0)
+
+        return inject_error
+
+    def count(self, endpoint, status_code, manifest_bytes=0):
+
+        with self.lock:
+            self.stats["requests"][endpoint] = self.stats["requests"].get(endpoint, 0) + 1
+            self.stats["status_codes"][str(status_code)] = self.stats["status_codes"].get(str(status_code), 0) + 1
+            self.stats["manifest_bytes"] += manifest_bytes
+
+            if status_code == 503:
+                self.stats["errors_injected"] += 1
+
+    def create_analysis(self, project_name=None):
+
+        with self.lock:
+            self.analysis_count += 1
+            analysis_id = "analysis-" + str(self.analysis_count)
+            self.analysis_projects[analysis_id] = project_name
+            return analysis_id
+
+    def start_analysis(self, analysis_id):
+
+        with self.lock:
+            self.analysis_started_at[analysis_id] = time.time()
+
+    def analysis_status(self, analysis_id):
+
+        with self.lock:
+            started_at = self.analysis_started_at.get(analysis_id)
+            project_name = self.analysis_projects.get(analysis_id)
+
+        if started_at is None:
+            return "pending"
+
+        if time.time() - started_at < self.analysis_seconds:
+            return "running"
+
+        if project_name in self.failing_projects:
+            return "failed_violations"
+
+        return "finished"
+
+
+class BenchmarkStubHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+
+    STRUCTURE_PATH = re.compile(r".*/clients/[^/]+/analysis/structure$")
+    MANIFEST_PATH = re.compile(r".*/clients/[^/]+/projects/[^/]+/analysis/[^/]+/manifests/[^/]+$")
+    START_PATH = re.compile(r".*/clients/[^/]+/projects/[^/]+/analysis/(?P<analysis_id>[^/]+)$")
+    STATUS_PATH = re.compile(r".*/status/(?P<analysis_id>[^/]+)$")
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def send(self, endpoint, status_code, content_object=None, headers=None, manifest_bytes=0):
+
+        body = json.dumps(content_object).encode("utf-8") if content_object is not None else b""
+
+        self.send_response(status_code)
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+        self.server.state.count(endpoint, status_code, manifest_bytes)
+
+    def send_injected_error(self, endpoint):
+        self.send(endpoint, 503, {"error": "injected"}, {"Retry-After": str(self.server.state.retry_after)})
+
+    def do_POST(self):
+
+        body = self.read_body()
+
+        if BenchmarkStubHandler.STRUCTURE_PATH.match(self.path) is None:
+            return self.send("unknown", 404)
+
+        if self.server.state.delay():
+            return self.send_injected_error("structure")
+
+        try:
+            project_name = json.loads(body.decode("utf-8")).get("project")
+        except ValueError:
+            project_name = None
+
+        analysis_id = self.server.state.create_analysis(project_name)
+        base_uri = "http://" + self.headers.get("Host", "127.0.0.1") + "/"
+
+        self.send("structure", 201, {
+            "Id": analysis_id,
+            "projectId": "benchmark-project",
+            "reportUrl": base_uri + "report/" + analysis_id,
+            "embedUrl": base_uri + "embed/" + analysis_id,
+            "reportStatusUrl": base_uri + "status/" + analysis_id
+        })
+
+    def do_PUT(self):
+
+        body = self.read_body()
+
+        if BenchmarkStubHandler.MANIFEST_PATH.match(self.path) is not None:
+            endpoint = "manifest"
+        elif BenchmarkStubHandler.START_PATH.match(self.path) is not None:
+            endpoint = "start"
+        else:
+            return self.send("unknown", 404)
+
+        if self.server.state.delay():
+            return self.send_injected_error(endpoint)
+
+        if endpoint == "start":
+            self.server.state.start_analysis(BenchmarkStubHandler.START_PATH.match(self.path).group("analysis_id"))
+            return self.send(endpoint, 200, {})
+
+        self.send(endpoint, 200, {}, manifest_bytes=len(body))
+
+    def do_GET(self):
+
+        if self.path == "/stats":
+            with self.server.state.lock:
+                stats = json.loads(json.dumps(self.server.state.stats))
+            body = json.dumps(stats).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        status_match = BenchmarkStubHandler.STATUS_PATH.match(self.path)
+        if status_match is None:
+            return self.send("unknown", 404)
+
+        if self.server.state.delay():
+            return self.send_injected_error("status")
+
+        analysis_status = self.server.state.analysis_status(status_match.group("analysis_id"))
+        etag = '"' + analysis_status + '"'
+
+        if self.headers.get("If-None-Match") == etag:
+            return self.send("status", 304, None, {"ETag": etag})
+
+        self.send("status", 200, {"status": analysis_status}, {"ETag": etag})
+
+
+class BenchmarkStubServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, port, state):
+        HTTPServer.__init__(self, ("127.0.0.1", port), BenchmarkStubHandler)
+        self.state = state
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Local stub of the Package Aware API for benchmarks")
+    parser.add_argument("--port", dest="port", help="Port to listen on, 0 for any free port. Default: 0",
+                        type=int, default=0)
+    parser.add_argument("--latency-ms", dest="latency_ms", help="Mean added latency per request. Default: 0",
+                        type=float, default=0.0)
+    parser.add_argument("--jitter-ms", dest="jitter_ms", help="Latency varies by up to this much. Default: 0",
+                        type=float, default=0.0)
+    parser.add_argument("--error-rate", dest="error_rate",
+                        help="Fraction of requests answered with 503. Default: 0", type=float, default=0.0)
+    parser.add_argument("--retry-after", dest="retry_after",
+                        help="Retry-After seconds sent with injected 503s. Default: 0", type=int, default=0)
+    parser.add_argument("--analysis-seconds", dest="analysis_seconds",
+                        help="Seconds an analysis runs before it reports finished. Default: 0",
+                        type=float, default=0.0)
+    parser.add_argument("--seed", dest="seed", help="Random seed. Default: 0", type=int, default=0)
+    parser.add_argument("--fail-first", dest="fail_first",
+                        help="Answer the first N API requests with 503. Default: 0", type=int, default=0)
+    parser.add_argument("--failing-projects", dest="failing_projects",
+                        help="Comma separated projects whose analyses finish with violations. Default: none",
+                        default="")
+
+    args = parser.parse_args()
+
+    server = BenchmarkStubServer(args.port, BenchmarkStubState(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+        analysis_seconds=args.analysis_seconds,
+        seed=args.seed,
+        fail_first=args.fail_first,
+        failing_projects=[p.strip() for p in args.failing_projects.split(",") if len(p.strip()) > 0]
+    ))
+
+    print("LISTENING " + str(server.server_address[1]))
+    sys.stdout.flush()
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -1,12 +1,23 @@
-import requests
 import json
 from datetime import datetime
 import sys
-import glob
 import fnmatch
+import glob
 import os
 import argparse
+import atexit
+import copy
 import time
+import threading
+import hashlib
+import mmap
+import re
+import gzip
+import random
+import shutil
+import subprocess
+import concurrent.futures
+import importlib.util
 
 import urllib.parse
 import platform
@@ -14,556 +25,5448 @@ import platform
 from pathlib import Path  # User Home Folder references
 
 
-class PackageAwareStructureAPIResponse:
+class PackageAwareImports:
 
-    def __init__(self, structure_response):
+    # Third-party modules are imported the first time they are needed, not at start-up:
+    # requests and aiohttp alone take longer to import than a dry run takes to finish.
+    # Python keeps imported modules in sys.modules, so repeated calls cost a dict lookup.
 
-        self.original_response = structure_response
+    @staticmethod
+    def is_available(module_name):
+        # Finds the module without importing it
+        return importlib.util.find_spec(module_name) is not None
 
-        self.content_object = None
+    @staticmethod
+    def requests():
+        import requests
+        import requests.adapters
+        return requests
 
-        self.structure_id = None
-        self.project_id = None
-        self.analysis_id = None
-        self.report_url = None
-        self.embed_url = None
-        self.report_status_url = None
+    @staticmethod
+    def zstandard():
+        # Optional: zstd compression of manifest request bodies
+        try:
+            import zstandard
+        except ImportError:
+            return None
 
-        if self.original_response is not None:
+        return zstandard
 
-            self.content_object = json.loads(self.original_response.content)
+    @staticmethod
+    def aiohttp():
+        # Optional: asyncio execution engine (--engine asyncio), see requirements-asyncio.txt
+        import aiohttp
+        return aiohttp
 
-            self.structure_id = self.content_object["Id"]
-            self.project_id = self.content_object["projectId"]
-            self.analysis_id = self.content_object["Id"]
-            self.report_url = self.content_object["reportUrl"]
-            self.embed_url = self.content_object["embedUrl"]
-            self.report_status_url = self.content_object["reportStatusUrl"]
+    @staticmethod
+    def yarl():
+        import yarl
+        return yarl
+
+
+class PackageAwareLog:
+
+    # Leveled, buffered console output. Lines are collected in memory and written in blocks
+    # (every FLUSH_INTERVAL_SECONDS, every FLUSH_LINES lines and for every warning or error)
+    # instead of one unbuffered print per event. In summary mode, per-file events below
+    # WARNING are only counted and reported as totals when the run ends.
+
+    DEBUG = 10
+    INFO = 20
+    WARNING = 30
+    ERROR = 40
+
+    LEVEL_NAMES = {DEBUG: "debug", INFO: "info", WARNING: "warning", ERROR: "error"}
+    LEVELS_BY_NAME = dict((name, level) for level, name in LEVEL_NAMES.items())
+
+    FORMAT_TEXT = "text"
+    FORMAT_JSONL = "jsonl"
+
+    FLUSH_LINES = 500
+    FLUSH_INTERVAL_SECONDS = 1.0
+
+    # Per-file events, in the order their totals are reported
+    EVENT_LABELS = [
+        ("manifest_found", "manifests found"),
+        ("directory_excluded", "directories excluded"),
+        ("file_excluded", "files excluded"),
+        ("manifest_put", "manifest requests sent"),
+        ("manifest_put_executed", "manifest requests completed"),
+        ("manifest_ref_rejected", "manifest references rejected"),
+        ("manifest_added", "manifests added"),
+        ("manifest_empty", "empty manifests"),
+        ("manifest_failed", "manifests failed")
+    ]
 
+    def __init__(self):
 
-class PackageAwareStructureAPI:
+        self.level = PackageAwareLog.INFO
+        self.log_format = PackageAwareLog.FORMAT_TEXT
+        self.summarize_events = False
 
-    API_RETRY_COUNT = 3
+        self.stream = None
 
-    URI_TEMPLATE = "{pa_base_uri}clients/{pa_client_id}/analysis/structure"
+        self.buffer = []
+        self.event_counts = {}
+        self.last_flush_time = time.time()
+
+        self.flush_thread = None
+
+        self.lock = threading.Lock()
+
+    def configure(self, level=INFO, log_format=FORMAT_TEXT, summarize_events=False):
+        self.level = level
+        self.log_format = log_format
+        self.summarize_events = summarize_events
+
+    def redirect(self, stream):
+
+        # Lines logged from now on go to stream (None: sys.stdout), event totals start over
+        with self.lock:
+            self.write_buffer()
+            self.stream = stream
+            self.event_counts = {}
+
+    def log(self, message, level=INFO, event=None):
+
+        if level < self.level:
+            return
+
+        with self.lock:
+
+            if event is not None:
+                self.event_counts[event] = self.event_counts.get(event, 0) + 1
+
+                if self.summarize_events and level < PackageAwareLog.WARNING:
+                    return
+
+            self.buffer.append((time.time(), level, message, event))
+
+            if level >= PackageAwareLog.WARNING or len(self.buffer) >= PackageAwareLog.FLUSH_LINES or \
+                    time.time() - self.last_flush_time >= PackageAwareLog.FLUSH_INTERVAL_SECONDS:
+                self.write_buffer()
+
+            if self.flush_thread is None:
+                # Keeps lines flowing while the run waits (polling, retries) without logging
+                self.flush_thread = threading.Thread(target=self.flush_periodically, daemon=True)
+                self.flush_thread.start()
+
+    def flush_periodically(self):
+
+        while True:
+            time.sleep(PackageAwareLog.FLUSH_INTERVAL_SECONDS)
+            self.flush()
+
+    def flush(self):
+
+        with self.lock:
+            self.write_buffer()
+
+    def format_line(self, log_time, level, message, event):
+
+        if self.log_format == PackageAwareLog.FORMAT_JSONL:
+            line = {
+                "time": datetime.utcfromtimestamp(log_time).isoformat() + "Z",
+                "level": PackageAwareLog.LEVEL_NAMES.get(level, str(level)),
+                "message": message
+            }
+            if event is not None:
+                line["event"] = event
+            return json.dumps(line)
+
+        return str(datetime.utcfromtimestamp(log_time)) + " PACKAGE AWARE: " + message
+
+    def write_buffer(self):
+
+        # Caller holds the lock
+        self.last_flush_time = time.time()
+
+        if len(self.buffer) == 0:
+            return
+
+        lines = [self.format_line(*entry) for entry in self.buffer]
+        self.buffer = []
+
+        # sys.stdout is looked up on every write so redirected output is honoured
+        stream = self.stream or sys.stdout
+        stream.write("\n".join(lines) + "\n")
+        stream.flush()
+
+    def close(self):
+
+        # Totals of the counted events, then everything still buffered
+        if self.summarize_events:
+            with self.lock:
+                event_counts = dict(self.event_counts)
+
+            totals = [
+                str(event_counts[event]) + " " + label
+                for event, label in PackageAwareLog.EVENT_LABELS if event_counts.get(event, 0) > 0
+            ]
+
+            if len(totals) > 0:
+                self.log("Summary: " + ", ".join(totals), max(self.level, PackageAwareLog.INFO))
+
+        self.flush()
+
+
+class PackageAwareMetrics:
+
+    # Timings and counters of one run: time per phase, calls / attempts / retries / latency
+    # and a status code histogram per API, bytes on the wire and manifest outcomes.
+    # Exported as JSON and / or a Prometheus textfile into the workspace folder.
+
+    FORMAT_NONE = "none"
+    FORMAT_JSON = "json"
+    FORMAT_PROMETHEUS = "prometheus"
+    FORMAT_ALL = "all"
+
+    JSON_FILE_NAME = "package_aware_metrics.json"
+    PROMETHEUS_FILE_NAME = "package_aware_metrics.prom"
 
     def __init__(self):
-        pass
+
+        self.start_time = time.perf_counter()
+
+        self.phases = {}
+        self.apis = {}
+        self.bytes = {"manifest_read": 0, "request_sent": 0, "response_received": 0}
+        self.manifests = {"found": 0, "uploaded": 0, "referenced": 0, "deduplicated": 0, "empty": 0, "failed": 0}
+        self.rate_limit = {"waits": 0, "wait_seconds": 0.0}
+
+        self.lock = threading.Lock()
+
+    def phase(self, name):
+        return PackageAwareMetricsPhase(self, name)
+
+    def record_phase(self, name, seconds):
+
+        with self.lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def api(self, api_name):
+
+        # Caller holds the lock
+        if api_name not in self.apis:
+            self.apis[api_name] = {"calls": 0, "attempts": 0, "retries": 0, "retry_wait_seconds": 0.0,
+                                   "seconds": 0.0, "status_codes": {}}
+
+        return self.apis[api_name]
+
+    def record_call(self, api_name):
+
+        with self.lock:
+            self.api(api_name)["calls"] += 1
+
+    def record_attempt(self, api_name, response, seconds):
+
+        status = str(response.status_code) if response is not None else "error"
+
+        with self.lock:
+            api_metrics = self.api(api_name)
+            api_metrics["attempts"] += 1
+            api_metrics["seconds"] += seconds
+            api_metrics["status_codes"][status] = api_metrics["status_codes"].get(status, 0) + 1
+
+    def record_retry(self, api_name, delay):
+
+        with self.lock:
+            api_metrics = self.api(api_name)
+            api_metrics["retries"] += 1
+            api_metrics["retry_wait_seconds"] += delay
+
+    def record_bytes(self, request_sent, response_received):
+
+        with self.lock:
+            self.bytes["request_sent"] += request_sent
+            self.bytes["response_received"] += response_received
+
+    def record_rate_limit_wait(self, seconds):
+
+        with self.lock:
+            self.rate_limit["waits"] += 1
+            self.rate_limit["wait_seconds"] += seconds
+
+    def record_manifest(self, result):
+
+        with self.lock:
+            self.manifests["found"] += 1
+            self.bytes["manifest_read"] += result.get('size', 0)
+
+            if result['empty']:
+                self.manifests["empty"] += 1
+            elif result['error'] is not None or result['response'] is None or \
+                    not 200 <= result['response'].status_code < 300:
+                self.manifests["failed"] += 1
+            elif result.get('duplicate'):
+                self.manifests["deduplicated"] += 1
+            elif result['cached']:
+                self.manifests["referenced"] += 1
+            else:
+                self.manifests["uploaded"] += 1
+
+    def summary(self, project_name=None, exit_code=None):
+
+        with self.lock:
+            return json.loads(json.dumps({
+                "project_name": project_name,
+                "exit_code": exit_code,
+                "run_seconds": time.perf_counter() - self.start_time,
+                "phases": self.phases,
+                "apis": self.apis,
+                "bytes": self.bytes,
+                "manifests": self.manifests,
+                "rate_limit": self.rate_limit
+            }))
 
     @staticmethod
-    def generate_api_url(pa_context):
-        url = PackageAwareStructureAPI.URI_TEMPLATE
-        url = url.replace("{pa_base_uri}", pa_context.base_uri)
-        url = url.replace("{pa_client_id}", pa_context.client_id)
+    def prometheus_text(summary):
 
-        return url
+        def label(value):
+            return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+        project = 'project="' + label(summary["project_name"] or "") + '"'
+
+        lines = []
+
+        def metric(name, metric_type, help_text, samples):
+            lines.append("# HELP " + name + " " + help_text)
+            lines.append("# TYPE " + name + " " + metric_type)
+            for labels, value in samples:
+                lines.append(name + "{" + ",".join([project] + labels) + "} " + repr(float(value)))
+
+        metric("packageaware_run_seconds", "gauge", "Wall time of the run.",
+               [([], summary["run_seconds"])])
+        metric("packageaware_exit_code", "gauge", "Exit code of the run.",
+               [([], summary["exit_code"] if summary["exit_code"] is not None else -1)])
+        metric("packageaware_phase_seconds", "gauge", "Time spent in each phase of the run.",
+               [(['phase="' + label(name) + '"'], seconds) for name, seconds in sorted(summary["phases"].items())])
+
+        apis = sorted(summary["apis"].items())
+        metric("packageaware_api_calls_total", "counter", "API calls, retries included once.",
+               [(['api="' + label(name) + '"'], a["calls"]) for name, a in apis])
+        metric("packageaware_api_retries_total", "counter", "API attempts that were retried.",
+               [(['api="' + label(name) + '"'], a["retries"]) for name, a in apis])
+        metric("packageaware_api_seconds_total", "counter", "Time spent waiting on API responses.",
+               [(['api="' + label(name) + '"'], a["seconds"]) for name, a in apis])
+        metric("packageaware_api_responses_total", "counter", "API responses by status code.",
+               [(['api="' + label(name) + '"', 'status="' + label(status) + '"'], count)
+                for name, a in apis for status, count in sorted(a["status_codes"].items())])
+
+        metric("packageaware_rate_limit_waits_total", "counter", "API requests held back by the rate limiter.",
+               [([], summary["rate_limit"]["waits"])])
+        metric("packageaware_rate_limit_wait_seconds_total", "counter", "Time API requests were held back.",
+               [([], summary["rate_limit"]["wait_seconds"])])
+
+        metric("packageaware_bytes_total", "counter", "Manifest bytes read and HTTP body bytes sent / received.",
+               [(['kind="' + label(kind) + '"'], count) for kind, count in sorted(summary["bytes"].items())])
+        metric("packageaware_manifests", "gauge", "Manifests by outcome.",
+               [(['outcome="' + label(outcome) + '"'], count)
+                for outcome, count in sorted(summary["manifests"].items())])
+
+        return "\n".join(lines) + "\n"
+
+    def export(self, workspace_folder, metrics_format, project_name=None, exit_code=None):
+
+        summary = self.summary(project_name, exit_code)
+
+        exports = []
+        if metrics_format in (PackageAwareMetrics.FORMAT_JSON, PackageAwareMetrics.FORMAT_ALL):
+            exports.append((PackageAwareMetrics.JSON_FILE_NAME, json.dumps(summary, indent=2)))
+        if metrics_format in (PackageAwareMetrics.FORMAT_PROMETHEUS, PackageAwareMetrics.FORMAT_ALL):
+            exports.append((PackageAwareMetrics.PROMETHEUS_FILE_NAME, PackageAwareMetrics.prometheus_text(summary)))
+
+        for file_name, content in exports:
+
+            metrics_file = os.path.join(workspace_folder, file_name)
+
+            try:
+                os.makedirs(workspace_folder, exist_ok=True)
+
+                # Written aside and renamed, so a textfile collector never reads half a file
+                temp_file = metrics_file + ".tmp"
+                with open(temp_file, 'w') as the_file:
+                    the_file.write(content)
+                os.replace(temp_file, metrics_file)
+
+                PackageAware.console_log("Metrics written to: " + metrics_file)
+
+            except Exception as e:
+                PackageAware.console_log(
+                    "Could not write metrics: " + metrics_file + " due to error: " + str(e),
+                    PackageAwareLog.WARNING
+                )
+
+
+class PackageAwareMetricsPhase:
+
+    # Adds the time spent in a with block to a phase of PackageAwareMetrics
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self.start_time = None
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.record_phase(self.name, time.perf_counter() - self.start_time)
+        return False
+
+
+class PackageAwareRetryPolicy:
+
+    DEFAULT_MAX_ATTEMPTS = 3
+
+    # Backoff before retry n is a random delay up to min(MAX_DELAY, BASE_DELAY * 2^n) ("full jitter")
+    BASE_DELAY = 1.0
+    MAX_DELAY = 30.0
+
+    # Total seconds all API calls of a run may spend waiting to retry
+    DEFAULT_RETRY_BUDGET = 120
+
+    RETRY_STATUS_CODES = (429, 502, 503, 504)
+
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS, retry_budget=DEFAULT_RETRY_BUDGET,
+                 base_delay=BASE_DELAY, max_delay=MAX_DELAY, metrics=None):
+
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.retry_budget_remaining = retry_budget
+
+        # Every API call goes through run / async_run: attempts, latency and retries are counted here
+        self.metrics = metrics
+
+        self.lock = threading.Lock()
+
+    def is_retryable(self, response):
+        return response.status_code in PackageAwareRetryPolicy.RETRY_STATUS_CODES
+
+    def next_delay(self, attempt, response=None):
+
+        # Seconds to wait before the next attempt, or None when the call should give up
+
+        if attempt + 1 >= self.max_attempts:
+            return None
+
+        delay = None
+        if response is not None:
+            delay = PackageAwareRetryPolicy.parse_retry_after(response.headers.get("Retry-After"))
+
+        if delay is None:
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+        with self.lock:
+            if delay > self.retry_budget_remaining:
+                PackageAware.console_log("Retry budget exhausted. Not retrying.", PackageAwareLog.WARNING)
+                return None
+
+            self.retry_budget_remaining -= delay
+
+        return delay
+
+    @staticmethod
+    def parse_retry_after(retry_after):
+
+        # Retry-After is either a number of seconds or an HTTP date
+        if retry_after is None:
+            return None
+
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            pass
+
+        # Imported here: most responses never carry an HTTP date
+        import email.utils
+
+        try:
+            retry_at = email.utils.parsedate_to_datetime(retry_after)
+            return max((retry_at - datetime.now(retry_at.tzinfo)).total_seconds(), 0.0)
+        except Exception:
+            return None
+
+    def log_attempt(self, api_name, attempt, response):
+
+        if response is None:
+            PackageAware.console_log(api_name + " API Exception Occurred. "
+                                     "Attempt " + str(attempt + 1) + " of " + str(self.max_attempts),
+                                     PackageAwareLog.WARNING)
+        else:
+            PackageAware.console_log(api_name + " API Response Status Code: " + str(response.status_code) + ". "
+                                     "Attempt " + str(attempt + 1) + " of " + str(self.max_attempts),
+                                     PackageAwareLog.WARNING)
+
+    def run(self, api_name, send_request):
+
+        response = None
+
+        if self.metrics is not None:
+            self.metrics.record_call(api_name)
+
+        for attempt in range(0, self.max_attempts):
+
+            attempt_start_time = time.perf_counter()
+
+            try:
+                response = send_request()
+            except Exception as e:
+                response = None
+
+            if self.metrics is not None:
+                self.metrics.record_attempt(api_name, response, time.perf_counter() - attempt_start_time)
+
+            if response is not None and not self.is_retryable(response):
+                return response
+
+            self.log_attempt(api_name, attempt, response)
+
+            delay = self.next_delay(attempt, response)
+            if delay is None:
+                break
+
+            if self.metrics is not None:
+                self.metrics.record_retry(api_name, delay)
+
+            time.sleep(delay)
+
+        return response
+
+    async def async_run(self, api_name, send_request):
+
+        import asyncio
+
+        response = None
+
+        if self.metrics is not None:
+            self.metrics.record_call(api_name)
+
+        for attempt in range(0, self.max_attempts):
+
+            attempt_start_time = time.perf_counter()
+
+            try:
+                response = await send_request()
+            except Exception as e:
+                response = None
+
+            if self.metrics is not None:
+                self.metrics.record_attempt(api_name, response, time.perf_counter() - attempt_start_time)
+
+            if response is not None and not self.is_retryable(response):
+                return response
+
+            self.log_attempt(api_name, attempt, response)
+
+            delay = self.next_delay(attempt, response)
+            if delay is None:
+                break
+
+            if self.metrics is not None:
+                self.metrics.record_retry(api_name, delay)
+
+            await asyncio.sleep(delay)
+
+        return response
+
+
+class PackageAwareRateLimiter:
+
+    # Token bucket every request of an API client passes through, whichever API and project
+    # it is for: on average at most `requests_per_second` (bursts up to one second's worth)
+    # and at most `max_in_flight` requests at a time. Adaptive, the pace also follows the
+    # quota the server reports in its rate limit headers, and a Retry-After or an exhausted
+    # quota holds every request until it is over, instead of each concurrent request finding
+    # the limit with a 429 of its own.
+
+    # 0: no limit
+    DEFAULT_REQUESTS_PER_SECOND = 0
+    DEFAULT_MAX_IN_FLIGHT = 0
+
+    # Adaptive pacing never goes below this
+    MIN_REQUESTS_PER_SECOND = 0.1
+
+    # Reset headers above this are a Unix time, otherwise seconds from now
+    EPOCH_RESET_THRESHOLD = 10 ** 9
+
+    REMAINING_HEADERS = ("X-RateLimit-Remaining", "RateLimit-Remaining")
+    RESET_HEADERS = ("X-RateLimit-Reset", "RateLimit-Reset")
+
+    THROTTLED_STATUS_CODES = (429, 503)
+
+    def __init__(self, requests_per_second=DEFAULT_REQUESTS_PER_SECOND, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                 adaptive=False, metrics=None, clock=time.monotonic):
+
+        # The configured pace is a ceiling adaptive pacing never goes above. None: unlimited
+        self.max_requests_per_second = requests_per_second if requests_per_second > 0 else None
+        self.requests_per_second = self.max_requests_per_second
+
+        self.max_in_flight = max_in_flight
+        self.adaptive = adaptive
+        self.metrics = metrics
+        self.clock = clock
+
+        self.tokens = self.burst()
+        self.updated_at = clock()
+
+        # Nothing is sent before this time (Retry-After, quota exhausted until its reset)
+        self.blocked_until = 0.0
+
+        self.lock = threading.Lock()
+
+        # Threads of the sync engine share the first, the event loop of the asyncio engine the second
+        self.in_flight = threading.BoundedSemaphore(max_in_flight) if max_in_flight > 0 else None
+        self.async_in_flight = None
+
+    def burst(self):
+        return max(1.0, self.requests_per_second or 0.0)
+
+    def refill(self, now):
+
+        # Caller holds the lock
+        if self.requests_per_second is not None:
+            self.tokens = min(self.burst(), self.tokens + (now - self.updated_at) * self.requests_per_second)
+
+        self.updated_at = now
+
+    def reserve(self):
+
+        # Takes the next token and returns the seconds to wait before sending. Tokens are
+        # handed out in order, so waiting requests are spaced at the pace and none starves
+        with self.lock:
+
+            now = self.clock()
+
+            self.refill(now)
+
+            delay = max(self.blocked_until - now, 0.0)
+
+            if self.requests_per_second is not None:
+                self.tokens -= 1
+                if self.tokens < 0:
+                    delay = max(delay, -self.tokens / self.requests_per_second)
+
+        if delay > 0 and self.metrics is not None:
+            self.metrics.record_rate_limit_wait(delay)
+
+        return delay
+
+    def acquire(self):
+
+        if self.in_flight is not None:
+            self.in_flight.acquire()
+
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    def release(self):
+
+        if self.in_flight is not None:
+            self.in_flight.release()
+
+    async def async_acquire(self):
+
+        import asyncio
+
+        if self.max_in_flight > 0:
+            # Created on the event loop that uses it
+            if self.async_in_flight is None:
+                self.async_in_flight = asyncio.Semaphore(self.max_in_flight)
+
+            await self.async_in_flight.acquire()
+
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def async_release(self):
+
+        if self.async_in_flight is not None:
+            self.async_in_flight.release()
+
+    def set_pace(self, requests_per_second, now):
+
+        # Caller holds the lock
+        self.refill(now)
+
+        if self.max_requests_per_second is not None:
+            requests_per_second = min(requests_per_second, self.max_requests_per_second)
+
+        self.requests_per_second = max(requests_per_second, PackageAwareRateLimiter.MIN_REQUESTS_PER_SECOND)
+        self.tokens = min(self.tokens, self.burst())
+
+    def hold(self, seconds, now, reason):
+
+        # Caller holds the lock
+        if now + seconds > self.blocked_until:
+            PackageAware.console_log(
+                reason + ": holding API requests for " + str(round(seconds, 1)) + " seconds",
+                PackageAwareLog.WARNING
+            )
+            self.blocked_until = now + seconds
+
+    @staticmethod
+    def header_number(headers, names):
+
+        for name in names:
+            value = headers.get(name)
+            if value is None:
+                continue
+
+            try:
+                return float(value)
+            except ValueError:
+                return None
+
+        return None
+
+    def observe(self, response):
+
+        # Adaptive pacing from a response: the quota left until its reset is spread evenly over
+        # the time left. A 429 without quota headers halves the pace, every response that was
+        # not throttled wins back some of it, up to the configured pace
+        if not self.adaptive or response is None:
+            return
+
+        headers = response.headers
+        throttled = response.status_code in PackageAwareRateLimiter.THROTTLED_STATUS_CODES
+
+        retry_after = None
+        if throttled:
+            retry_after = PackageAwareRetryPolicy.parse_retry_after(headers.get("Retry-After"))
+
+        remaining = PackageAwareRateLimiter.header_number(headers, PackageAwareRateLimiter.REMAINING_HEADERS)
+
+        reset_in = PackageAwareRateLimiter.header_number(headers, PackageAwareRateLimiter.RESET_HEADERS)
+        if reset_in is not None and reset_in > PackageAwareRateLimiter.EPOCH_RESET_THRESHOLD:
+            reset_in -= time.time()
+
+        with self.lock:
+
+            now = self.clock()
+
+            if retry_after is not None:
+                self.hold(retry_after, now, "Rate limited by the API")
+
+            if remaining is not None and reset_in is not None:
+
+                if remaining < 1:
+                    self.hold(max(reset_in, 0.0), now, "API request quota used up")
+                elif reset_in > 0:
+                    self.set_pace(remaining / reset_in, now)
+
+            elif self.requests_per_second is not None:
+
+                if response.status_code == 429:
+                    self.set_pace(self.requests_per_second / 2, now)
+                elif not throttled and self.max_requests_per_second is not None:
+                    # About one request per second more for every second without a 429
+                    self.set_pace(self.requests_per_second + 1 / self.requests_per_second, now)
+
+
+class PackageAwareApiClient:
+
+    DEFAULT_POOL_SIZE = 4
+
+    CONTENT_ENCODING_IDENTITY = "identity"
+    CONTENT_ENCODING_GZIP = "gzip"
+    CONTENT_ENCODING_ZSTD = "zstd"
+
+    # Bodies smaller than this are sent as-is: compressing them saves nothing
+    DEFAULT_COMPRESSION_MIN_BYTES = 4096
+
+    # Responses telling us the server could not take a compressed body
+    COMPRESSION_REJECTED_STATUS_CODES = (400, 415)
+
+    def __init__(self, pa_context, pool_size=DEFAULT_POOL_SIZE,
+                 content_encoding=None, compression_min_bytes=DEFAULT_COMPRESSION_MIN_BYTES, retry_policy=None,
+                 session=None, rate_limiter=None):
+
+        self.pool_size = pool_size
+
+        self.retry_policy = retry_policy or PackageAwareRetryPolicy()
+        self.metrics = self.retry_policy.metrics
+
+        # None: requests are sent as soon as they are made
+        self.rate_limiter = rate_limiter
+
+        self.content_encoding = content_encoding
+        self.compression_min_bytes = compression_min_bytes
+
+        self.lock = threading.Lock()
+
+        self.api_key = pa_context.api_key
+
+        # One keep-alive session for the whole run: every API call reuses
+        # a warm connection from the pool instead of a new TCP+TLS handshake.
+        # A session passed in is left open by close()
+        self.owns_session = session is None
+        self.session = session if session is not None else self.new_session()
+
+    def new_session(self):
+        return PackageAwareApiClient.create_session(self.api_key, self.pool_size)
+
+    @staticmethod
+    def default_headers(api_key):
+        # Sent with every request of the session
+        return {'x-pa-apikey': api_key}
+
+    @staticmethod
+    def create_session(api_key, pool_size=DEFAULT_POOL_SIZE):
+
+        requests = PackageAwareImports.requests()
+
+        session = requests.Session()
+
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        session.headers.update(PackageAwareApiClient.default_headers(api_key))
+
+        return session
+
+    def request(self, method, url, data=None, headers=None):
+
+        if self.rate_limiter is None:
+            response = self.session.request(method=method, url=url, data=data, headers=headers)
+        else:
+            self.rate_limiter.acquire()
+            try:
+                response = self.session.request(method=method, url=url, data=data, headers=headers)
+            finally:
+                self.rate_limiter.release()
+
+            self.rate_limiter.observe(response)
+
+        if self.metrics is not None:
+            self.metrics.record_bytes(PackageAwareApiClient.body_size(data), len(response.content))
+
+        return response
+
+    @staticmethod
+    def body_size(data):
+
+        if data is None:
+            return 0
+
+        if isinstance(data, str):
+            return len(data.encode("utf-8"))
+
+        return len(data)
+
+    def select_content_encoding(self, body_size):
+
+        content_encoding = self.content_encoding
+
+        if content_encoding is None or body_size < self.compression_min_bytes:
+            return None
+
+        return content_encoding
+
+    def disable_compression(self, content_encoding):
+
+        with self.lock:
+            if self.content_encoding == content_encoding:
+                PackageAware.console_log(
+                    "Server rejected " + content_encoding + " request bodies. "
+                    "Sending uncompressed bodies for the rest of this run."
+                )
+                self.content_encoding = None
+
+    @staticmethod
+    def compress_body(body, content_encoding):
+
+        if content_encoding == PackageAwareApiClient.CONTENT_ENCODING_ZSTD:
+            return PackageAwareImports.zstandard().ZstdCompressor().compress(body)
+
+        return gzip.compress(body)
+
+    def close(self):
+        if self.owns_session:
+            self.session.close()
+
+
+class PackageAwareAsyncResponse:
+
+    # The parts of a requests.Response the API classes read, filled from an aiohttp response
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+
+class PackageAwareAsyncApiClient(PackageAwareApiClient):
+
+    def __init__(self, pa_context, pool_size=PackageAwareApiClient.DEFAULT_POOL_SIZE,
+                 content_encoding=None, compression_min_bytes=PackageAwareApiClient.DEFAULT_COMPRESSION_MIN_BYTES,
+                 retry_policy=None, rate_limiter=None):
+
+        super().__init__(
+            pa_context,
+            pool_size=pool_size,
+            content_encoding=content_encoding,
+            compression_min_bytes=compression_min_bytes,
+            retry_policy=retry_policy,
+            rate_limiter=rate_limiter
+        )
+
+    def new_session(self):
+        # No requests.Session here: connections belong to the aiohttp session opened on the event loop
+        return None
+
+    async def open(self):
+        aiohttp = PackageAwareImports.aiohttp()
+
+        self.session = aiohttp.ClientSession(
+            headers=PackageAwareApiClient.default_headers(self.api_key),
+            connector=aiohttp.TCPConnector(limit=self.pool_size)
+        )
+
+    async def request(self, method, url, data=None, headers=None):
+        # URLs are already quoted by the API classes; keep aiohttp from re-quoting them
+        url = PackageAwareImports.yarl().URL(url, encoded=True)
+
+        if self.rate_limiter is None:
+            return await self.send(method, url, data, headers)
+
+        await self.rate_limiter.async_acquire()
+        try:
+            response = await self.send(method, url, data, headers)
+        finally:
+            self.rate_limiter.async_release()
+
+        self.rate_limiter.observe(response)
+
+        return response
+
+    async def send(self, method, url, data, headers):
+
+        async with self.session.request(method, url, data=data, headers=headers) as response:
+            content = await response.read()
+
+            if self.metrics is not None:
+                self.metrics.record_bytes(PackageAwareApiClient.body_size(data), len(content))
+
+            return PackageAwareAsyncResponse(response.status, response.headers, content)
+
+    async def close(self):
+        await self.session.close()
+
+
+class PackageAwareStructureAPIResponse:
+
+    def __init__(self, structure_response):
+
+        self.original_response = structure_response
+
+        self.content_object = None
+
+        self.structure_id = None
+        self.project_id = None
+        self.analysis_id = None
+        self.report_url = None
+        self.embed_url = None
+        self.report_status_url = None
+
+        if self.original_response is not None and self.original_response.status_code == 201:
+
+            self.content_object = json.loads(self.original_response.content)
+
+            self.structure_id = self.content_object["Id"]
+            self.project_id = self.content_object["projectId"]
+            self.analysis_id = self.content_object["Id"]
+            self.report_url = self.content_object["reportUrl"]
+            self.embed_url = self.content_object["embedUrl"]
+            self.report_status_url = self.content_object["reportStatusUrl"]
+
+
+class PackageAwareStructureAPI:
+
+    URI_TEMPLATE = "{pa_base_uri}clients/{pa_client_id}/analysis/structure"
+
+    def __init__(self):
+        pass
+
+    @staticmethod
+    def generate_api_url(pa_context):
+        url = PackageAwareStructureAPI.URI_TEMPLATE
+        url = url.replace("{pa_base_uri}", pa_context.base_uri)
+        url = url.replace("{pa_client_id}", pa_context.client_id)
+
+        return url
+
+    @staticmethod
+    def exec(pa_context, pa_client):
+
+        api_url = PackageAwareStructureAPI.generate_api_url(pa_context)
+
+        def send_request():
+            return pa_client.request(
+                "POST",
+                url=api_url,
+                data=PackageAwareStructureAPI.generate_body(pa_context)
+            )
+
+        return PackageAwareStructureAPIResponse(pa_client.retry_policy.run("Structure", send_request))
+
+    @staticmethod
+    async def async_exec(pa_context, pa_client):
+
+        api_url = PackageAwareStructureAPI.generate_api_url(pa_context)
+
+        async def send_request():
+            return await pa_client.request(
+                "POST",
+                url=api_url,
+                data=PackageAwareStructureAPI.generate_body(pa_context)
+            )
+
+        return PackageAwareStructureAPIResponse(await pa_client.retry_policy.async_run("Structure", send_request))
+
+    @staticmethod
+    def generate_body(pa_context):
+        return json.dumps({
+            "project": pa_context.project_name,
+            "name": datetime.now().strftime("%m/%d/%Y, %H:%M:%S")
+        })
+
+
+class PackageAwareContext:
+
+    def __init__(self):
+        self.base_uri = None
+        self.source_code_path = None
+        self.project_name = None
+        self.client_id = None
+        self.api_key = None
+
+    def reset(self):
+        self.base_uri = None
+        self.source_code_path = None
+        self.project_name = None
+        self.client_id = None
+        self.api_key = None
+
+    def load(self, args, require_project=True, require_api=True):
+
+        # Prioritize context from environment variables
+        # Any environment variables that are not set will
+        # automatically be searched in the script arguments
+        # Batch runs take the project name and source path from the project list
+        # Dry runs make no API calls: only the source path is required
+        self.load_from_env_var()
+
+        if not self.is_valid(require_project, require_api):
+
+            # Attempt to get MISSING context from parameters
+            self.load_from_parameters(args)
+
+            if not self.is_valid(require_project, require_api):
+
+                return False
+
+        return True
+
+    def load_from_env_var(self):
+
+        self.reset()
+
+        try:
+            if self.base_uri is None:
+                self.base_uri = os.environ["PACKAGE_AWARE_API_BASE_URI"]
+                PackageAware.console_log("PACKAGE_AWARE_API_BASE_URI Environment Variable Loaded")
+        except Exception as e:
+            pass
+
+        try:
+            if self.source_code_path is None:
+                self.source_code_path = os.environ['PACKAGE_AWARE_ROOT_CODE_PATH']
+                PackageAware.console_log("PACKAGE_AWARE_ROOT_CODE_PATH Environment Variable Loaded")
+        except Exception as e:
+            pass
+
+        try:
+            if self.project_name is None:
+                self.project_name = os.environ['PACKAGE_AWARE_PROJECT_NAME']
+                PackageAware.console_log("PACKAGE_AWARE_PROJECT_NAME Environment Variable Loaded")
+        except Exception as e:
+            pass
+
+        try:
+            if self.client_id is None:
+                self.client_id = os.environ['PACKAGE_AWARE_CLIENT_ID']
+                PackageAware.console_log("PACKAGE_AWARE_CLIENT_ID Environment Variable Loaded")
+        except Exception as e:
+            pass
+
+        try:
+            if self.api_key is None:
+                self.api_key = os.environ['PACKAGE_AWARE_API_KEY']
+                PackageAware.console_log("PACKAGE_AWARE_API_KEY Environment Variable Loaded")
+        except Exception as e:
+            pass
+
+    def load_from_parameters(self, args):
+
+        self.reset()
+
+        if args.base_uri is not None:
+            self.base_uri = str(args.base_uri)
+            PackageAware.console_log("PACKAGE_AWARE_API_BASE_URI Parameter Loaded")
+
+        if args.source_code_path is not None:
+            self.source_code_path = str(args.source_code_path)
+            PackageAware.console_log("PACKAGE_AWARE_ROOT_CODE_PATH Parameter Loaded")
+
+        if args.project_name is not None:
+            self.project_name = str(args.project_name)
+            PackageAware.console_log("PACKAGE_AWARE_PROJECT_NAME Parameter Loaded")
+
+        if args.client_id is not None:
+            self.client_id = str(args.client_id)
+            PackageAware.console_log("PACKAGE_AWARE_CLIENT_ID Parameter Loaded")
+
+        if args.base_uri is not None:
+            self.api_key = str(args.api_key)
+            PackageAware.console_log("PACKAGE_AWARE_API_KEY Parameter Loaded")
+
+    def is_valid(self, require_project=True, require_api=True):
+
+        if require_api and (self.base_uri is None or len(self.base_uri) == 0):
+            return False
+
+        if require_project and (self.source_code_path is None or len(self.source_code_path) == 0):
+            return False
+
+        if require_project and require_api and (self.project_name is None or len(self.project_name) == 0):
+            return False
+
+        if require_api and (self.client_id is None or len(self.client_id) == 0):
+            return False
+
+        if require_api and (self.api_key is None or len(self.api_key) == 0):
+            return False
+
+        return True
+
+    def print_invalid(self, require_project=True, require_api=True):
+
+        if require_api and (self.base_uri is None or len(self.base_uri) == 0):
+            PackageAware.console_log("REQUIRED PARAMETER IS MISSING: PACKAGE_AWARE_API_BASE_URI", PackageAwareLog.ERROR)
+
+        if require_project and (self.source_code_path is None or len(self.source_code_path) == 0):
+            PackageAware.console_log(
+                "REQUIRED PARAMETER IS MISSING: PACKAGE_AWARE_ROOT_CODE_PATH",
+                PackageAwareLog.ERROR
+            )
+
+        if require_project and require_api and (self.project_name is None or len(self.project_name) == 0):
+            PackageAware.console_log("REQUIRED PARAMETER IS MISSING: PACKAGE_AWARE_PROJECT_NAME", PackageAwareLog.ERROR)
+
+        if not require_api:
+            return
+
+        if self.client_id is None or len(self.client_id) == 0:
+            PackageAware.console_log("REQUIRED PARAMETER IS MISSING: PACKAGE_AWARE_CLIENT_ID", PackageAwareLog.ERROR)
+            PackageAware.console_log("CLIENT_ID, if you do not already have one, will be provided with a subscription to PackageAware.io services.")
+
+        if self.api_key is None or len(self.api_key) == 0:
+            PackageAware.console_log("REQUIRED PARAMETER IS MISSING: PACKAGE_AWARE_API_KEY", PackageAwareLog.ERROR)
+            PackageAware.console_log("API_KEY, if you do not already have one, will be provided with a subscription to PackageAware.io services.")
+
+
+class PackageAwareManifestContent:
+
+    # A manifest file mapped into memory. The mapped bytes are hashed and uploaded as they
+    # are on disk (no decode / re-encode, no copy), so large generated lockfiles cost no
+    # more memory than the page cache already holds. close() must be called once uploaded.
+
+    NON_WHITESPACE = re.compile(rb'\S')
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.mapped = None
+        self.body = b""
+
+    def open(self):
+
+        # Empty files cannot be mapped; they are left with an empty body
+        with open(self.file_name, 'rb') as the_file:
+            if os.fstat(the_file.fileno()).st_size > 0:
+                self.mapped = mmap.mmap(the_file.fileno(), 0, access=mmap.ACCESS_READ)
+                self.body = memoryview(self.mapped)
+
+    def is_empty(self):
+        # Stops at the first non-whitespace byte instead of stripping a copy of the file
+        return self.mapped is None or PackageAwareManifestContent.NON_WHITESPACE.search(self.mapped) is None
+
+    def sha256(self):
+        return PackageAwareUploadCache.hash_bytes(self.body)
+
+    def close(self):
+
+        if self.mapped is not None:
+            self.body.release()
+            self.mapped.close()
+
+        self.mapped = None
+        self.body = b""
+
+
+class PackageAwareManifestAPI:
+
+    URI_TEMPLATE = "{pa_base_uri}" \
+                   "clients/{pa_client_id}" \
+                   "/projects/{pa_project_id}" \
+                   "/analysis/{pa_analysis_id}" \
+                   "/manifests/{pa_manifest_name}"
+
+    def __init__(self):
+        pass
+
+    @staticmethod
+    def generate_api_url(pa_context, project_id, analysis_id, manifest_name):
+
+        manifest_for_url = urllib.parse.quote(manifest_name)
+
+        api_url = PackageAwareManifestAPI.URI_TEMPLATE
+        api_url = api_url.replace("{pa_base_uri}", pa_context.base_uri)
+        api_url = api_url.replace("{pa_client_id}", pa_context.client_id)
+        api_url = api_url.replace("{pa_project_id}", project_id)
+        api_url = api_url.replace("{pa_analysis_id}", analysis_id)
+        api_url = api_url.replace("{pa_manifest_name}", manifest_for_url)
+
+        return api_url
+
+    @staticmethod
+    def prepare_request(pa_client, manifest_name, manifest_content, manifest_path, manifest_ref):
+
+        # Uploads may run concurrently; name the file so each line can be tied to it
+        manifest_label = manifest_name
+        if manifest_path is not None:
+            manifest_label += " (" + manifest_path + ")"
+
+        # manifest_content is bytes-like (the mapped file) and is sent as is
+        body = manifest_content
+        headers = {}
+
+        # Reference the content the server already holds instead of sending it again
+        if manifest_ref is not None:
+            headers[PackageAwareUploadCache.MANIFEST_REF_HEADER] = manifest_ref
+            body = b""
+            manifest_label += " [referencing server copy]"
+
+        content_encoding = pa_client.select_content_encoding(len(body))
+        if content_encoding is not None:
+            body = PackageAwareApiClient.compress_body(body, content_encoding)
+            headers['Content-Encoding'] = content_encoding
+
+        return manifest_label, body, headers, content_encoding
+
+    @staticmethod
+    def is_compression_rejected(response, content_encoding):
+        return (response is not None and content_encoding is not None and
+                response.status_code in PackageAwareApiClient.COMPRESSION_REJECTED_STATUS_CODES)
+
+    @staticmethod
+    def exec(pa_context, pa_client, project_id, analysis_id, manifest_name, manifest_content, manifest_path=None,
+             manifest_ref=None):
+
+        api_url = PackageAwareManifestAPI.generate_api_url(pa_context, project_id, analysis_id, manifest_name)
+
+        manifest_label, body, headers, content_encoding = PackageAwareManifestAPI.prepare_request(
+            pa_client, manifest_name, manifest_content, manifest_path, manifest_ref
+        )
+
+        def send_request():
+            PackageAware.console_log("*** Putting manifest: " + manifest_label, event="manifest_put")
+
+            response = pa_client.request(
+                "PUT",
+                url=api_url,
+                data=body,
+                headers=headers
+            )
+
+            PackageAware.console_log("Manifest Put Executed: " + manifest_label, event="manifest_put_executed")
+
+            return response
+
+        response = pa_client.retry_policy.run("Manifest", send_request)
+
+        # The server did not accept the compressed body: fall back to identity encoding
+        if PackageAwareManifestAPI.is_compression_rejected(response, content_encoding):
+
+            pa_client.disable_compression(content_encoding)
+
+            return PackageAwareManifestAPI.exec(
+                pa_context, pa_client, project_id, analysis_id, manifest_name, manifest_content,
+                manifest_path=manifest_path,
+                manifest_ref=manifest_ref
+            )
+
+        return response
+
+    @staticmethod
+    async def async_exec(pa_context, pa_client, project_id, analysis_id, manifest_name, manifest_content,
+                         manifest_path=None, manifest_ref=None):
+
+        api_url = PackageAwareManifestAPI.generate_api_url(pa_context, project_id, analysis_id, manifest_name)
+
+        manifest_label, body, headers, content_encoding = PackageAwareManifestAPI.prepare_request(
+            pa_client, manifest_name, manifest_content, manifest_path, manifest_ref
+        )
+
+        async def send_request():
+            PackageAware.console_log("*** Putting manifest: " + manifest_label, event="manifest_put")
+
+            response = await pa_client.request(
+                "PUT",
+                url=api_url,
+                data=body,
+                headers=headers
+            )
+
+            PackageAware.console_log("Manifest Put Executed: " + manifest_label, event="manifest_put_executed")
+
+            return response
+
+        response = await pa_client.retry_policy.async_run("Manifest", send_request)
+
+        # The server did not accept the compressed body: fall back to identity encoding
+        if PackageAwareManifestAPI.is_compression_rejected(response, content_encoding):
+
+            pa_client.disable_compression(content_encoding)
+
+            return await PackageAwareManifestAPI.async_exec(
+                pa_context, pa_client, project_id, analysis_id, manifest_name, manifest_content,
+                manifest_path=manifest_path,
+                manifest_ref=manifest_ref
+            )
+
+        return response
+
+
+class PackageAwareUploadCache:
+
+    CACHE_FILE_NAME = "package_aware_upload_cache.json"
+    CACHE_VERSION = 2
+
+    # Entries older than this are dropped and their manifests uploaded in full again
+    ENTRY_MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+
+    # A server that can reuse stored manifest content returns an opaque reference in this
+    # header. Sending the reference back (with an empty body) replaces a full upload.
+    MANIFEST_REF_HEADER = "x-pa-manifest-ref"
+
+    def __init__(self, cache_file, pa_context):
+
+        self.cache_file = cache_file
+
+        # Cached state is only valid for the same API, client and project
+        self.scope = PackageAwareUploadCache.hash_bytes(
+            "|".join([pa_context.base_uri, pa_context.client_id, pa_context.project_name]).encode("utf-8")
+        )
+
+        self.previous_entries = {}
+        self.entries = {}
+
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def hash_bytes(content):
+        return hashlib.sha256(content).hexdigest()
+
+    def load(self):
+
+        self.previous_entries = {}
+
+        try:
+            with open(self.cache_file, 'r') as the_file:
+                cache_content = json.loads(the_file.read())
+
+            if cache_content.get("version") != PackageAwareUploadCache.CACHE_VERSION:
+                PackageAware.console_log(
+                    "Upload cache version changed, ignoring: " + self.cache_file,
+                    PackageAwareLog.WARNING
+                )
+            elif cache_content.get("scope") != self.scope:
+                PackageAware.console_log(
+                    "Upload cache belongs to another project or API, ignoring: " + self.cache_file,
+                    PackageAwareLog.WARNING
+                )
+            else:
+                self.previous_entries = cache_content.get("entries", {})
+
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            PackageAware.console_log(
+                "Could not read upload cache: " + self.cache_file + " due to error: " + str(e),
+                PackageAwareLog.WARNING
+            )
+
+    def save(self):
+
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+
+            # Only manifests seen in this run are kept; deleted manifests drop out
+            with self.lock:
+                cache_content = {
+                    "version": PackageAwareUploadCache.CACHE_VERSION,
+                    "scope": self.scope,
+                    "entries": self.entries
+                }
+
+            temp_file = self.cache_file + ".tmp"
+            with open(temp_file, 'w') as the_file:
+                the_file.write(json.dumps(cache_content))
+            os.replace(temp_file, self.cache_file)
+
+        except Exception as e:
+            PackageAware.console_log(
+                "Could not write upload cache: " + self.cache_file + " due to error: " + str(e),
+                PackageAwareLog.WARNING
+            )
+
+    def lookup(self, path, content_hash, manifest_name):
+
+        entry = self.previous_entries.get(PackageAware.normalize_path(path))
+
+        if entry is None:
+            return None
+
+        if entry.get("sha256") != content_hash or entry.get("manifest_name") != manifest_name:
+            return None
+
+        if not 200 <= entry.get("status_code", 0) < 300:
+            return None
+
+        if time.time() - entry.get("uploaded_at", 0) > PackageAwareUploadCache.ENTRY_MAX_AGE_SECONDS:
+            return None
+
+        return entry
+
+    def record(self, path, content_hash, manifest_name, response, previous_entry=None):
+
+        if response is None or not 200 <= response.status_code < 300:
+            return
+
+        manifest_ref = response.headers.get(PackageAwareUploadCache.MANIFEST_REF_HEADER)
+        if manifest_ref is None and previous_entry is not None:
+            manifest_ref = previous_entry.get("manifest_ref")
+
+        with self.lock:
+            self.entries[PackageAware.normalize_path(path)] = {
+                "sha256": content_hash,
+                "manifest_name": manifest_name,
+                "status_code": response.status_code,
+                "manifest_ref": manifest_ref,
+                "uploaded_at": time.time()
+            }
+
+
+class PackageAwareManifestDedup:
+
+    # Content-addressed upload plan for the manifests of one analysis. Every manifest is
+    # hashed once after discovery and grouped with the manifests holding the same bytes:
+    #   uploads     the first manifest with each distinct body, uploaded as before
+    #   references  the same body under another manifest name: sent as a reference to the
+    #               first upload when the server returned one (MANIFEST_REF_HEADER),
+    #               otherwise uploaded in full
+    #   duplicates  the same body and manifest name as an earlier upload: the PUT would be the
+    #               very same request, so it is not sent again and shares that upload's result
+
+    def __init__(self):
+
+        self.uploads = []
+        self.references = []
+        self.duplicates = []
+
+        # Manifest path -> path of the first manifest with the same body
+        self.first_paths = {}
+
+        self.saved_uploads = 0
+        self.saved_bytes = 0
+
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def plan(manifest_files):
+
+        dedup = PackageAwareManifestDedup()
+
+        # sha256 -> first manifest with that body; (manifest name, sha256) -> first upload of it
+        first_by_hash = {}
+        first_by_request = {}
+
+        for manifest_file in manifest_files:
+
+            content_hash = PackageAwareManifestDedup.hash_manifest(manifest_file)
+
+            # Empty or unreadable manifests go the usual way and are reported there
+            if content_hash is None:
+                dedup.uploads.append(manifest_file)
+                continue
+
+            request_key = (manifest_file['manifest_name'], content_hash)
+
+            if request_key in first_by_request:
+                dedup.first_paths[manifest_file['path']] = first_by_request[request_key]['path']
+                dedup.duplicates.append(manifest_file)
+            elif content_hash in first_by_hash:
+                first_by_request[request_key] = manifest_file
+                dedup.first_paths[manifest_file['path']] = first_by_hash[content_hash]['path']
+                dedup.references.append(manifest_file)
+            else:
+                first_by_request[request_key] = manifest_file
+                first_by_hash[content_hash] = manifest_file
+                dedup.uploads.append(manifest_file)
+
+        if len(dedup.references) + len(dedup.duplicates) > 0:
+            PackageAware.console_log(
+                str(len(dedup.uploads)) + " distinct manifests, " + str(len(dedup.duplicates)) + " identical copies, " +
+                str(len(dedup.references)) + " copies under another manifest name"
+            )
+
+        return dedup
+
+    @staticmethod
+    def hash_manifest(manifest_file):
+
+        # Records the SHA-256 and size of a manifest on it, None when it is empty or unreadable.
+        # A manifest is read for its hash once per run.
+        if 'sha256' in manifest_file:
+            return manifest_file['sha256']
+
+        try:
+            content = PackageAware.read_manifest(manifest_file['path'])
+        except Exception:
+            return None
+
+        if content is None:
+            manifest_file['sha256'] = None
+            return None
+
+        try:
+            manifest_file['sha256'] = content.sha256()
+            manifest_file['size'] = len(content.body)
+        finally:
+            content.close()
+
+        return manifest_file['sha256']
+
+    def with_reference(self, manifest_file, results_by_path):
+
+        # The manifest to upload, carrying the server reference to its first copy when there is one
+        first_result = results_by_path.get(self.first_paths[manifest_file['path']])
+
+        if first_result is None or first_result['response'] is None or \
+                not 200 <= first_result['response'].status_code < 300:
+            return manifest_file
+
+        manifest_ref = first_result['response'].headers.get(PackageAwareUploadCache.MANIFEST_REF_HEADER)
+
+        if manifest_ref is None:
+            return manifest_file
+
+        referenced_file = dict(manifest_file)
+        referenced_file['manifest_ref'] = manifest_ref
+        referenced_file['same_as'] = first_result['path']
+
+        return referenced_file
+
+    def referencing(self, results_by_path):
+
+        # The copies under another name, sent once the uploads they reference are done
+        return [self.with_reference(m, results_by_path) for m in self.references]
+
+    def add_duplicate_results(self, results_by_path):
+        for manifest_file in self.duplicates:
+            results_by_path[manifest_file['path']] = self.duplicate_result(manifest_file, results_by_path)
+
+    def duplicate_result(self, manifest_file, results_by_path):
+
+        # The result of a copy that is not sent: the result of its first upload
+        first_result = results_by_path[self.first_paths[manifest_file['path']]]
+
+        result = dict(first_result)
+        result['path'] = manifest_file['path']
+        result['size'] = manifest_file['size']
+        result['duplicate'] = True
+        result['same_as'] = first_result['path']
+
+        return result
+
+    def record(self, result):
+
+        # Uploads and bytes not sent thanks to the plan
+        if result.get('same_as') is None or result['error'] is not None or result['response'] is None:
+            return
+
+        if result.get('duplicate') or result['cached']:
+            with self.lock:
+                self.saved_uploads += 1
+                self.saved_bytes += result.get('size', 0)
+
+    def log_summary(self):
+
+        if len(self.references) + len(self.duplicates) > 0:
+            PackageAware.console_log(
+                "Deduplication: " + str(self.saved_uploads) + " uploads and " + str(self.saved_bytes) +
+                " bytes saved"
+            )
+
+
+class PackageAwareUploadJournal:
+
+    # Progress of the current analysis, appended to the working directory as it happens: the
+    # structure (analysis and project ids), every manifest uploaded (path, manifest name and
+    # content hash) and the start of the analysis. A run that died midway is continued with
+    # --resume: same analysis, only the manifests not uploaded yet, no second start. The
+    # journal is removed once the run has handed the started analysis over. Every entry names
+    # the structure it belongs to; a journal mixing structures, or older than MAX_AGE_SECONDS
+    # (the server may have dropped an analysis that was never started), is discarded.
+
+    JOURNAL_FILE_NAME = "package_aware_upload_journal.jsonl"
+    JOURNAL_VERSION = 2
+
+    MAX_AGE_SECONDS = 24 * 60 * 60
+
+    def __init__(self, journal_file, pa_context):
+
+        self.journal_file = journal_file
+
+        # Only resumed by a run for the same API, client, project and source tree
+        self.scope = PackageAwareUploadCache.hash_bytes(
+            "|".join([pa_context.base_uri, pa_context.client_id, pa_context.project_name]).encode("utf-8")
+        )
+        self.source_root = os.path.abspath(pa_context.source_code_path)
+
+        self.structure = None
+        self.uploaded = set()
+        self.started = False
+
+        self.the_file = None
+        self.lock = threading.Lock()
+
+    def load(self):
+
+        # The journaled structure entry, None when there is nothing to resume
+        self.structure = None
+        self.uploaded = set()
+        self.started = False
+
+        try:
+            with open(self.journal_file, 'r') as the_file:
+                lines = the_file.readlines()
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            PackageAware.console_log(
+                "Could not read upload journal: " + self.journal_file + " due to error: " + str(e),
+                PackageAwareLog.WARNING
+            )
+            return None
+
+        structure = None
+        uploaded = set()
+        started = False
+
+        for line in lines:
+
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # The last line of a run killed while writing it
+                continue
+
+            if structure is None:
+                if entry.get("event") != "structure" or entry.get("version") != PackageAwareUploadJournal.JOURNAL_VERSION \
+                        or entry.get("scope") != self.scope or entry.get("source_root") != self.source_root:
+                    return None
+
+                discard_reason = PackageAwareUploadJournal.structure_discard_reason(entry)
+
+                if discard_reason is not None:
+                    PackageAware.console_log(
+                        "Discarding upload journal: " + self.journal_file + ": " + discard_reason,
+                        PackageAwareLog.WARNING
+                    )
+                    return None
+
+                structure = entry
+
+            elif entry.get("structure_id") != structure["structure_id"]:
+                PackageAware.console_log(
+                    "Discarding upload journal: " + self.journal_file + ": it holds entries of another analysis",
+                    PackageAwareLog.WARNING
+                )
+                return None
+
+            elif entry.get("event") == "manifest":
+                uploaded.add((entry["path"], entry["manifest_name"], entry["sha256"]))
+
+            elif entry.get("event") == "started":
+                started = True
+
+        self.structure = structure
+        self.uploaded = uploaded
+        self.started = started
+
+        return self.structure
+
+    @staticmethod
+    def structure_discard_reason(entry):
+
+        # Why the journaled structure cannot be resumed, None when it can
+        if entry.get("structure_id") is None or entry.get("structure_id") != entry.get("analysis_id"):
+            return "its structure id does not match its analysis id"
+
+        created_at = entry.get("created_at")
+
+        if not isinstance(created_at, (int, float)):
+            return "it has no creation time"
+
+        if time.time() - created_at > PackageAwareUploadJournal.MAX_AGE_SECONDS:
+            return "the analysis was created on " + \
+                   datetime.utcfromtimestamp(created_at).strftime("%Y-%m-%d %H:%M:%S") + " UTC, more than " + \
+                   str(PackageAwareUploadJournal.MAX_AGE_SECONDS // 3600) + " hours ago"
+
+        return None
+
+    def structure_response(self):
+
+        # The journaled structure in the shape of a Structure API response
+        structure_response = PackageAwareStructureAPIResponse(None)
+
+        structure_response.structure_id = self.structure["structure_id"]
+        structure_response.analysis_id = self.structure["analysis_id"]
+        structure_response.project_id = self.structure["project_id"]
+        structure_response.report_url = self.structure["report_url"]
+        structure_response.embed_url = self.structure["embed_url"]
+        structure_response.report_status_url = self.structure["report_status_url"]
+
+        return structure_response
+
+    def begin(self, structure_response):
+
+        # A new analysis: the journal starts over
+        self.structure = {
+            "event": "structure",
+            "version": PackageAwareUploadJournal.JOURNAL_VERSION,
+            "scope": self.scope,
+            "source_root": self.source_root,
+            "created_at": time.time(),
+            "structure_id": structure_response.structure_id,
+            "analysis_id": structure_response.analysis_id,
+            "project_id": structure_response.project_id,
+            "report_url": structure_response.report_url,
+            "embed_url": structure_response.embed_url,
+            "report_status_url": structure_response.report_status_url
+        }
+        self.uploaded = set()
+        self.started = False
+
+        try:
+            os.makedirs(os.path.dirname(self.journal_file), exist_ok=True)
+            self.the_file = open(self.journal_file, 'w')
+        except Exception as e:
+            PackageAware.console_log(
+                "Could not write upload journal: " + self.journal_file + " due to error: " + str(e),
+                PackageAwareLog.WARNING
+            )
+            return
+
+        self.append(self.structure)
+
+    def resume(self):
+
+        # Continues the loaded journal
+        try:
+            self.the_file = open(self.journal_file, 'a')
+        except Exception as e:
+            PackageAware.console_log(
+                "Could not write upload journal: " + self.journal_file + " due to error: " + str(e),
+                PackageAwareLog.WARNING
+            )
+
+    def manifest_key(self, manifest_file, content_hash):
+        return (
+            os.path.relpath(os.path.abspath(manifest_file['path']), self.source_root).replace(os.sep, "/"),
+            manifest_file['manifest_name'],
+            content_hash
+        )
+
+    def is_uploaded(self, manifest_file):
+        return self.manifest_key(manifest_file, PackageAwareManifestDedup.hash_manifest(manifest_file)) in self.uploaded
+
+    def record_upload(self, manifest_file, content_hash):
+
+        path, manifest_name, content_hash = self.manifest_key(manifest_file, content_hash)
+
+        self.append({
+            "event": "manifest", "structure_id": self.structure["structure_id"],
+            "path": path, "manifest_name": manifest_name, "sha256": content_hash
+        })
+
+    def record_started(self):
+        self.started = True
+        self.append({"event": "started", "structure_id": self.structure["structure_id"]})
+
+    def append(self, entry):
+
+        # One line per event, flushed at once: whatever was written survives the process
+        with self.lock:
+
+            if self.the_file is None:
+                return
+
+            try:
+                self.the_file.write(json.dumps(entry) + "\n")
+                self.the_file.flush()
+            except Exception as e:
+                PackageAware.console_log(
+                    "Could not write upload journal: " + self.journal_file + " due to error: " + str(e),
+                    PackageAwareLog.WARNING
+                )
+                self.the_file.close()
+                self.the_file = None
+
+    def finish(self):
+
+        # The analysis is started and handed over: there is nothing left to resume
+        with self.lock:
+
+            if self.the_file is not None:
+                self.the_file.close()
+                self.the_file = None
+
+            try:
+                os.remove(self.journal_file)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                PackageAware.console_log(
+                    "Could not remove upload journal: " + self.journal_file + " due to error: " + str(e),
+                    PackageAwareLog.WARNING
+                )
+
+
+class PackageAwareHashCache:
+
+    # Content hashes of manifests kept in memory by the daemon, keyed by path and checked
+    # against the file's inode, size and mtime. Manifests hashed by a background rescan are
+    # not read again for their hash when a run asks for them. Runs and rescans work on a
+    # forked copy and send their changes (take_changes) back to the daemon (apply_changes).
+
+    # A file changed this close to the hash may change again within the same mtime tick
+    RACY_WINDOW_NS = 2 * 1000 * 1000 * 1000
+
+    def __init__(self, racy_window_ns=RACY_WINDOW_NS):
+
+        self.racy_window_ns = racy_window_ns
+
+        # Absolute manifest path -> {"stat": (inode, size, mtime_ns), "sha256": ..., "size": ...}
+        self.entries = {}
+
+        # Changes since the last take_changes: entries added or replaced, paths removed
+        self.updated_paths = set()
+        self.removed_paths = set()
+
+        self.reused_count = 0
+        self.hashed_count = 0
+
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def stat_key(path):
+        stat = os.stat(path)
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def annotate(self, manifest_files):
+
+        # Puts sha256 and size on every manifest, from the cache when the file is unchanged
+        trusted_before_ns = int(time.time() * 1000 * 1000 * 1000) - self.racy_window_ns
+
+        for manifest_file in manifest_files:
+
+            if 'sha256' in manifest_file:
+                continue
+
+            path = os.path.abspath(manifest_file['path'])
+
+            try:
+                stat_key = PackageAwareHashCache.stat_key(path)
+            except OSError:
+                continue
+
+            with self.lock:
+                entry = self.entries.get(path)
+
+            if entry is not None and entry["stat"] == stat_key:
+                manifest_file['sha256'] = entry["sha256"]
+                if entry["size"] is not None:
+                    manifest_file['size'] = entry["size"]
+
+                with self.lock:
+                    self.reused_count += 1
+                continue
+
+            PackageAwareManifestDedup.hash_manifest(manifest_file)
+
+            with self.lock:
+                self.hashed_count += 1
+
+                # Unreadable manifests have no sha256 and are tried again next time
+                if 'sha256' in manifest_file and stat_key[2] < trusted_before_ns:
+                    self.entries[path] = {
+                        "stat": stat_key,
+                        "sha256": manifest_file['sha256'],
+                        "size": manifest_file.get('size')
+                    }
+                    self.updated_paths.add(path)
+                    self.removed_paths.discard(path)
+
+    def forget_missing(self, manifest_files, source_root):
+
+        # Drops the entries below source_root that the last scan of it did not find
+        found_paths = set(os.path.abspath(manifest_file['path']) for manifest_file in manifest_files)
+        source_root = os.path.join(os.path.abspath(source_root), "")
+
+        with self.lock:
+            for path in list(self.entries.keys()):
+                if path.startswith(source_root) and path not in found_paths:
+                    del self.entries[path]
+                    self.updated_paths.discard(path)
+                    self.removed_paths.add(path)
+
+    def take_changes(self):
+
+        # The changes since the last call, as JSON-ready data
+        with self.lock:
+            changes = {
+                "updated": dict((path, self.entries[path]) for path in self.updated_paths),
+                "removed": sorted(self.removed_paths)
+            }
+
+            self.updated_paths = set()
+            self.removed_paths = set()
+
+        return changes
+
+    def apply_changes(self, changes):
+
+        with self.lock:
+            for path, entry in changes.get("updated", {}).items():
+                self.entries[path] = {"stat": tuple(entry["stat"]), "sha256": entry["sha256"], "size": entry["size"]}
+
+            for path in changes.get("removed", []):
+                self.entries.pop(path, None)
+
+
+class PackageAwareVerdictCache:
+
+    # The result of the last finished run_and_wait analysis, keyed by a fingerprint of the
+    # whole manifest set. When the manifests have not changed since and the result is
+    # younger than the TTL, the run exits with it and makes no API call at all.
+
+    CACHE_FILE_NAME = "package_aware_verdict_cache.json"
+    CACHE_VERSION = 1
+
+    DEFAULT_TTL_SECONDS = 24 * 60 * 60
+
+    def __init__(self, cache_file, pa_context, ttl_seconds=DEFAULT_TTL_SECONDS):
+
+        self.cache_file = cache_file
+        self.ttl_seconds = ttl_seconds
+
+        # A verdict is only valid for the same API, client and project
+        self.scope = PackageAwareUploadCache.hash_bytes(
+            "|".join([pa_context.base_uri, pa_context.client_id, pa_context.project_name]).encode("utf-8")
+        )
+
+    @staticmethod
+    def fingerprint(source_root, manifest_files):
+
+        # Relative path, manifest name and content hash of every manifest, in a stable order
+        lines = []
+
+        for manifest_file in manifest_files:
+            lines.append("\0".join([
+                os.path.relpath(manifest_file['path'], source_root).replace(os.sep, "/"),
+                manifest_file['manifest_name'],
+                PackageAwareManifestDedup.hash_manifest(manifest_file) or "empty"
+            ]))
+
+        return PackageAwareUploadCache.hash_bytes("\n".join(sorted(lines)).encode("utf-8"))
+
+    def lookup(self, fingerprint):
+
+        try:
+            with open(self.cache_file, 'r') as the_file:
+                verdict = json.loads(the_file.read())
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            PackageAware.console_log(
+                "Could not read verdict cache: " + self.cache_file + " due to error: " + str(e),
+                PackageAwareLog.WARNING
+            )
+            return None
+
+        if verdict.get("version") != PackageAwareVerdictCache.CACHE_VERSION or verdict.get("scope") != self.scope:
+            return None
+
+        if verdict.get("fingerprint") != fingerprint:
+            PackageAware.console_log("Manifests changed since the last finished analysis")
+            return None
+
+        if time.time() - verdict.get("finished_at", 0) > self.ttl_seconds:
+            PackageAware.console_log("Last finished analysis is older than " + str(self.ttl_seconds) + " seconds")
+            return None
+
+        return verdict
+
+    def record(self, fingerprint, analysis_status, exit_code, report_url):
+
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+
+            temp_file = self.cache_file + ".tmp"
+            with open(temp_file, 'w') as the_file:
+                the_file.write(json.dumps({
+                    "version": PackageAwareVerdictCache.CACHE_VERSION,
+                    "scope": self.scope,
+                    "fingerprint": fingerprint,
+                    "status": analysis_status,
+                    "exit_code": exit_code,
+                    "report_url": report_url,
+                    "finished_at": time.time()
+                }))
+            os.replace(temp_file, self.cache_file)
+
+        except Exception as e:
+            PackageAware.console_log(
+                "Could not write verdict cache: " + self.cache_file + " due to error: " + str(e),
+                PackageAwareLog.WARNING
+            )
+
+
+class PackageAwareExclusions:
+
+    # Ignore files read from every searched directory when ignore files are enabled
+    IGNORE_FILE_NAMES = [".gitignore", ".packageawareignore"]
+
+    GLOB_CHARACTERS = re.compile(r"[*?\[]")
+
+    def __init__(self, source_root, dirs_to_exclude=None, files_to_exclude=None, ignore_files_enabled=False):
+
+        # -dte / -fte entries without glob characters are exact paths, as they always were.
+        # The others are globs over the whole path: * and ? stay within one directory,
+        # ** spans any number of directories. All globs of a kind are compiled into one regex.
+        self.source_root = PackageAware.normalize_path(source_root)
+
+        self.excluded_dirs, self.excluded_dir_pattern = PackageAwareExclusions.compile_paths(dirs_to_exclude)
+        self.excluded_files, self.excluded_file_pattern = PackageAwareExclusions.compile_paths(files_to_exclude)
+
+        self.ignore_files_enabled = ignore_files_enabled
+
+        # Normalized directory path -> [(ignore file path, rules, any-rule regex)] of the ignore
+        # files found in it; each rule is (regex, negated, dir_only)
+        self.ignore_rules = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def under_root(code_root, a_path):
+
+        # A -dte / -fte entry relative to code_root. The root is escaped: glob characters in the
+        # directory the script runs from match themselves, only those of the entry are wildcards.
+        return glob.escape(code_root) + a_path
+
+    @staticmethod
+    def compile_paths(paths):
+
+        exact_paths = set()
+        patterns = []
+
+        for a_path in (paths or []):
+            normalized_path = PackageAware.normalize_path(a_path)
+
+            if PackageAwareExclusions.GLOB_CHARACTERS.search(a_path) is None:
+                exact_paths.add(normalized_path)
+            else:
+                patterns.append(PackageAwareExclusions.translate_glob(normalized_path, os.sep))
+
+        if len(patterns) == 0:
+            return exact_paths, None
+
+        return exact_paths, re.compile("(?:" + "|".join(patterns) + ")")
+
+    @staticmethod
+    def translate_glob(pattern, separator="/"):
+
+        # Regex source for a glob with .gitignore wildcard rules
+        any_name_character = "[^" + re.escape(separator) + "]"
+        sep = re.escape(separator)
+
+        regex = ""
+        index = 0
+
+        while index < len(pattern):
+
+            if pattern.startswith("**" + separator, index):
+                regex += "(?:.*" + sep + ")?"
+                index += 3
+            elif pattern.startswith("**", index):
+                regex += ".*"
+                index += 2
+            elif pattern[index] == "*":
+                regex += any_name_character + "*"
+                index += 1
+            elif pattern[index] == "?":
+                regex += any_name_character
+                index += 1
+            elif pattern[index] == "[" and pattern.find("]", index + 2) != -1:
+                class_end = pattern.find("]", index + 2)
+                class_content = pattern[index + 1:class_end]
+                if class_content.startswith("!"):
+                    class_content = "^" + class_content[1:]
+                regex += "[" + class_content.replace("\\", "\\\\").replace("[", "\\[") + "]"
+                index = class_end + 1
+            elif pattern[index] == "\\" and separator != "\\" and index + 1 < len(pattern):
+                regex += re.escape(pattern[index + 1])
+                index += 2
+            else:
+                regex += re.escape(pattern[index])
+                index += 1
+
+        return regex
+
+    @staticmethod
+    def compile_ignore_rule(line):
+
+        # (regex, negated, dir_only) for one line of a .gitignore style file, None for
+        # blank lines and comments. The regex matches paths relative to the ignore file's directory.
+        line = line.rstrip("\n").rstrip("\r")
+
+        if line.endswith(" ") and not line.endswith("\\ "):
+            line = line.rstrip(" ")
+
+        if len(line) == 0 or line.startswith("#"):
+            return None
+
+        negated = line.startswith("!")
+        if negated:
+            line = line[1:]
+        elif line.startswith("\\#") or line.startswith("\\!"):
+            line = line[1:]
+
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+
+        if len(line) == 0:
+            return None
+
+        # A pattern with a slash is relative to the ignore file's directory,
+        # one without matches a name at any depth below it
+        if "/" in line:
+            regex = PackageAwareExclusions.translate_glob(line.lstrip("/"))
+        else:
+            regex = "(?:.*/)?" + PackageAwareExclusions.translate_glob(line)
+
+        return re.compile(regex), negated, dir_only
+
+    def enter_directory(self, dir_path, ignore_file_names=None):
+
+        # Reads the ignore files of a directory about to be searched. ignore_file_names,
+        # when known from the directory listing, saves opening files that are not there.
+        if not self.ignore_files_enabled:
+            return
+
+        dir_key = PackageAware.normalize_path(dir_path)
+
+        with self.lock:
+            if dir_key in self.ignore_rules:
+                return
+
+        ignore_files = []
+
+        for ignore_file_name in PackageAwareExclusions.IGNORE_FILE_NAMES:
+
+            if ignore_file_names is not None and ignore_file_name not in ignore_file_names:
+                continue
+
+            ignore_file = os.path.join(dir_path, ignore_file_name)
+
+            try:
+                with open(ignore_file, 'r', encoding="utf-8", errors="replace") as the_file:
+                    rules = [r for r in (PackageAwareExclusions.compile_ignore_rule(l) for l in the_file) if r is not None]
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                PackageAware.console_log(
+                    "Could not read ignore file: " + ignore_file + " due to error: " + str(e),
+                    PackageAwareLog.WARNING
+                )
+                continue
+
+            if len(rules) > 0:
+                any_rule = re.compile("(?:" + "|".join(r[0].pattern for r in rules) + ")")
+                ignore_files.append((ignore_file, rules, any_rule))
+
+        with self.lock:
+            self.ignore_rules[dir_key] = ignore_files
+
+    def excluded_dir_reason(self, dir_path):
+
+        # Why a directory is not searched, None when it is
+        normalized_path = PackageAware.normalize_path(dir_path)
+
+        if normalized_path in self.excluded_dirs or \
+                (self.excluded_dir_pattern is not None and self.excluded_dir_pattern.fullmatch(normalized_path)):
+            return "dirs_to_exclude"
+
+        return self.ignored_by(normalized_path, True)
+
+    def excluded_file_reason(self, file_path):
+
+        # Why a manifest is skipped, None when it is not
+        normalized_path = PackageAware.normalize_path(file_path)
+
+        if normalized_path in self.excluded_files or \
+                (self.excluded_file_pattern is not None and self.excluded_file_pattern.fullmatch(normalized_path)):
+            return "files_to_exclude"
+
+        return self.ignored_by(normalized_path, False)
+
+    def ignored_by(self, normalized_path, is_dir):
+
+        # The ignore file excluding a path. As in git, rules in deeper directories win over
+        # those above them, and the last matching rule of a file wins.
+        if not self.ignore_files_enabled or len(self.ignore_rules) == 0:
+            return None
+
+        base_dir = os.path.dirname(normalized_path)
+
+        while True:
+
+            ignore_files = self.ignore_rules.get(base_dir)
+
+            if ignore_files:
+                relative_path = normalized_path[len(base_dir):].lstrip(os.sep).replace(os.sep, "/")
+
+                for ignore_file, rules, any_rule in reversed(ignore_files):
+
+                    if any_rule.fullmatch(relative_path) is None:
+                        continue
+
+                    for regex, negated, dir_only in reversed(rules):
+                        if (is_dir or not dir_only) and regex.fullmatch(relative_path) is not None:
+                            return None if negated else ignore_file
+
+            if base_dir == self.source_root or len(base_dir) <= len(self.source_root):
+                return None
+
+            parent_dir = os.path.dirname(base_dir)
+            if parent_dir == base_dir:
+                return None
+
+            base_dir = parent_dir
+
+
+class PackageAwareDiscoveryIndex:
+
+    INDEX_FILE_NAME = "package_aware_discovery_index.json"
+    INDEX_VERSION = 2
+
+    # A directory changed this close to the scan may change again within the same mtime
+    # tick; it is not indexed, so the next run lists it again
+    RACY_WINDOW_NS = 2 * 1000 * 1000 * 1000
+
+    def __init__(self, index_file, racy_window_ns=RACY_WINDOW_NS):
+
+        self.index_file = index_file
+        self.racy_window_ns = racy_window_ns
+
+        # Listings depend on the manifest types: any change there invalidates the index
+        self.patterns = PackageAware.MANIFEST_REGISTRY.fingerprint()
+
+        self.previous_entries = {}
+        self.entries = {}
+
+        self.trusted_before_ns = 0
+
+        self.reused_count = 0
+        self.scanned_count = 0
+
+        self.lock = threading.Lock()
+
+    def load(self):
+
+        self.previous_entries = {}
+
+        try:
+            with open(self.index_file, 'r') as the_file:
+                index_content = json.loads(the_file.read())
+
+            if index_content.get("version") != PackageAwareDiscoveryIndex.INDEX_VERSION or \
+                    index_content.get("patterns") != self.patterns:
+                PackageAware.console_log(
+                    "Discovery index is out of date, ignoring: " + self.index_file,
+                    PackageAwareLog.WARNING
+                )
+            else:
+                self.previous_entries = index_content.get("directories", {})
+
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            PackageAware.console_log(
+                "Could not read discovery index: " + self.index_file + " due to error: " + str(e),
+                PackageAwareLog.WARNING
+            )
+
+        self.entries = {}
+        self.reused_count = 0
+        self.scanned_count = 0
+
+        self.trusted_before_ns = int(time.time() * 1000 * 1000 * 1000) - self.racy_window_ns
+
+    def save(self):
+
+        PackageAware.console_log(
+            "Discovery index: " + str(self.reused_count) + " directories unchanged, " +
+            str(self.scanned_count) + " directories listed"
+        )
+
+        try:
+            os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+
+            # Only directories reached in this run are kept
+            with self.lock:
+                index_content = {
+                    "version": PackageAwareDiscoveryIndex.INDEX_VERSION,
+                    "patterns": self.patterns,
+                    "directories": self.entries
+                }
+
+            temp_file = self.index_file + ".tmp"
+            with open(temp_file, 'w') as the_file:
+                the_file.write(json.dumps(index_content))
+            os.replace(temp_file, self.index_file)
+
+        except Exception as e:
+            PackageAware.console_log(
+                "Could not write discovery index: " + self.index_file + " due to error: " + str(e),
+                PackageAwareLog.WARNING
+            )
+
+    def list_directory(self, current_dir, current_dir_real):
+
+        # Adding, removing or renaming an entry updates the directory mtime, so an unchanged
+        # mtime means the recorded subdirectories and manifest names are still accurate
+        mtime_ns = os.stat(current_dir).st_mtime_ns
+
+        entry = self.previous_entries.get(current_dir_real)
+
+        if entry is not None and entry.get("mtime_ns") == mtime_ns:
+            listing = {'dirs': entry["dirs"], 'manifests': entry["manifests"], 'ignore_files': entry["ignore_files"]}
+            reused = True
+        else:
+            listing = PackageAware.scan_directory(current_dir)
+            reused = False
+
+        with self.lock:
+            if reused:
+                self.reused_count += 1
+            else:
+                self.scanned_count += 1
+
+            if mtime_ns < self.trusted_before_ns:
+                self.entries[current_dir_real] = {
+                    "mtime_ns": mtime_ns,
+                    "dirs": listing['dirs'],
+                    "manifests": listing['manifests'],
+                    "ignore_files": listing['ignore_files']
+                }
+
+        return listing
+
+
+class PackageAwareListingPool:
+
+    # Parallel discovery for file systems where every directory listing waits on a server
+    # (NFS, SMB). Workers list directories ahead of the walk: a listed directory's
+    # subdirectories are queued at once unless excluded, so many listings are in flight while
+    # the walk still takes them one by one in the serial order and finds the same manifests.
+    # Symlinked directories are only queued by the walk, which decides in that order whether a
+    # tree reached twice is searched.
+
+    def __init__(self, package_aware, exclusions, workers):
+
+        self.package_aware = package_aware
+        self.exclusions = exclusions
+
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+
+        # Directory path -> future of its listing, until the walk takes it
+        self.listings = {}
+        self.closed = False
+
+        self.lock = threading.Lock()
+
+    def prefetch(self, current_dir, current_dir_real):
+
+        with self.lock:
+            if self.closed or current_dir in self.listings:
+                return
+
+            self.listings[current_dir] = self.executor.submit(self.list_ahead, current_dir, current_dir_real)
+
+    def take(self, current_dir, current_dir_real):
+
+        # The listing of a directory the walk has reached, waiting for it when still in flight
+        with self.lock:
+            listing = self.listings.pop(current_dir, None)
+
+        if listing is None:
+            return self.package_aware.list_directory(current_dir, current_dir_real)
+
+        return listing.result()
+
+    def list_ahead(self, current_dir, current_dir_real):
+
+        listing = self.package_aware.list_directory(current_dir, current_dir_real)
+
+        # Same decision as the walk, without its log lines: the walk reports what it skips
+        self.exclusions.enter_directory(current_dir, listing['ignore_files'])
+
+        for dir_name, is_link in listing['dirs']:
+
+            dir_path = os.path.join(current_dir, dir_name)
+
+            if is_link or self.exclusions.excluded_dir_reason(dir_path) is not None:
+                continue
+
+            self.prefetch(dir_path, os.path.join(current_dir_real, dir_name))
+
+        return listing
+
+    def shutdown(self):
+
+        # Listings still queued (below directories the walk did not enter) are dropped
+        with self.lock:
+            self.closed = True
+
+            for listing in self.listings.values():
+                listing.cancel()
+
+        self.executor.shutdown()
+
+
+class PackageAwareManifestRegistry:
+
+    # Manifest types by file name. Exact names resolve through a dict lookup; only names
+    # with wildcards (*.csproj) go through one compiled regex. Matching happens on the
+    # directory listing discovery reads anyway, so registering more types adds no file
+    # system passes. Types with 'case_sensitive': False match any spelling of the name
+    # (pipfile / Pipfile); on case-insensitive platforms every type does.
+
+    WILDCARD_CHARACTERS = re.compile(r"[*?\[]")
+
+    def __init__(self, manifest_types=None):
+
+        self.manifest_types = []
+
+        self.exact_names = {}
+        self.folded_names = {}
+        self.wildcard_types = []
+        self.wildcard_pattern = None
+
+        for manifest_type in (manifest_types or []):
+            self.register(manifest_type)
+
+    @staticmethod
+    def is_case_sensitive(manifest_type):
+        return manifest_type.get('case_sensitive', True) and os.path.normcase("A") != "a"
+
+    def register(self, manifest_type):
+
+        # Types keep their registration order: discovery results are grouped in that order
+        file_pattern = manifest_type['file_pattern']
+
+        self.manifest_types.append(manifest_type)
+
+        if PackageAwareManifestRegistry.WILDCARD_CHARACTERS.search(file_pattern) is not None:
+            self.wildcard_types.append(manifest_type)
+            self.compile_wildcards()
+        elif PackageAwareManifestRegistry.is_case_sensitive(manifest_type):
+            self.exact_names.setdefault(file_pattern, manifest_type)
+        else:
+            self.folded_names.setdefault(file_pattern.lower(), manifest_type)
+
+    def compile_wildcards(self):
+
+        # One alternation with a group per wildcard type; the group that matched names the type
+        patterns = []
+
+        for index, manifest_type in enumerate(self.wildcard_types):
+            pattern = fnmatch.translate(manifest_type['file_pattern'])
+            if not PackageAwareManifestRegistry.is_case_sensitive(manifest_type):
+                pattern = "(?i:" + pattern + ")"
+            patterns.append("(?P<type" + str(index) + ">" + pattern + ")")
+
+        self.wildcard_pattern = re.compile("|".join(patterns))
+
+    def match(self, file_name):
+
+        manifest_type = self.exact_names.get(file_name)
+        if manifest_type is not None:
+            return manifest_type
+
+        if len(self.folded_names) > 0:
+            manifest_type = self.folded_names.get(file_name.lower())
+            if manifest_type is not None:
+                return manifest_type
+
+        if self.wildcard_pattern is not None:
+            wildcard_match = self.wildcard_pattern.match(file_name)
+            if wildcard_match is not None:
+                return self.wildcard_types[int(wildcard_match.lastgroup[len("type"):])]
+
+        return None
+
+    def git_pathspecs(self):
+        return [
+            (":(glob)**/" if PackageAwareManifestRegistry.is_case_sensitive(m) else ":(glob,icase)**/") + m['file_pattern']
+            for m in self.manifest_types
+        ]
+
+    def sort_key(self):
+
+        # Orders discovery results by manifest type, then path
+        type_order = dict((m['file_pattern'], index) for index, m in enumerate(self.manifest_types))
+
+        return lambda manifest_file: (type_order[manifest_file['manifest_name']], manifest_file['path'])
+
+    def fingerprint(self):
+        # Changes whenever a type is added, removed or changed
+        return PackageAwareUploadCache.hash_bytes(json.dumps(self.manifest_types, sort_keys=True).encode("utf-8"))
+
+
+class PackageAware:
+
+    # file_pattern is also the manifest name the Manifest API is called with
+    MANIFEST_FILES = [
+        {'file_pattern': 'Gemfile', 'package_manager': 'Ruby'},
+        {'file_pattern': 'requirements.txt', 'package_manager': 'Python'},
+        {'file_pattern': 'package.json', 'package_manager': 'NPM'},
+        {'file_pattern': 'pom.xml', 'package_manager': 'Java'},
+        {'file_pattern': 'pipfile', 'package_manager': 'Python', 'case_sensitive': False},
+        {'file_pattern': 'Packages.config', 'package_manager': 'NuGet', 'case_sensitive': False},
+        {'file_pattern': '*.csproj', 'package_manager': 'NuGet', 'case_sensitive': False},
+        {'file_pattern': 'yarn.lock', 'package_manager': 'NPM'},
+        {'file_pattern': 'package-lock.json', 'package_manager': 'NPM'},
+        {'file_pattern': 'Pipfile.lock', 'package_manager': 'Python', 'case_sensitive': False},
+        {'file_pattern': 'poetry.lock', 'package_manager': 'Python'},
+        {'file_pattern': 'go.mod', 'package_manager': 'Go'},
+        {'file_pattern': 'Cargo.lock', 'package_manager': 'Rust'},
+        {'file_pattern': 'build.gradle', 'package_manager': 'Java'},
+        {'file_pattern': 'build.gradle.kts', 'package_manager': 'Java'}
+    ]
+
+    MANIFEST_REGISTRY = PackageAwareManifestRegistry(MANIFEST_FILES)
+
+    LOG = PackageAwareLog()
+
+    def __init__(self):
+        self.context = PackageAwareContext()
+        self.script = PackageAwareAnalysisScript()
+        self.client = None
+        self.upload_cache = None
+        self.discovery_index = None
+        self.verdict_cache = None
+        self.upload_journal = None
+        self.async_workspace = None
+        self.hash_cache = None
+        self.discovery_backend = PackageAwareDiscoveryBackend.WALK
+        self.discovery_workers = 1
+        self.changed_since = None
+        self.metrics = PackageAwareMetrics()
+
+        # Outcome of this run's uploads and analysis, for the verdict cache
+        self.upload_failures = 0
+        self.last_analysis_status = None
+
+    def exit(self, exit_code):
+
+        # Export the metrics of the run, then end it with exit_code
+        if self.script.metrics_format not in (None, PackageAwareMetrics.FORMAT_NONE):
+            self.metrics.export(
+                self.script.workspace_folder, self.script.metrics_format, self.context.project_name, exit_code
+            )
+
+        sys.exit(exit_code)
+
+    def run_script(self, args):
+
+        # Runs the analysis configured by args and load_script_arguments. Ends with sys.exit
+        batch_mode = self.script.project_list_file is not None
+        dry_run = self.script.dry_run
+
+        if not self.context.load(args, require_project=not batch_mode, require_api=not dry_run):
+
+            PackageAware.console_log("Could not find required Environment/Script Variables. "
+                                     "One or more are missing or empty:", PackageAwareLog.ERROR)
+
+            self.context.print_invalid(require_project=not batch_mode, require_api=not dry_run)
+
+            if self.script.on_failure == PackageAwareOnFailure.FAIL_THE_BUILD:
+                sys.exit(1)
+            else:
+                sys.exit(0)
+
+        self.discovery_backend = self.script.discovery_backend
+        self.discovery_workers = self.script.discovery_workers
+        self.changed_since = self.script.changed_since
+
+        # List the manifests without creating a client: nothing is sent and requests is not imported
+        if dry_run:
+
+            if batch_mode:
+                try:
+                    batch_projects = PackageAwareBatch.load_project_list(self.script.project_list_file)
+                except Exception as e:
+                    PackageAware.console_log("ERROR: Could not read the project list: " + str(e), PackageAwareLog.ERROR)
+                    sys.exit(self.script.failure_exit_code())
+
+                self.exit(PackageAwareBatch(self, batch_projects).list_manifests())
+
+            if self.script.workspace_folder is not None:
+                self.open_workspace_state(self.script.workspace_folder)
+
+            self.exit(self.list_manifests())
+
+        # One pooled HTTP client shared by every API call of this run
+        self.client = PackageAwareApiClient(
+            self.context,
+            pool_size=self.script.http_pool_size,
+            content_encoding=self.script.manifest_content_encoding,
+            compression_min_bytes=self.script.compression_min_bytes,
+            retry_policy=self.script.create_retry_policy(self.metrics),
+            rate_limiter=self.script.create_rate_limiter(self.metrics)
+        )
+
+        # Ensure Working Directory is present if mode is ASYNC
+        if self.script.mode in(PackageAwareModeOfOperation.ASYNC_INIT, PackageAwareModeOfOperation.ASYNC_RESULT):
+            if len(self.script.working_directory) == 0:
+                PackageAware.console_log("Working Directory is required when mode is ASYNC. Exiting.", PackageAwareLog.ERROR)
+                if self.script.on_failure == PackageAwareOnFailure.FAIL_THE_BUILD:
+                    sys.exit(1)
+                else:
+                    sys.exit(0)
+
+        if batch_mode:
+
+            if self.script.mode not in (PackageAwareModeOfOperation.RUN_AND_WAIT,
+                                                 PackageAwareModeOfOperation.ASYNC_INIT):
+                PackageAware.console_log("ERROR: A project list is only supported in run_and_wait and async_init modes. "
+                                         "Exiting.", PackageAwareLog.ERROR)
+                sys.exit(self.script.failure_exit_code())
+
+            try:
+                batch_projects = PackageAwareBatch.load_project_list(self.script.project_list_file)
+            except Exception as e:
+                PackageAware.console_log("ERROR: Could not read the project list: " + str(e), PackageAwareLog.ERROR)
+                sys.exit(self.script.failure_exit_code())
+
+            try:
+                batch_exit_code = PackageAwareBatch(self, batch_projects, self.script.batch_workers).run()
+            finally:
+                self.client.close()
+
+            self.exit(batch_exit_code)
+
+        if self.script.workspace_folder is not None:
+            self.open_workspace_state(self.script.workspace_folder)
+
+        if self.script.engine == PackageAwareEngine.ASYNCIO and \
+                self.script.mode in (PackageAwareModeOfOperation.RUN_AND_WAIT, PackageAwareModeOfOperation.ASYNC_INIT):
+
+            self.exit(PackageAwareAsyncEngine(self).run())
+
+        if self.script.mode in (PackageAwareModeOfOperation.RUN_AND_WAIT, PackageAwareModeOfOperation.ASYNC_INIT):
+
+            self.exit(self.run_analysis())
+
+        elif self.script.mode == PackageAwareModeOfOperation.ASYNC_RESULT:
+
+            # Sit and wait for ASYNC RESULT of every analysis started by async_init
+
+            self.async_workspace = PackageAwareAsyncWorkspace(self.script.async_result_file)
+
+            try:
+                pending_analyses = self.async_workspace.load()
+
+            except FileNotFoundError as e:
+                PackageAware.console_log(
+                    "ERROR: The async file (containing the report URL) could not be found. Exiting.",
+                    PackageAwareLog.ERROR
+                )
+                if self.script.on_failure == PackageAwareOnFailure.FAIL_THE_BUILD:
+                    sys.exit(1)
+                else:
+                    sys.exit(0)
+
+            if len(pending_analyses) == 0:
+                PackageAware.console_log(
+                    "ERROR: No analysis started by async_init is waiting for its result. Exiting.",
+                    PackageAwareLog.ERROR
+                )
+                self.exit(self.script.failure_exit_code())
+
+            for pending_analysis in pending_analyses:
+                self.console_log("Getting Analysis Result For: " + pending_analysis["report_status_url"])
+
+            if self.script.engine == PackageAwareEngine.ASYNCIO:
+                self.exit(PackageAwareAsyncEngine(self).run(pending_analyses))
+
+            with self.metrics.phase("result_wait"):
+                async_result_exit_code = self.wait_for_analysis_results(
+                    pending_analyses,
+                    self.script.analysis_result_max_wait,
+                    self.script.analysis_result_polling_interval,
+                    self.script.analysis_result_initial_polling_interval
+                )
+
+            self.exit(async_result_exit_code)
+
+        else:
+
+            PackageAware.console_log("ERROR: Mode argument is not a valid Package Aware Mode.", PackageAwareLog.ERROR)
+
+            if self.script.on_failure == PackageAwareOnFailure.FAIL_THE_BUILD:
+                sys.exit(1)
+            else:
+                sys.exit(0)
+
+    def open_workspace_state(self, workspace_folder):
+
+        # Upload cache and discovery index kept in workspace_folder between runs
+        if self.script.upload_cache_enabled:
+            self.upload_cache = PackageAwareUploadCache(
+                os.path.join(workspace_folder, PackageAwareUploadCache.CACHE_FILE_NAME),
+                self.context
+            )
+            self.upload_cache.load()
+
+        if self.script.discovery_index_enabled:
+            self.discovery_index = PackageAwareDiscoveryIndex(
+                os.path.join(workspace_folder, PackageAwareDiscoveryIndex.INDEX_FILE_NAME)
+            )
+            self.discovery_index.load()
+
+        if self.script.verdict_cache_enabled:
+            self.verdict_cache = PackageAwareVerdictCache(
+                os.path.join(workspace_folder, PackageAwareVerdictCache.CACHE_FILE_NAME),
+                self.context,
+                self.script.verdict_cache_ttl
+            )
+
+        if self.script.mode in (PackageAwareModeOfOperation.RUN_AND_WAIT, PackageAwareModeOfOperation.ASYNC_INIT) and \
+                not self.script.dry_run:
+            self.upload_journal = PackageAwareUploadJournal(
+                os.path.join(workspace_folder, PackageAwareUploadJournal.JOURNAL_FILE_NAME),
+                self.context
+            )
+
+    def resume_analysis(self):
+
+        # The structure of the analysis an interrupted run left unfinished, None when there is
+        # nothing to resume and a new analysis is created
+        if self.upload_journal is None or not self.script.resume:
+            return None
+
+        if self.upload_journal.load() is None:
+            PackageAware.console_log("Nothing to resume: creating a new analysis")
+            return None
+
+        self.upload_journal.resume()
+
+        PackageAware.console_log("------------------------")
+        PackageAware.console_log(
+            "Resuming Analysis: " + str(len(self.upload_journal.uploaded)) + " manifests uploaded" +
+            (", analysis started" if self.upload_journal.started else "") + " by the interrupted run"
+        )
+        PackageAware.console_log("------------------------")
+
+        return self.upload_journal.structure_response()
+
+    def skip_uploaded_manifests(self, manifest_files):
+
+        # (manifests still to upload, manifests the interrupted run uploaded already)
+        if self.upload_journal is None or len(self.upload_journal.uploaded) == 0:
+            return manifest_files, 0
+
+        pending_files = [m for m in manifest_files if not self.upload_journal.is_uploaded(m)]
+
+        PackageAware.console_log(
+            "Uploaded by the interrupted run: " + str(len(manifest_files) - len(pending_files)) + " of " +
+            str(len(manifest_files)) + " manifests"
+        )
+
+        return pending_files, len(manifest_files) - len(pending_files)
+
+    def journal_upload(self, manifest_file, content_hash, response):
+
+        if self.upload_journal is not None and response is not None and 200 <= response.status_code < 300:
+            self.upload_journal.record_upload(manifest_file, content_hash)
+
+    def lookup_verdict(self, manifest_files):
+
+        # (fingerprint, exit code) where the exit code is that of the last finished analysis
+        # of the same manifests, or None when the analysis has to run
+        fingerprint = PackageAwareVerdictCache.fingerprint(self.context.source_code_path, manifest_files)
+
+        verdict = self.verdict_cache.lookup(fingerprint)
+
+        if verdict is None:
+            return fingerprint, None
+
+        PackageAware.console_log("------------------------")
+        PackageAware.console_log(
+            "Manifests unchanged since the analysis finished at " +
+            datetime.utcfromtimestamp(verdict["finished_at"]).strftime("%Y-%m-%d %H:%M:%S") + " UTC (" +
+            verdict["status"] + "). Skipping the analysis and exiting with its result: " + str(verdict["exit_code"])
+        )
+        PackageAware.console_log("ReportUrl: " + str(verdict.get("report_url")))
+        PackageAware.console_log("------------------------")
+
+        return fingerprint, verdict["exit_code"]
+
+    def record_verdict(self, fingerprint, exit_code, report_url):
+
+        # Only a result the server decided on for the complete manifest set is reused
+        if self.last_analysis_status is None:
+            return
+
+        if self.upload_failures > 0:
+            PackageAware.console_log("Some manifests could not be uploaded: the result is not cached")
+            return
+
+        self.verdict_cache.record(fingerprint, self.last_analysis_status, exit_code, report_url)
+
+    def run_analysis(self):
+
+        # structure -> manifests -> start -> result for the run_and_wait and async_init modes.
+        # Returns the exit code of the run. PackageAwareAsyncEngine.run_analysis is the same
+        # pipeline on asyncio: both call the steps below and differ only in how requests are sent.
+
+        manifest_files = None
+        fingerprint = None
+
+        # With the verdict cache, manifests are found and fingerprinted before any API call
+        if self.verdict_cache is not None and self.script.mode == PackageAwareModeOfOperation.RUN_AND_WAIT:
+
+            with self.metrics.phase("discovery"):
+                manifest_files = self.find_manifest_files(self.script.directories_to_exclude, self.script.files_to_exclude)
+
+            fingerprint, cached_exit_code = self.lookup_verdict(manifest_files)
+
+            if cached_exit_code is not None:
+                return cached_exit_code
+
+        # An analysis an earlier run left unfinished (--resume), else a new one
+        structure_response = self.resume_analysis()
+
+        if structure_response is None:
+
+            # Make API call and store response
+            with self.metrics.phase("structure"):
+                structure_response = PackageAwareStructureAPI.exec(self.context, self.client)
+
+            if not self.structure_created(structure_response):
+                return self.script.failure_exit_code()
+
+        if not self.started_by_interrupted_run(structure_response):
+
+            manifests_found_count = self.send_manifests(
+                structure_response.project_id,
+                structure_response.analysis_id,
+                self.script.directories_to_exclude,
+                self.script.files_to_exclude,
+                self.script.upload_workers,
+                manifest_files
+            )
+
+            if manifests_found_count == 0:
+                self.log_no_manifests()
+                return self.script.failure_exit_code()
+
+            PackageAware.log_heading("Starting Analysis")
+
+            with self.metrics.phase("start"):
+                response = PackageAwareAnalysisStartAPI.exec(
+                    pa_context=self.context,
+                    pa_client=self.client,
+                    project_id=structure_response.project_id,
+                    analysis_id=structure_response.analysis_id
+                )
+
+            if not self.analysis_started(response):
+                return self.script.failure_exit_code()
+
+        # NOTE: This is the only route where the initiate request was successful
+        PackageAware.log_report_links(structure_response)
+
+        exit_code = 0
+
+        if self.script.mode == PackageAwareModeOfOperation.RUN_AND_WAIT:
+
+            with self.metrics.phase("result_wait"):
+                exit_code = self.wait_for_analysis_result(
+                    structure_response.report_status_url,
+                    self.script.analysis_result_max_wait,
+                    self.script.analysis_result_polling_interval,
+                    self.script.analysis_result_initial_polling_interval
+                )
+
+        return self.finish_analysis(structure_response, fingerprint, exit_code)
+
+    @staticmethod
+    def log_heading(title):
+        PackageAware.console_log("------------------------")
+        PackageAware.console_log(title)
+        PackageAware.console_log("------------------------")
+
+    def structure_created(self, structure_response):
+
+        # False when the Structure API call failed, the error being logged
+        if structure_response is None or structure_response.original_response is None:
+            PackageAware.console_log("A Structure API error occurred: Could not execute API.", PackageAwareLog.ERROR)
+            return False
+
+        if structure_response.original_response.status_code != 201:
+            PackageAware.console_log("A Structure API error occurred: Response Code " +
+                                     str(structure_response.original_response.status_code), PackageAwareLog.ERROR)
+            return False
+
+        # ## STRUCTURE API CALL SUCCESSFUL - CONTINUE
+
+        PackageAware.log_heading("Analysis Structure Request Created")
+
+        if self.upload_journal is not None:
+            self.upload_journal.begin(structure_response)
+
+        return True
+
+    def started_by_interrupted_run(self, structure_response):
+
+        # True when a resumed analysis has been started already: nothing is uploaded again
+        PackageAware.console_log("Analysis Id: " + structure_response.analysis_id)
+        PackageAware.console_log("Project Id:  " + structure_response.project_id)
+
+        if self.upload_journal is not None and self.upload_journal.started:
+            PackageAware.console_log("The analysis was started by the interrupted run")
+            return True
+
+        return False
+
+    def analysis_started(self, response):
+
+        # False when the Analysis Start API call failed, the error being logged
+        if response is None:
+            PackageAware.console_log(
+                "An error occurred: Analysis Start API could not be executed",
+                PackageAwareLog.ERROR
+            )
+            return False
+
+        PackageAware.console_log("Analysis Start API Response Code: " + str(response.status_code))
+
+        if response.status_code != 200:
+            PackageAware.console_log("An error occurred: " + str(response.content), PackageAwareLog.ERROR)
+            return False
+
+        if self.upload_journal is not None:
+            self.upload_journal.record_started()
+
+        return True
+
+    @staticmethod
+    def log_report_links(structure_response):
+        PackageAware.console_log(
+            "Analysis request is running, once completed, access the report using the links below"
+        )
+        PackageAware.console_log("ReportUrl: " + structure_response.report_url)
+        PackageAware.console_log("EmbedUrl: " + str(structure_response.embed_url))
+
+    def finish_analysis(self, structure_response, fingerprint, exit_code):
+
+        # run_and_wait: exit_code is the result of the analysis, cached for unchanged manifests.
+        # async_init: the analysis is left to async_result through the async result file.
+        if self.script.mode == PackageAwareModeOfOperation.RUN_AND_WAIT:
+            if fingerprint is not None:
+                self.record_verdict(fingerprint, exit_code, structure_response.report_url)
+        else:
+            self.script.write_async_result_file(structure_response.report_status_url, self.context.project_name)
+
+        if self.upload_journal is not None:
+            self.upload_journal.finish()
+
+        return self.upload_failure_exit_code(exit_code)
+
+    def find_manifest_files(self, dirs_to_exclude=None, files_to_exclude=None):
+
+        manifests_found = self.discover_manifest_files(dirs_to_exclude, files_to_exclude)
+
+        # In the daemon, manifests hashed ahead of time by a rescan are not read again for their hash
+        if self.hash_cache is not None:
+            self.hash_cache.annotate(manifests_found)
+
+        return manifests_found
+
+    def discover_manifest_files(self, dirs_to_exclude=None, files_to_exclude=None):
+
+        if self.discovery_backend in (PackageAwareDiscoveryBackend.GIT, PackageAwareDiscoveryBackend.AUTO):
+
+            manifests_found = self.find_manifest_files_in_git(dirs_to_exclude, files_to_exclude)
+
+            if manifests_found is not None:
+                return manifests_found
+
+            PackageAware.console_log("Git discovery is not available. Walking the file system instead.")
+
+            if self.changed_since is not None:
+                PackageAware.console_log("--changed-since needs git: every manifest will be considered.")
+
+        return self.walk_manifest_files(dirs_to_exclude, files_to_exclude)
+
+    def find_manifest_files_in_git(self, dirs_to_exclude=None, files_to_exclude=None):
+
+        # Manifests tracked in the git index of the work tree holding source_code_path.
+        # Untracked build output and ignored vendored trees are skipped for free.
+        # None when git or the work tree is not available.
+        source_root = self.context.source_code_path
+
+        if shutil.which("git") is None:
+            return None
+
+        inside_work_tree = PackageAware.run_git(source_root, ["rev-parse", "--is-inside-work-tree"])
+        if inside_work_tree is None or inside_work_tree.strip() != "true":
+            return None
+
+        pathspecs = PackageAware.MANIFEST_REGISTRY.git_pathspecs()
+
+        if self.changed_since is not None:
+            # Tracked manifests added or modified since the ref, including uncommitted changes
+            git_output = PackageAware.run_git(
+                source_root,
+                ["diff", "--name-only", "-z", "--relative", "--diff-filter=d", self.changed_since, "--"] + pathspecs
+            )
+            PackageAware.console_log("Considering manifests changed since: " + self.changed_since)
+        else:
+            git_output = PackageAware.run_git(source_root, ["ls-files", "-z", "--"] + pathspecs)
+
+        if git_output is None:
+            return None
+
+        exclusions = self.create_exclusions(dirs_to_exclude, files_to_exclude)
+
+        if PackageAware.is_dir_excluded(exclusions, source_root):
+            return []
+
+        exclusions.enter_directory(source_root)
+
+        manifests_found = []
+
+        # Whether a directory lies in an excluded subtree, by directory path
+        excluded_dir_cache = {}
+
+        for relative_path in sorted(set(p for p in git_output.split("\0") if len(p) > 0)):
+
+            path_parts = relative_path.split("/")
+
+            # Hidden files and folders are ignored, as they are by the file system walk
+            if any(part.startswith(".") for part in path_parts):
+                continue
+
+            file_name = path_parts[-1]
+
+            manifest_file = PackageAware.match_manifest_file(file_name)
+            if manifest_file is None:
+                continue
+
+            if PackageAware.in_excluded_dir(exclusions, source_root, path_parts[:-1], excluded_dir_cache):
+                continue
+
+            file_path = os.path.join(source_root, *path_parts)
+
+            if PackageAware.is_file_excluded(exclusions, file_path):
+                continue
+
+            manifests_found.append({
+                'path': file_path,
+                'package_manager': manifest_file['package_manager'],
+                'manifest_name': manifest_file['file_pattern']
+            })
+
+        manifests_found.sort(key=PackageAware.MANIFEST_REGISTRY.sort_key())
+
+        return manifests_found
+
+    @staticmethod
+    def in_excluded_dir(exclusions, source_root, dir_parts, excluded_dir_cache):
+
+        dir_path = source_root
+
+        for part in dir_parts:
+            dir_path = os.path.join(dir_path, part)
+
+            excluded = excluded_dir_cache.get(dir_path)
+            if excluded is None:
+                excluded = PackageAware.is_dir_excluded(exclusions, dir_path)
+                excluded_dir_cache[dir_path] = excluded
+
+                # Ignore files in the directory apply to everything below it
+                if not excluded:
+                    exclusions.enter_directory(dir_path)
+
+            if excluded:
+                return True
+
+        return False
+
+    def create_exclusions(self, dirs_to_exclude=None, files_to_exclude=None):
+        return PackageAwareExclusions(
+            self.context.source_code_path, dirs_to_exclude, files_to_exclude, bool(self.script.ignore_files_enabled)
+        )
+
+    @staticmethod
+    def is_dir_excluded(exclusions, dir_path):
+
+        reason = exclusions.excluded_dir_reason(dir_path)
+
+        if reason is not None:
+            PackageAware.console_log("Skipping directory due to " + reason + ": " + dir_path, event="directory_excluded")
+            return True
+
+        return False
+
+    @staticmethod
+    def is_file_excluded(exclusions, file_path):
+
+        reason = exclusions.excluded_file_reason(file_path)
+
+        if reason is not None:
+            PackageAware.console_log("Skipping file due to " + reason + ": " + file_path, event="file_excluded")
+            return True
+
+        return False
+
+    @staticmethod
+    def run_git(work_dir, git_arguments):
+
+        # Output of a git command run in work_dir, or None when it fails
+        try:
+            completed = subprocess.run(
+                ["git", "-C", work_dir] + git_arguments,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
+        except OSError:
+            return None
+
+        if completed.returncode != 0:
+            PackageAware.console_log(
+                "git " + git_arguments[0] + " failed: " + completed.stderr.decode("utf-8", "replace").strip()
+            )
+            return None
+
+        return completed.stdout.decode("utf-8", "replace")
+
+    def walk_manifest_files(self, dirs_to_exclude=None, files_to_exclude=None):
+
+        # Single pass over the source tree: every manifest pattern is matched
+        # against each directory listing, and excluded directories are never entered
+        exclusions = self.create_exclusions(dirs_to_exclude, files_to_exclude)
+
+        manifests_found = []
+
+        source_root = self.context.source_code_path
+        if PackageAware.is_dir_excluded(exclusions, source_root):
+            return manifests_found
+
+        # Directory symlinks are followed as the recursive glob did. Every directory is
+        # remembered by its real path so a tree reached twice (or a symlink loop) is searched once
+        source_root_real = os.path.realpath(source_root)
+        visited_dirs = set([source_root_real])
+
+        pending_dirs = [(source_root, source_root_real)]
+
+        # More than one discovery worker: directories are listed ahead of the walk by a pool
+        listing_pool = None
+        if self.discovery_workers > 1:
+            listing_pool = PackageAwareListingPool(self, exclusions, self.discovery_workers)
+            listing_pool.prefetch(source_root, source_root_real)
+
+        try:
+            while len(pending_dirs) > 0:
+
+                current_dir, current_dir_real = pending_dirs.pop()
+
+                try:
+                    if listing_pool is not None:
+                        listing = listing_pool.take(current_dir, current_dir_real)
+                    else:
+                        listing = self.list_directory(current_dir, current_dir_real)
+                except OSError as e:
+                    PackageAware.console_log(
+                        "Could not read directory: " + current_dir + " due to error: " + str(e),
+                        PackageAwareLog.WARNING
+                    )
+                    continue
+
+                # Rules of this directory's ignore files apply to everything listed below
+                exclusions.enter_directory(current_dir, listing['ignore_files'])
+
+                for dir_name, is_link in listing['dirs']:
+
+                    dir_path = os.path.join(current_dir, dir_name)
+
+                    if PackageAware.is_dir_excluded(exclusions, dir_path):
+                        continue
+
+                    if is_link:
+                        dir_real = os.path.realpath(dir_path)
+                    else:
+                        dir_real = os.path.join(current_dir_real, dir_name)
+
+                    if dir_real in visited_dirs or current_dir_real.startswith(dir_real + os.sep):
+                        continue
+
+                    visited_dirs.add(dir_real)
+                    pending_dirs.append((dir_path, dir_real))
+
+                    if listing_pool is not None:
+                        listing_pool.prefetch(dir_path, dir_real)
+
+                for file_name in listing['manifests']:
+
+                    file_path = os.path.join(current_dir, file_name)
+
+                    if PackageAware.is_file_excluded(exclusions, file_path):
+                        continue
+
+                    manifest_file = PackageAware.match_manifest_file(file_name)
+
+                    manifests_found.append({
+                        'path': file_path,
+                        'package_manager': manifest_file['package_manager'],
+                        'manifest_name': manifest_file['file_pattern']
+                    })
+
+        finally:
+            if listing_pool is not None:
+                listing_pool.shutdown()
+
+        if self.discovery_index is not None:
+            self.discovery_index.save()
+
+        # Keep the upload order of the former per-pattern search: grouped by manifest type
+        manifests_found.sort(key=PackageAware.MANIFEST_REGISTRY.sort_key())
+
+        return manifests_found
+
+    def list_directory(self, current_dir, current_dir_real):
+
+        if self.discovery_index is not None:
+            return self.discovery_index.list_directory(current_dir, current_dir_real)
+
+        return PackageAware.scan_directory(current_dir)
+
+    @staticmethod
+    def scan_directory(current_dir):
+
+        # Subdirectories (name, is_symlink), manifest file names and ignore file names of one
+        # directory, sorted by name
+        listing = {'dirs': [], 'manifests': [], 'ignore_files': []}
+
+        with os.scandir(current_dir) as dir_entries:
+            entries = sorted(dir_entries, key=lambda e: e.name)
+
+        for entry in entries:
+
+            # Hidden files and folders are ignored, as they always were by the recursive glob
+            if entry.name.startswith("."):
+                if entry.name in PackageAwareExclusions.IGNORE_FILE_NAMES:
+                    listing['ignore_files'].append(entry.name)
+                continue
+
+            try:
+                is_dir = entry.is_dir()
+                is_file = not is_dir and entry.is_file()
+                is_link = is_dir and entry.is_symlink()
+            except OSError:
+                continue
+
+            if is_dir:
+                listing['dirs'].append([entry.name, is_link])
+            elif is_file and PackageAware.match_manifest_file(entry.name) is not None:
+                listing['manifests'].append(entry.name)
+
+        return listing
+
+    @staticmethod
+    def match_manifest_file(file_name):
+        return PackageAware.MANIFEST_REGISTRY.match(file_name)
+
+    @staticmethod
+    def normalize_path(path):
+        return os.path.normcase(os.path.abspath(path))
+
+    def send_manifests(self, project_id, analysis_id, dirs_to_exclude, files_to_exclude, upload_workers=1,
+                       manifest_files=None):
+
+        PackageAware.log_manifest_search()
+
+        # Found already when the verdict cache was consulted
+        if manifest_files is None:
+            with self.metrics.phase("discovery"):
+                manifest_files = self.find_manifest_files(dirs_to_exclude, files_to_exclude)
+
+        manifest_files, resumed_count = self.prepare_uploads(manifest_files)
+
+        with self.metrics.phase("upload"):
+
+            if upload_workers > 1 and len(manifest_files) > 1:
+                PackageAware.console_log("Uploading manifests with " + str(upload_workers) + " workers")
+
+            dedup = self.plan_uploads(manifest_files)
+
+            if dedup is not None:
+                # Copies under another name go out once the upload they reference is done
+                results_by_path = self.send_manifest_batch(project_id, analysis_id, dedup.uploads, upload_workers)
+                results_by_path.update(self.send_manifest_batch(
+                    project_id, analysis_id, dedup.referencing(results_by_path), upload_workers
+                ))
+                dedup.add_duplicate_results(results_by_path)
+            else:
+                results_by_path = self.send_manifest_batch(project_id, analysis_id, manifest_files, upload_workers)
+
+        return self.count_upload_results(manifest_files, results_by_path, dedup, resumed_count)
+
+    @staticmethod
+    def log_manifest_search():
+
+        PackageAware.log_heading("Begin Recursive Manifest Search")
+
+        PackageAware.console_log(
+            "Looking for " + ", ".join(
+                m['package_manager'] + " " + m['file_pattern'] for m in PackageAware.MANIFEST_REGISTRY.manifest_types
+            ) + "..."
+        )
+
+    def prepare_uploads(self, manifest_files):
+
+        # (manifests to upload, manifests the interrupted run uploaded already)
+        for manifest_file in manifest_files:
+            # log the manifest
+            PackageAware.console_log("Found manifest file: " + manifest_file['path'], event="manifest_found")
+
+        # A resumed analysis has some of them already
+        return self.skip_uploaded_manifests(manifest_files)
+
+    def plan_uploads(self, manifest_files):
+
+        # The deduplicated upload plan, None when every manifest is uploaded as found
+        if not self.script.dedup_enabled:
+            return None
+
+        return PackageAwareManifestDedup.plan(manifest_files)
+
+    def count_upload_results(self, manifest_files, results_by_path, dedup, resumed_count):
+
+        # The number of manifests that count towards the analysis, resumed ones included
+        manifests_found_count = resumed_count
+
+        # Results are reported in discovery order, whichever upload finishes first
+        for manifest_file in manifest_files:
+            result = results_by_path[manifest_file['path']]
+
+            if dedup is not None:
+                dedup.record(result)
+
+            if result.get('duplicate'):
+                self.journal_upload(manifest_file, manifest_file['sha256'], result['response'])
+
+            if self.count_manifest_result(result):
+                manifests_found_count += 1
+
+        if dedup is not None:
+            dedup.log_summary()
+
+        if self.upload_cache is not None:
+            self.upload_cache.save()
+
+        return manifests_found_count
+
+    def send_manifest_batch(self, project_id, analysis_id, manifest_files, upload_workers=1):
+
+        # Upload results by manifest path
+        if upload_workers > 1 and len(manifest_files) > 1:
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=upload_workers) as executor:
+                upload_futures = [
+                    executor.submit(self.send_manifest, project_id, analysis_id, manifest_file)
+                    for manifest_file in manifest_files
+                ]
+
+                return dict((m['path'], f.result()) for m, f in zip(manifest_files, upload_futures))
+
+        return dict((m['path'], self.send_manifest(project_id, analysis_id, m)) for m in manifest_files)
+
+    def list_manifests(self):
+
+        # Dry run: the manifests an analysis would upload, with their size and SHA-256.
+        # Nothing is sent: no client is created and requests is never imported.
+        with self.metrics.phase("discovery"):
+            manifest_files = self.find_manifest_files(self.script.directories_to_exclude, self.script.files_to_exclude)
+
+        listed_count = 0
+        listed_bytes = 0
+
+        for manifest_file in manifest_files:
+
+            try:
+                content = PackageAware.read_manifest(manifest_file['path'])
+            except Exception as e:
+                PackageAware.console_log(
+                    "Could not read manifest file: " + manifest_file['path'] + " due to error: " + str(e),
+                    PackageAwareLog.WARNING
+                )
+                continue
+
+            if content is None:
+                PackageAware.console_log(
+                    "Manifest file is empty and would not be uploaded: " + manifest_file['path'],
+                    PackageAwareLog.WARNING
+                )
+                continue
+
+            try:
+                manifest_size = len(content.body)
+                manifest_hash = content.sha256()
+            finally:
+                content.close()
+
+            listed_count += 1
+            listed_bytes += manifest_size
+
+            PackageAware.console_log(
+                manifest_hash + " " + str(manifest_size).rjust(10) + " " +
+                manifest_file['package_manager'].ljust(6) + " " + manifest_file['path']
+            )
+
+        PackageAware.console_log(
+            "Dry run: " + str(listed_count) + " manifests (" + str(listed_bytes) + " bytes) would be uploaded. "
+            "Nothing was sent."
+        )
+
+        return 0
+
+    def log_no_manifests(self):
+
+        if self.upload_failures > 0:
+            PackageAware.console_log(
+                "None of the manifests under " + self.context.source_code_path + " could be uploaded",
+                PackageAwareLog.ERROR
+            )
+        else:
+            PackageAware.console_log(
+                "Could not locate any manifests under " + self.context.source_code_path,
+                PackageAwareLog.ERROR
+            )
+
+    def upload_failure_exit_code(self, exit_code):
+
+        # Manifests that could not be uploaded are missing from the analysis: its result is not
+        # that of the project, so the run fails as on_failure says
+        if self.upload_failures == 0 or exit_code != 0:
+            return exit_code
+
+        PackageAware.console_log(
+            str(self.upload_failures) + " manifests could not be uploaded: the analysis is incomplete",
+            PackageAwareLog.ERROR
+        )
+
+        return self.script.failure_exit_code()
+
+    def count_manifest_result(self, result):
+
+        # True when the manifest counts towards the analysis
+        self.metrics.record_manifest(result)
+
+        if not result['empty'] and (result['error'] is not None or result['response'] is None or
+                                    not 200 <= result['response'].status_code < 300):
+            self.upload_failures += 1
+
+        return PackageAware.log_manifest_result(result)
+
+    def send_manifest(self, project_id, analysis_id, manifest_file):
+
+        file_name = manifest_file['path']
+
+        result = PackageAware.new_manifest_result(file_name)
+
+        # call the api with the manifest file content as the body
+
+        try:
+
+            content = PackageAware.read_manifest(file_name)
+
+            if content is None:
+                result['empty'] = True
+                return result
+
+            try:
+
+                upload = self.prepare_manifest_upload(manifest_file, content, result)
+
+                if upload['manifest_ref'] is not None:
+                    self.check_manifest_ref(upload, result, PackageAwareManifestAPI.exec(
+                        pa_context=self.context,
+                        pa_client=self.client,
+                        project_id=project_id,
+                        analysis_id=analysis_id,
+                        manifest_name=manifest_file['manifest_name'],
+                        manifest_content=content.body,
+                        manifest_path=file_name,
+                        manifest_ref=upload['manifest_ref']
+                    ))
+
+                if result['response'] is None:
+                    result['response'] = PackageAwareManifestAPI.exec(
+                        pa_context=self.context,
+                        pa_client=self.client,
+                        project_id=project_id,
+                        analysis_id=analysis_id,
+                        manifest_name=manifest_file['manifest_name'],
+                        manifest_content=content.body,
+                        manifest_path=file_name
+                    )
+
+                self.finish_manifest_upload(manifest_file, content, upload, result)
+
+            finally:
+                content.close()
+
+        except Exception as e:
+            result['error'] = str(e)
+
+        return result
+
+    @staticmethod
+    def new_manifest_result(file_name):
+        return {'path': file_name, 'response': None, 'empty': False, 'error': None, 'cached': False}
+
+    def prepare_manifest_upload(self, manifest_file, content, result):
+
+        # The upload cache entry and the reference to send instead of the content, if any
+        result['size'] = len(content.body)
+
+        content_hash, cache_entry = self.lookup_upload_cache(manifest_file['path'], content, manifest_file)
+
+        return {
+            'content_hash': content_hash,
+            'cache_entry': cache_entry,
+            'manifest_ref': PackageAware.select_manifest_ref(manifest_file, cache_entry, result)
+        }
+
+    @staticmethod
+    def check_manifest_ref(upload, result, response):
+
+        if response is not None and 200 <= response.status_code < 300:
+            result['response'] = response
+            result['cached'] = True
+            return
+
+        # The server no longer knows the reference: fall back to a full upload
+        PackageAware.console_log(
+            "Manifest reference rejected, uploading in full: " + result['path'],
+            event="manifest_ref_rejected"
+        )
+        upload['cache_entry'] = None
+        result['same_as'] = None
+
+    def finish_manifest_upload(self, manifest_file, content, upload, result):
+
+        if result['response'] is None:
+            result['error'] = "Manifest API could not be executed"
+        elif self.upload_cache is not None:
+            self.upload_cache.record(
+                manifest_file['path'], upload['content_hash'], manifest_file['manifest_name'], result['response'],
+                upload['cache_entry']
+            )
+
+        self.journal_upload(
+            manifest_file, manifest_file.get('sha256') or upload['content_hash'] or content.sha256(), result['response']
+        )
+
+    @staticmethod
+    def read_manifest(file_name):
+
+        # Mapped manifest content, or None when the file is empty (or only whitespace)
+        content = PackageAwareManifestContent(file_name)
+        content.open()
+
+        if content.is_empty():
+            content.close()
+            return None
+
+        return content
+
+    def lookup_upload_cache(self, file_name, content, manifest_file):
+
+        if self.upload_cache is None:
+            return None, None
+
+        # Hashed already when the uploads were deduplicated
+        content_hash = manifest_file.get('sha256') or content.sha256()
+
+        return content_hash, self.upload_cache.lookup(file_name, content_hash, manifest_file['manifest_name'])
+
+    @staticmethod
+    def select_manifest_ref(manifest_file, cache_entry, result):
+
+        # A reference to another manifest of this analysis, else to the copy uploaded by an earlier run
+        if manifest_file.get('manifest_ref') is not None:
+            result['same_as'] = manifest_file['same_as']
+            return manifest_file['manifest_ref']
+
+        if cache_entry is not None:
+            return cache_entry.get("manifest_ref")
+
+        return None
+
+    @staticmethod
+    def log_manifest_result(result):
+
+        file_name = result['path']
+
+        if result['empty']:
+            PackageAware.console_log(
+                "WARNING: Manifest file is empty: " + file_name, PackageAwareLog.WARNING, event="manifest_empty"
+            )
+            return False
+
+        if result['error'] is not None:
+            PackageAware.console_log(
+                "Could not send manifest: " + file_name + " due to error: " + result['error'],
+                PackageAwareLog.ERROR, event="manifest_failed"
+            )
+            return False
+
+        if not 200 <= result['response'].status_code < 300:
+            PackageAware.console_log(
+                "Could not send manifest: " + file_name + " due to Response Code " +
+                str(result['response'].status_code),
+                PackageAwareLog.ERROR, event="manifest_failed"
+            )
+            return False
+
+        if result.get('duplicate'):
+            PackageAware.console_log(
+                "Add manifest status code: " + str(result['response'].status_code) +
+                " (" + file_name + ", identical to " + result['same_as'] + ", not sent again)",
+                event="manifest_added"
+            )
+        elif result.get('same_as') is not None and result['cached']:
+            PackageAware.console_log(
+                "Add manifest status code: " + str(result['response'].status_code) +
+                " (" + file_name + ", same content as " + result['same_as'] + ")",
+                event="manifest_added"
+            )
+        elif result['cached']:
+            PackageAware.console_log(
+                "Add manifest status code: " + str(result['response'].status_code) +
+                " (" + file_name + ", unchanged since last upload)",
+                event="manifest_added"
+            )
+        else:
+            PackageAware.console_log(
+                "Add manifest status code: " + str(result['response'].status_code) + " (" + file_name + ")",
+                event="manifest_added"
+            )
+
+        return True
+
+    @staticmethod
+    def recursive_glob(treeroot, pattern):
+        results = []
+        for base, dirs, files in os.walk(treeroot):
+            goodfiles = fnmatch.filter(files, pattern)
+            results.extend(os.path.join(base, f) for f in goodfiles)
+        return results
+
+    @staticmethod
+    def get_current_directory():
+        current_folder = os.getcwd()
+        plt = platform.system().lower()
+        if plt != "windows":
+            if current_folder[-1:] != "/":
+                current_folder += "/"
+        else:
+            if current_folder[-1:] != "\\":
+                current_folder += "\\"
+
+        return current_folder
+
+    @staticmethod
+    def console_log(message, level=PackageAwareLog.INFO, event=None):
+        # event names a per-file message that summary mode counts instead of printing
+        PackageAware.LOG.log(message, level, event)
+
+    def analysis_result_exec(self, report_status_url, analysis_result_max_wait, analysis_result_polling_interval,
+                             analysis_result_initial_polling_interval=None):
+
+        sys.exit(
+            self.wait_for_analysis_result(
+                report_status_url, analysis_result_max_wait, analysis_result_polling_interval,
+                analysis_result_initial_polling_interval
+            )
+        )
+
+    def wait_for_analysis_result(self, report_status_url, analysis_result_max_wait, analysis_result_polling_interval,
+                                 analysis_result_initial_polling_interval=None):
+
+        analysis_start_time = datetime.utcnow()
+
+        polling_schedule = PackageAwarePollingSchedule(
+            analysis_result_initial_polling_interval or analysis_result_polling_interval,
+            analysis_result_polling_interval
+        )
+
+        last_status_response = None
+
+        while True:
+
+            if (datetime.utcnow() - analysis_start_time).seconds > analysis_result_max_wait:
+                PackageAware.console_log(
+                    "Analysis Result Max Wait Time Reached (" + str(analysis_result_max_wait) + ")"
+                )
+                return 1
+
+            response = PackageAwareAnalysisResultAPI.exec(
+                self.context, self.client, report_status_url, PackageAware.status_etag(last_status_response)
+            )
+
+            response, last_status_response = PackageAware.resolve_status_response(response, last_status_response)
+
+            polling_delay = polling_schedule.next_delay(response)
+
+            exit_code = PackageAware.analysis_result_exit_code(response, polling_delay)
+
+            if exit_code is not None:
+                self.last_analysis_status = PackageAware.finished_analysis_status(response)
+                return exit_code
+
+            time.sleep(polling_delay)
+
+    def wait_for_analysis_results(self, analyses, analysis_result_max_wait, analysis_result_polling_interval,
+                                  analysis_result_initial_polling_interval=None):
+
+        # Polls every pending analysis of the async workspace; due status requests go out together
+        waiter = PackageAwareAnalysisResultWaiter(
+            analyses, analysis_result_max_wait, analysis_result_polling_interval,
+            analysis_result_initial_polling_interval
+        )
+
+        def poll(analysis):
+            return PackageAwareAnalysisResultAPI.exec(
+                self.context, self.client, analysis.report_status_url,
+                PackageAware.status_etag(analysis.last_status_response)
+            )
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(min(len(analyses), self.client.pool_size), 1)) as executor:
+
+            while True:
+
+                exit_code = waiter.exit_code()
+
+                if exit_code is not None:
+                    self.forget_reported_analyses(waiter)
+                    return exit_code
+
+                time.sleep(waiter.next_wait())
+
+                due_analyses = waiter.due_analyses()
+
+                for analysis, response in zip(due_analyses, executor.map(poll, due_analyses)):
+                    waiter.record(analysis, response)
+
+    def forget_reported_analyses(self, waiter):
+
+        # A later async_result does not wait on analyses whose result was reported already
+        if self.async_workspace is not None:
+            self.async_workspace.remove([a.report_status_url for a in waiter.analyses if a.exit_code is not None])
+
+    @staticmethod
+    def status_etag(last_status_response):
+
+        if last_status_response is None:
+            return None
+
+        return last_status_response.headers.get("ETag")
+
+    @staticmethod
+    def resolve_status_response(response, last_status_response):
+
+        # Returns the status response to evaluate and the one to keep for the next conditional request.
+        # A 304 means the status has not changed since the last full response.
+        if response is None:
+            return response, last_status_response
+
+        if response.status_code == 304 and last_status_response is not None:
+            return last_status_response, last_status_response
+
+        if response.status_code == 200:
+            return response, response
+
+        return response, last_status_response
+
+    @staticmethod
+    def finished_analysis_status(response):
+
+        # The status of an analysis the server finished (passed or failed), None for anything else
+        if response is None or response.status_code != 200:
+            return None
+
+        analysis_status = str(json.loads(response.content)["status"]).lower()
+
+        if analysis_status == "finished" or analysis_status.startswith("failed"):
+            return analysis_status
+
+        return None
+
+    @staticmethod
+    def analysis_result_exit_code(response, analysis_result_polling_interval):
+
+        # Exit code for a finished analysis, None while the analysis is still running
+
+        if response is None:
+            PackageAware.console_log("------------------------")
+            PackageAware.console_log("ERROR: Analysis Result API could not be executed", PackageAwareLog.ERROR)
+            PackageAware.console_log("------------------------")
+            return 1
+
+        if response.status_code == 200:
+
+            content_object = json.loads(response.content)
+
+            analysis_status = str(content_object["status"])
+
+            if analysis_status.lower() == "finished":
+                PackageAware.console_log("------------------------")
+                PackageAware.console_log("Analysis Completed Successfully")
+                PackageAware.console_log("------------------------")
+                return 0
+            elif analysis_status.lower().startswith("failed"):
+                PackageAware.console_log("------------------------")
+                PackageAware.console_log("Analysis complete - Failures reported.", PackageAwareLog.ERROR)
+
+                # Additional Messaging based on type of failure...
+                if analysis_status.lower().find("violation") >= 0:
+                    PackageAware.console_log("FAILURE: Violations reported.", PackageAwareLog.ERROR)
+                elif analysis_status.lower().find("vulnerabilit") >= 0:
+                    PackageAware.console_log("FAILURE: Vulnerabilities reported.", PackageAwareLog.ERROR)
+                else:
+                    # Unknown failure - no additional messaging-out
+                    pass
+                PackageAware.console_log("------------------------")
+
+                # Fail with error
+                return 1
+
+            elif analysis_status.lower() == "error":
+                PackageAware.console_log(
+                    "Analysis Error. Will retry in " +
+                    str(round(analysis_result_polling_interval, 1)) + " seconds."
+                )
+                return None
+            else:
+                # Status code that is not pertinent to the result
+                PackageAware.console_log(
+                    "Analysis Ongoing. Will retry in " +
+                    str(round(analysis_result_polling_interval, 1)) + " seconds."
+                )
+                return None
+        else:
+            PackageAware.console_log("------------------------")
+            PackageAware.console_log(
+                "ERROR: API Response Status Code: " + str(response.status_code),
+                PackageAwareLog.ERROR
+            )
+            PackageAware.console_log("------------------------")
+            return 1
+
+
+class PackageAwareAnalysisStartAPI:
+
+    URI_TEMPLATE = "{pa_base_uri}clients/{pa_client_id}/projects/{pa_project_id}/analysis/{pa_analysis_id}"
+
+    def __init__(self):
+        pass
+
+    @staticmethod
+    def generate_api_url(pa_context, project_id, analysis_id):
+        api_url = PackageAwareAnalysisStartAPI.URI_TEMPLATE
+        api_url = api_url.replace("{pa_base_uri}", pa_context.base_uri)
+        api_url = api_url.replace("{pa_client_id}", pa_context.client_id)
+        api_url = api_url.replace("{pa_project_id}", project_id)
+        api_url = api_url.replace("{pa_analysis_id}", analysis_id)
+
+        return api_url
+
+    @staticmethod
+    def exec(pa_context, pa_client, project_id, analysis_id):
+
+        url = PackageAwareAnalysisStartAPI.generate_api_url(pa_context, project_id, analysis_id)
+
+        def send_request():
+            return pa_client.request(
+                "PUT",
+                url=url,
+                data="{}",
+                headers={'content-length': str(0)}
+            )
+
+        return pa_client.retry_policy.run("Analysis Start", send_request)
+
+    @staticmethod
+    async def async_exec(pa_context, pa_client, project_id, analysis_id):
+
+        url = PackageAwareAnalysisStartAPI.generate_api_url(pa_context, project_id, analysis_id)
+
+        async def send_request():
+            return await pa_client.request(
+                "PUT",
+                url=url,
+                data="{}"
+            )
+
+        return await pa_client.retry_policy.async_run("Analysis Start", send_request)
+
+
+class PackageAwareAnalysisResultAPI:
+
+    def __init__(self):
+
+        pass
+
+    @staticmethod
+    def generate_headers(etag):
+
+        # Conditional request: an unchanged status comes back as an empty 304
+        if etag is None:
+            return None
+
+        return {'If-None-Match': etag}
+
+    @staticmethod
+    def exec(pa_context, pa_client, result_uri, etag=None):
+
+        def send_request():
+            return pa_client.request(
+                "GET",
+                url=result_uri,
+                headers=PackageAwareAnalysisResultAPI.generate_headers(etag)
+            )
+
+        return pa_client.retry_policy.run("Analysis Result", send_request)
+
+    @staticmethod
+    async def async_exec(pa_context, pa_client, result_uri, etag=None):
+
+        async def send_request():
+            return await pa_client.request(
+                "GET",
+                url=result_uri,
+                headers=PackageAwareAnalysisResultAPI.generate_headers(etag)
+            )
+
+        return await pa_client.retry_policy.async_run("Analysis Result", send_request)
+
+
+class PackageAwareAsyncWorkspace:
+
+    # The async result file shared by async_init and async_result. It holds every analysis
+    # started by async_init (one per project, the latest wins) so async_result can wait on
+    # all of them. The latest report_status_url is also kept at the top level, which is the
+    # format older versions of this script read and write. async_result removes the analyses
+    # it has reported; analyses older than MAX_AGE_SECONDS are no longer waited on.
+
+    MAX_AGE_SECONDS = 24 * 60 * 60
+
+    # The lock is held for one read and write of the file. It records its holder and is taken
+    # over only when that process is gone or the lock is older than LOCK_STALE_SECONDS.
+    LOCK_TIMEOUT_SECONDS = 60
+    LOCK_STALE_SECONDS = 30
+
+    def __init__(self, async_result_file):
+        self.async_result_file = async_result_file
+        self.lock_file = async_result_file + ".lock"
+        self.lock_holder = None
+
+    def load(self):
+
+        # FileNotFoundError when async_init has not run
+        return [a for a in self.read_analyses() if not self.is_expired(a)]
+
+    def read_analyses(self):
+
+        with open(self.async_result_file, 'r') as the_file:
+            async_result_values = json.loads(the_file.read())
+
+        analyses = async_result_values.get("analyses")
+
+        if analyses is None:
+            return [{"project_name": None, "report_status_url": async_result_values["report_status_url"]}]
+
+        return analyses
+
+    @staticmethod
+    def is_expired(analysis):
+
+        # Files written by older versions carry no start time: their analysis is kept
+        started_at = analysis.get("started_at")
+
+        if started_at is None or time.time() - started_at <= PackageAwareAsyncWorkspace.MAX_AGE_SECONDS:
+            return False
+
+        PackageAware.console_log(
+            "Skipping the analysis started on " +
+            datetime.utcfromtimestamp(started_at).strftime("%Y-%m-%d %H:%M:%S") + " UTC, older than " +
+            str(PackageAwareAsyncWorkspace.MAX_AGE_SECONDS // 3600) + " hours: " + analysis["report_status_url"],
+            PackageAwareLog.WARNING
+        )
+        return True
+
+    def add(self, project_name, report_status_url):
+
+        # async_init runs of several projects (or processes) may share the workspace
+        self.acquire_lock()
+
+        try:
+            try:
+                analyses = self.load()
+            except FileNotFoundError:
+                analyses = []
+            except Exception as e:
+                PackageAware.console_log("Could not read async file, starting over: " + str(e), PackageAwareLog.WARNING)
+                analyses = []
+
+            analyses = [
+                a for a in analyses if a.get("project_name") is not None and a.get("project_name") != project_name
+            ]
+            analyses.append({
+                "project_name": project_name,
+                "report_status_url": report_status_url,
+                "started_at": time.time()
+            })
+
+            self.write(analyses)
+
+        finally:
+            self.release_lock()
+
+    def remove(self, report_status_urls):
+
+        # Forgets the analyses async_result has reported. The file goes once none is left.
+        if len(report_status_urls) == 0:
+            return
+
+        self.acquire_lock()
+
+        try:
+            try:
+                analyses = [a for a in self.load() if a["report_status_url"] not in report_status_urls]
+            except FileNotFoundError:
+                return
+
+            if len(analyses) == 0:
+                os.remove(self.async_result_file)
+            else:
+                self.write(analyses)
+
+        finally:
+            self.release_lock()
+
+    def write(self, analyses):
+
+        os.makedirs(os.path.dirname(self.async_result_file) or ".", exist_ok=True)
+
+        # A temp file of its own, so a lock taken over from a live process cannot mix up two writes
+        temp_file = self.async_result_file + "." + str(os.getpid()) + "." + str(threading.get_ident()) + ".tmp"
+        with open(temp_file, 'w') as the_file:
+            the_file.write(json.dumps({"report_status_url": analyses[-1]["report_status_url"], "analyses": analyses}))
+        os.replace(temp_file, self.async_result_file)
+
+    def acquire_lock(self):
+
+        os.makedirs(os.path.dirname(self.lock_file) or ".", exist_ok=True)
+
+        self.lock_holder = json.dumps({"pid": os.getpid(), "host": platform.node(), "token": random.getrandbits(64)})
+
+        deadline = time.time() + PackageAwareAsyncWorkspace.LOCK_TIMEOUT_SECONDS
+
+        while True:
+            try:
+                lock_fd = os.open(self.lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                self.remove_stale_lock()
+
+                if time.time() > deadline:
+                    raise TimeoutError("Timed out waiting for the async file lock: " + self.lock_file)
+
+                time.sleep(0.05)
+                continue
+
+            try:
+                os.write(lock_fd, self.lock_holder.encode("utf-8"))
+            finally:
+                os.close(lock_fd)
+
+            return
+
+    def remove_stale_lock(self):
+
+        try:
+            with open(self.lock_file, 'r') as the_file:
+                lock_content = the_file.read()
+            lock_age = time.time() - os.path.getmtime(self.lock_file)
+        except OSError:
+            return
+
+        try:
+            holder = json.loads(lock_content)
+        except ValueError:
+            # Being written by its holder, or left by an older version: only its age tells
+            holder = {}
+
+        if lock_age <= PackageAwareAsyncWorkspace.LOCK_STALE_SECONDS and \
+                not PackageAwareAsyncWorkspace.is_dead_holder(holder):
+            return
+
+        # Taken over only if it is still the lock judged stale, not one created since
+        try:
+            with open(self.lock_file, 'r') as the_file:
+                if the_file.read() != lock_content:
+                    return
+            os.remove(self.lock_file)
+        except OSError:
+            return
+
+        PackageAware.console_log("Took over stale async file lock: " + self.lock_file, PackageAwareLog.WARNING)
+
+    @staticmethod
+    def is_dead_holder(holder):
+
+        # Only a process of this host can be checked, and only on POSIX (signal 0 probes it)
+        if os.name != "posix" or holder.get("host") != platform.node() or not isinstance(holder.get("pid"), int):
+            return False
+
+        try:
+            os.kill(holder["pid"], 0)
+        except ProcessLookupError:
+            return True
+        except OSError:
+            return False
+
+        return False
+
+    def release_lock(self):
+
+        # Left alone when another process took it over
+        try:
+            with open(self.lock_file, 'r') as the_file:
+                if the_file.read() != self.lock_holder:
+                    return
+            os.remove(self.lock_file)
+        except OSError:
+            pass
+
+
+class PackageAwarePendingAnalysis:
+
+    # Polling state of one analysis waited on by async_result
+
+    def __init__(self, project_name, report_status_url, polling_schedule):
+        self.project_name = project_name
+        self.report_status_url = report_status_url
+        self.polling_schedule = polling_schedule
+        self.last_status_response = None
+        self.next_poll_at = 0
+        self.exit_code = None
+
+    def label(self):
+        return self.project_name if self.project_name is not None else self.report_status_url
+
+
+class PackageAwareAnalysisResultWaiter:
+
+    # Decides the result of several analyses polled side by side. Each analysis keeps its own
+    # polling schedule and ETag; the first failure decides the run without waiting for the
+    # others, otherwise the run succeeds once every analysis has finished.
+
+    def __init__(self, analyses, analysis_result_max_wait, analysis_result_polling_interval,
+                 analysis_result_initial_polling_interval=None):
+
+        self.analyses = [
+            PackageAwarePendingAnalysis(
+                a.get("project_name"),
+                a["report_status_url"],
+                PackageAwarePollingSchedule(
+                    analysis_result_initial_polling_interval or analysis_result_polling_interval,
+                    analysis_result_polling_interval
+                )
+            )
+            for a in analyses
+        ]
+
+        self.analysis_result_max_wait = analysis_result_max_wait
+        self.start_time = time.time()
+
+    def due_analyses(self):
+
+        now = time.time()
+
+        return [a for a in self.analyses if a.exit_code is None and a.next_poll_at <= now]
+
+    def next_wait(self):
+
+        pending_poll_times = [a.next_poll_at for a in self.analyses if a.exit_code is None]
+
+        if len(pending_poll_times) == 0:
+            return 0
+
+        return max(min(pending_poll_times) - time.time(), 0)
+
+    def record(self, analysis, response):
+
+        response, analysis.last_status_response = PackageAware.resolve_status_response(
+            response, analysis.last_status_response
+        )
+
+        polling_delay = analysis.polling_schedule.next_delay(response)
+
+        if len(self.analyses) > 1:
+            PackageAware.console_log("Analysis Result For: " + analysis.label())
+
+        analysis.exit_code = PackageAware.analysis_result_exit_code(response, polling_delay)
+
+        if analysis.exit_code is None:
+            analysis.next_poll_at = time.time() + polling_delay
+
+    def exit_code(self):
+
+        # None while undecided
+        failed = [a for a in self.analyses if a.exit_code is not None and a.exit_code != 0]
+
+        if len(failed) > 0:
+            if len(self.analyses) > 1:
+                self.log_summary()
+            return 1
+
+        if all(a.exit_code == 0 for a in self.analyses):
+            if len(self.analyses) > 1:
+                self.log_summary()
+            return 0
+
+        if time.time() - self.start_time > self.analysis_result_max_wait:
+            PackageAware.console_log(
+                "Analysis Result Max Wait Time Reached (" + str(self.analysis_result_max_wait) + ")"
+            )
+            if len(self.analyses) > 1:
+                self.log_summary()
+            return 1
+
+        return None
+
+    def log_summary(self):
+
+        PackageAware.console_log("------------------------")
+        PackageAware.console_log("Analysis Results")
+        PackageAware.console_log("------------------------")
+
+        for analysis in self.analyses:
+
+            if analysis.exit_code is None:
+                outcome = "PENDING "
+            elif analysis.exit_code == 0:
+                outcome = "FINISHED"
+            else:
+                outcome = "FAILED  "
+
+            PackageAware.console_log(outcome + " " + analysis.label())
+
+
+class PackageAwarePollingSchedule:
+
+    # Polls start fast and back off towards the configured polling interval, so a short
+    # analysis is noticed within seconds while a long one is not polled needlessly often
+
+    DEFAULT_INITIAL_INTERVAL = 2
+    MIN_INITIAL_INTERVAL = 1
+    BACKOFF_FACTOR = 1.5
+
+    def __init__(self, initial_interval, max_interval):
+        self.next_interval = min(initial_interval, max_interval)
+        self.max_interval = max_interval
+
+    def next_delay(self, response=None):
+
+        delay = self.next_interval
+        self.next_interval = min(self.max_interval, self.next_interval * PackageAwarePollingSchedule.BACKOFF_FACTOR)
+
+        # The server knows best when the status is worth asking for again
+        if response is not None:
+            retry_after = PackageAwareRetryPolicy.parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after is not None:
+                delay = retry_after
+
+        return delay
+
+
+class PackageAwareOnFailure:
+
+    FAIL_THE_BUILD = "fail_the_build"
+    CONTINUE_ON_FAILURE = "continue_on_failure"
+
+
+class PackageAwareModeOfOperation:
+
+    RUN_AND_WAIT = "run_and_wait"
+    ASYNC_INIT = "async_init"
+    ASYNC_RESULT = "async_result"
+
+
+class PackageAwareDiscoveryBackend:
+
+    WALK = "walk"
+    GIT = "git"
+    AUTO = "auto"
+
+
+class PackageAwareEngine:
+
+    SYNC = "sync"
+    ASYNCIO = "asyncio"
+
+
+class PackageAwareAsyncEngine:
+
+    # Runs the run_and_wait / async_init pipeline on one event loop: manifest discovery
+    # overlaps the Structure API call, uploads share a bounded pool of connections and
+    # polling does not block a thread. Exit codes match the synchronous path.
+
+    def __init__(self, package_aware, client=None):
+        self.package_aware = package_aware
+        self.client = client
+
+    def run(self, pending_analyses=None):
+
+        import asyncio
+
+        # pending_analyses: the async workspace entries to wait on in async_result mode
+
+        loop = asyncio.new_event_loop()
+
+        try:
+            return loop.run_until_complete(self.run_pipeline(pending_analyses))
+        finally:
+            loop.close()
+
+    async def run_pipeline(self, pending_analyses=None):
+
+        script = self.package_aware.script
+
+        self.client = PackageAwareAsyncApiClient(
+            self.package_aware.context,
+            pool_size=script.http_pool_size,
+            content_encoding=script.manifest_content_encoding,
+            compression_min_bytes=script.compression_min_bytes,
+            retry_policy=script.create_retry_policy(self.package_aware.metrics),
+            rate_limiter=script.create_rate_limiter(self.package_aware.metrics)
+        )
+
+        await self.client.open()
+
+        try:
+            if pending_analyses is not None:
+                with self.package_aware.metrics.phase("result_wait"):
+                    return await self.wait_for_analysis_results(
+                        pending_analyses,
+                        script.analysis_result_max_wait,
+                        script.analysis_result_polling_interval,
+                        script.analysis_result_initial_polling_interval
+                    )
+
+            return await self.run_analysis()
+        finally:
+            await self.client.close()
+
+    async def run_analysis(self):
+
+        import asyncio
+
+        package_aware = self.package_aware
+        script = package_aware.script
+
+        loop = asyncio.get_event_loop()
+
+        def find_manifest_files():
+            with package_aware.metrics.phase("discovery"):
+                return package_aware.find_manifest_files(script.directories_to_exclude, script.files_to_exclude)
+
+        # Walk the source tree in a worker thread while the Structure API call is in flight
+        discovery = loop.run_in_executor(None, find_manifest_files)
+
+        try:
+            return await self.run_pipeline_steps(discovery)
+        finally:
+            # A run that ends early has not waited for the walk: it must not outlive the run.
+            # The executor thread cannot be cancelled, so it is waited for, its error unread.
+            await asyncio.wait([discovery])
+            if not discovery.cancelled():
+                discovery.exception()
+
+    async def run_pipeline_steps(self, discovery):
+
+        # The steps of PackageAware.run_analysis, with requests sent on the event loop
+        import asyncio
+
+        package_aware = self.package_aware
+        context = package_aware.context
+        script = package_aware.script
+
+        loop = asyncio.get_event_loop()
+
+        fingerprint = None
+
+        # With the verdict cache, manifests are found and fingerprinted before any API call
+        if package_aware.verdict_cache is not None and script.mode == PackageAwareModeOfOperation.RUN_AND_WAIT:
+
+            fingerprint, cached_exit_code = await loop.run_in_executor(
+                None, package_aware.lookup_verdict, await discovery
+            )
+
+            if cached_exit_code is not None:
+                return cached_exit_code
+
+        # An analysis an earlier run left unfinished (--resume), else a new one
+        structure_response = package_aware.resume_analysis()
+
+        if structure_response is None:
+
+            with package_aware.metrics.phase("structure"):
+                structure_response = await PackageAwareStructureAPI.async_exec(context, self.client)
+
+            if not package_aware.structure_created(structure_response):
+                return script.failure_exit_code()
+
+        if not package_aware.started_by_interrupted_run(structure_response):
+
+            PackageAware.log_manifest_search()
+
+            manifest_files, resumed_count = await loop.run_in_executor(
+                None, package_aware.prepare_uploads, await discovery
+            )
+
+            PackageAware.console_log(
+                "Uploading manifests with up to " + str(script.upload_workers) + " concurrent requests"
+            )
+
+            upload_slots = asyncio.Semaphore(script.upload_workers)
+
+            async def send_manifest_batch(batch_files):
+                upload_results = await asyncio.gather(*[
+                    self.send_manifest(upload_slots, structure_response.project_id, structure_response.analysis_id, m)
+                    for m in batch_files
+                ])
+                return dict((m['path'], r) for m, r in zip(batch_files, upload_results))
+
+            with package_aware.metrics.phase("upload"):
+
+                dedup = await loop.run_in_executor(None, package_aware.plan_uploads, manifest_files)
+
+                if dedup is not None:
+                    # Copies under another name go out once the upload they reference is done
+                    results_by_path = await send_manifest_batch(dedup.uploads)
+                    results_by_path.update(await send_manifest_batch(dedup.referencing(results_by_path)))
+                    dedup.add_duplicate_results(results_by_path)
+                else:
+                    results_by_path = await send_manifest_batch(manifest_files)
+
+            manifests_found_count = package_aware.count_upload_results(
+                manifest_files, results_by_path, dedup, resumed_count
+            )
+
+            if manifests_found_count == 0:
+                package_aware.log_no_manifests()
+                return script.failure_exit_code()
+
+            PackageAware.log_heading("Starting Analysis")
+
+            with package_aware.metrics.phase("start"):
+                response = await PackageAwareAnalysisStartAPI.async_exec(
+                    context, self.client, structure_response.project_id, structure_response.analysis_id
+                )
+
+            if not package_aware.analysis_started(response):
+                return script.failure_exit_code()
+
+        PackageAware.log_report_links(structure_response)
+
+        exit_code = 0
+
+        if script.mode == PackageAwareModeOfOperation.RUN_AND_WAIT:
+            with package_aware.metrics.phase("result_wait"):
+                exit_code = await self.wait_for_analysis_result(
+                    structure_response.report_status_url,
+                    script.analysis_result_max_wait,
+                    script.analysis_result_polling_interval,
+                    script.analysis_result_initial_polling_interval
+                )
+
+        return package_aware.finish_analysis(structure_response, fingerprint, exit_code)
+
+    async def send_manifest(self, upload_slots, project_id, analysis_id, manifest_file):
+
+        import asyncio
+
+        package_aware = self.package_aware
+
+        file_name = manifest_file['path']
+
+        result = PackageAware.new_manifest_result(file_name)
+
+        async with upload_slots:
+
+            try:
+
+                content = await asyncio.get_event_loop().run_in_executor(None, PackageAware.read_manifest, file_name)
+
+                if content is None:
+                    result['empty'] = True
+                    return result
+
+                try:
+
+                    upload = package_aware.prepare_manifest_upload(manifest_file, content, result)
+
+                    if upload['manifest_ref'] is not None:
+                        PackageAware.check_manifest_ref(upload, result, await PackageAwareManifestAPI.async_exec(
+                            package_aware.context, self.client, project_id, analysis_id,
+                            manifest_file['manifest_name'], content.body,
+                            manifest_path=file_name,
+                            manifest_ref=upload['manifest_ref']
+                        ))
+
+                    if result['response'] is None:
+                        result['response'] = await PackageAwareManifestAPI.async_exec(
+                            package_aware.context, self.client, project_id, analysis_id,
+                            manifest_file['manifest_name'], content.body,
+                            manifest_path=file_name
+                        )
+
+                    package_aware.finish_manifest_upload(manifest_file, content, upload, result)
+
+                finally:
+                    content.close()
+
+            except Exception as e:
+                result['error'] = str(e)
+
+        return result
+
+    async def wait_for_analysis_result(self, report_status_url, analysis_result_max_wait,
+                                       analysis_result_polling_interval, analysis_result_initial_polling_interval=None):
+
+        import asyncio
+
+        analysis_start_time = datetime.utcnow()
+
+        polling_schedule = PackageAwarePollingSchedule(
+            analysis_result_initial_polling_interval or analysis_result_polling_interval,
+            analysis_result_polling_interval
+        )
+
+        last_status_response = None
+
+        while True:
+
+            if (datetime.utcnow() - analysis_start_time).seconds > analysis_result_max_wait:
+                PackageAware.console_log(
+                    "Analysis Result Max Wait Time Reached (" + str(analysis_result_max_wait) + ")"
+                )
+                return 1
+
+            response = await PackageAwareAnalysisResultAPI.async_exec(
+                self.package_aware.context, self.client, report_status_url,
+                PackageAware.status_etag(last_status_response)
+            )
+
+            response, last_status_response = PackageAware.resolve_status_response(response, last_status_response)
+
+            polling_delay = polling_schedule.next_delay(response)
+
+            exit_code = PackageAware.analysis_result_exit_code(response, polling_delay)
+
+            if exit_code is not None:
+                self.package_aware.last_analysis_status = PackageAware.finished_analysis_status(response)
+                return exit_code
+
+            await asyncio.sleep(polling_delay)
+
+    async def wait_for_analysis_results(self, analyses, analysis_result_max_wait, analysis_result_polling_interval,
+                                        analysis_result_initial_polling_interval=None):
+
+        import asyncio
+
+        # Polls every pending analysis of the async workspace; due status requests go out together
+        waiter = PackageAwareAnalysisResultWaiter(
+            analyses, analysis_result_max_wait, analysis_result_polling_interval,
+            analysis_result_initial_polling_interval
+        )
+
+        while True:
+
+            exit_code = waiter.exit_code()
+
+            if exit_code is not None:
+                self.package_aware.forget_reported_analyses(waiter)
+                return exit_code
+
+            await asyncio.sleep(waiter.next_wait())
+
+            due_analyses = waiter.due_analyses()
+
+            responses = await asyncio.gather(*[
+                PackageAwareAnalysisResultAPI.async_exec(
+                    self.package_aware.context, self.client, analysis.report_status_url,
+                    PackageAware.status_etag(analysis.last_status_response)
+                )
+                for analysis in due_analyses
+            ])
+
+            for analysis, response in zip(due_analyses, responses):
+                waiter.record(analysis, response)
+
+
+class PackageAwareBatch:
+
+    # Runs the pipeline for every project of a project list in one process. Projects share
+    # the HTTP client (and so its connections and retry budget); at most `workers` projects
+    # are in flight at a time. The batch fails when any project fails.
+
+    DEFAULT_WORKERS = 4
+
+    def __init__(self, package_aware, projects, workers=DEFAULT_WORKERS):
+        self.package_aware = package_aware
+        self.projects = projects
+        self.workers = workers
+
+    @staticmethod
+    def load_project_list(project_list_file):
+
+        # A JSON list of {"project_name", "source_code_path"[, "directories_to_exclude", "files_to_exclude"]}.
+        # Excludes are a list or a comma separated string, like -dte / -fte.
+        with open(project_list_file, 'r') as the_file:
+            project_list = json.loads(the_file.read())
+
+        if not isinstance(project_list, list):
+            raise ValueError("The project list must be a JSON list")
+
+        projects = []
+
+        for position, project in enumerate(project_list):
+
+            if not isinstance(project, dict):
+                raise ValueError("Project " + str(position + 1) + " is not a JSON object")
+
+            for key in ("project_name", "source_code_path"):
+                if len(str(project.get(key) or "").strip()) == 0:
+                    raise ValueError("Project " + str(position + 1) + " is missing " + key)
+
+            projects.append(project)
+
+        return projects
+
+    @staticmethod
+    def split_paths(paths):
+
+        if isinstance(paths, str):
+            paths = paths.split(",")
+
+        return [a_path.strip() for a_path in paths if len(a_path.strip()) > 0]
+
+    def create_project(self, project):
+
+        # A PackageAware for one project: its own context, excludes and workspace state,
+        # everything else as configured for the batch
+        shared = self.package_aware
+
+        project_aware = PackageAware()
+
+        project_aware.context.base_uri = shared.context.base_uri
+        project_aware.context.client_id = shared.context.client_id
+        project_aware.context.api_key = shared.context.api_key
+        project_aware.context.project_name = str(project["project_name"]).strip()
+        project_aware.context.source_code_path = str(project["source_code_path"]).strip()
+
+        project_aware.script = copy.copy(shared.script)
+
+        if project.get("directories_to_exclude") is not None:
+            project_aware.script.directories_to_exclude = [
+                PackageAwareExclusions.under_root(shared.script.code_root, a_dir)
+                for a_dir in PackageAwareBatch.split_paths(project["directories_to_exclude"])
+            ]
+
+        if project.get("files_to_exclude") is not None:
+            project_aware.script.files_to_exclude = [
+                PackageAwareExclusions.under_root(shared.script.code_root, a_file)
+                for a_file in PackageAwareBatch.split_paths(project["files_to_exclude"])
+            ]
+
+        project_aware.client = shared.client
+        project_aware.metrics = shared.metrics
+        project_aware.discovery_backend = shared.discovery_backend
+        project_aware.discovery_workers = shared.discovery_workers
+        project_aware.changed_since = shared.changed_since
+
+        if shared.script.workspace_folder is not None:
+            project_aware.open_workspace_state(
+                PackageAwareBatch.project_workspace_folder(shared.script.workspace_folder, project_aware.context)
+            )
+
+        return project_aware
+
+    @staticmethod
+    def project_workspace_folder(workspace_folder, pa_context):
+        return os.path.join(
+            workspace_folder, "projects",
+            PackageAwareUploadCache.hash_bytes(pa_context.project_name.encode("utf-8"))[:16]
+        )
+
+    def run(self):
+
+        import asyncio
+
+        PackageAware.console_log(
+            "Batch of " + str(len(self.projects)) + " projects with up to " + str(self.workers) + " in flight"
+        )
+
+        if self.package_aware.script.engine == PackageAwareEngine.ASYNCIO:
+
+            loop = asyncio.new_event_loop()
+
+            try:
+                results = loop.run_until_complete(self.run_async_projects())
+            finally:
+                loop.close()
+
+        else:
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+                results = list(executor.map(self.run_project, self.projects))
+
+        return self.summarize(results)
+
+    def list_manifests(self):
+
+        # Dry run of every project, one after another
+        for project in self.projects:
+            project_aware = self.create_project(project)
+
+            PackageAware.console_log("Project: " + project_aware.context.project_name)
+
+            project_aware.list_manifests()
+
+        return 0
+
+    def run_project(self, project):
+
+        start_time = time.time()
+
+        try:
+            exit_code = self.create_project(project).run_analysis()
+        except Exception as e:
+            PackageAware.console_log(
+                "Project " + str(project["project_name"]) + " failed due to error: " + str(e),
+                PackageAwareLog.ERROR
+            )
+            exit_code = self.package_aware.script.failure_exit_code()
+
+        return {'project': project, 'exit_code': exit_code, 'duration': time.time() - start_time}
+
+    async def run_async_projects(self):
+
+        import asyncio
+
+        script = self.package_aware.script
+
+        client = PackageAwareAsyncApiClient(
+            self.package_aware.context,
+            pool_size=script.http_pool_size,
+            content_encoding=script.manifest_content_encoding,
+            compression_min_bytes=script.compression_min_bytes,
+            retry_policy=script.create_retry_policy(self.package_aware.metrics),
+            rate_limiter=script.create_rate_limiter(self.package_aware.metrics)
+        )
+
+        await client.open()
+
+        project_slots = asyncio.Semaphore(self.workers)
+
+        async def run_async_project(project):
+
+            async with project_slots:
+
+                start_time = time.time()
+
+                try:
+                    # Workspace state files are read in create_project; keep them off the loop
+                    project_aware = await asyncio.get_event_loop().run_in_executor(None, self.create_project, project)
+                    exit_code = await PackageAwareAsyncEngine(project_aware, client).run_analysis()
+                except Exception as e:
+                    PackageAware.console_log(
+                        "Project " + str(project["project_name"]) + " failed due to error: " + str(e),
+                        PackageAwareLog.ERROR
+                    )
+                    exit_code = script.failure_exit_code()
+
+                return {'project': project, 'exit_code': exit_code, 'duration': time.time() - start_time}
+
+        try:
+            return await asyncio.gather(*[run_async_project(project) for project in self.projects])
+        finally:
+            await client.close()
+
+    def summarize(self, results):
+
+        PackageAware.console_log("------------------------")
+        PackageAware.console_log("Batch Summary")
+        PackageAware.console_log("------------------------")
+
+        failed_count = 0
+
+        for result in results:
+
+            if result['exit_code'] != 0:
+                failed_count += 1
+
+            PackageAware.console_log(
+                ("OK     " if result['exit_code'] == 0 else "FAILED ") +
+                str(result['project']["project_name"]) + " (" + str(result['project']["source_code_path"]) + ") " +
+                "in " + str(round(result['duration'], 1)) + "s"
+            )
+
+        PackageAware.console_log(
+            str(len(results) - failed_count) + " of " + str(len(results)) + " projects succeeded"
+        )
+
+        return 1 if failed_count > 0 else 0
+
+
+class PackageAwareDaemonStream:
+
+    # Console output of a daemon run, sent to the client as {"output": text} lines.
+    # Without a connection (background rescans) the output is dropped.
+
+    def __init__(self, connection_file=None):
+        self.connection_file = connection_file
+
+    def write(self, text):
+
+        if self.connection_file is None:
+            return
+
+        try:
+            self.connection_file.write(json.dumps({"output": text}) + "\n")
+        except (OSError, ValueError):
+            # The client went away: the run still finishes, its output is dropped
+            self.connection_file = None
+
+    def flush(self):
+
+        if self.connection_file is None:
+            return
+
+        try:
+            self.connection_file.flush()
+        except (OSError, ValueError):
+            self.connection_file = None
+
+
+class PackageAwareDaemon:
+
+    # Long-lived process for build hosts running many analyses. Clients (packageaware.py
+    # with --daemon-socket) send their arguments, working directory and PACKAGE_AWARE_*
+    # environment over a Unix socket as one JSON line; the daemon runs them and streams the
+    # console output back, ending with {"exit_code": n}.
+    #
+    # Every request runs in a process forked for it: its working directory, environment,
+    # console and arguments are its own, so runs of several clients go on side by side and
+    # none waits for another. The daemon process itself only accepts connections and keeps
+    #   - manifest content hashes (PackageAwareHashCache), which every run and rescan
+    #     sends back to it once done, so later runs start with them
+    #   - the recent runs, whose discovery it repeats every rescan_interval seconds (again
+    #     in a forked process) to keep their discovery index current and their manifests
+    #     hashed before the next run asks
+    # HTTP connections are not kept between runs: a connection cannot be shared by forked
+    # processes. requests is imported once, before the first fork.
+
+    DEFAULT_RESCAN_INTERVAL = 60
+
+    # Recent runs whose discovery is repeated, oldest dropped first
+    MAX_WATCHED_RUNS = 32
+
+    LISTEN_BACKLOG = 16
+
+    # A client sends its request as soon as it connects
+    REQUEST_TIMEOUT_SECONDS = 30
+
+    # Longest wait of the accept loop: finished processes are reaped at least this often
+    POLL_INTERVAL_SECONDS = 1.0
+
+    def __init__(self, socket_path, parser, rescan_interval=DEFAULT_RESCAN_INTERVAL):
+
+        self.socket_path = socket_path
+        self.parser = parser
+        self.rescan_interval = rescan_interval
+
+        self.hash_cache = PackageAwareHashCache()
+
+        # JSON of [cwd, argv] -> request of a recent run
+        self.watched_runs = {}
+
+        # pid -> "run" or "rescan", for the processes not reaped yet
+        self.children = {}
+
+        # Report pipe of a process -> bytes read from it so far
+        self.reports = {}
+
+        # The daemon's own console settings, restored after every run
+        self.log_settings = (PackageAware.LOG.level, PackageAware.LOG.log_format, PackageAware.LOG.summarize_events)
+
+    def serve(self):
+
+        import selectors
+        import signal
+        import socket
+
+        if not hasattr(socket, "AF_UNIX") or not hasattr(os, "fork"):
+            PackageAware.console_log("ERROR: The daemon needs Unix domain sockets and fork, which this platform does "
+                                     "not have.", PackageAwareLog.ERROR)
+            return 1
+
+        if os.path.exists(self.socket_path):
+
+            if PackageAwareDaemonClient(self.socket_path).is_running():
+                PackageAware.console_log("ERROR: A daemon is already listening on " + self.socket_path,
+                                         PackageAwareLog.ERROR)
+                return 1
+
+            # Left behind by a daemon that did not shut down cleanly
+            os.remove(self.socket_path)
+
+        # Imported once here rather than by every run
+        PackageAwareImports.requests()
+
+        server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        # Only the owner may connect: runs carry API keys
+        previous_umask = os.umask(0o177)
+        try:
+            server_socket.bind(self.socket_path)
+        finally:
+            os.umask(previous_umask)
+
+        server_socket.listen(PackageAwareDaemon.LISTEN_BACKLOG)
+        server_socket.setblocking(False)
+
+        # Stopped by a service manager: clean up as on Ctrl+C
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, PackageAwareDaemon.stop)
+
+        PackageAware.console_log("Package Aware daemon listening on " + self.socket_path)
+
+        selector = selectors.DefaultSelector()
+        selector.register(server_socket, selectors.EVENT_READ)
+
+        next_rescan_at = time.time() + self.rescan_interval
+
+        try:
+            while True:
 
-    @staticmethod
-    def exec(pa_context):
+                timeout = PackageAwareDaemon.POLL_INTERVAL_SECONDS
+                if self.rescan_interval > 0:
+                    timeout = min(max(next_rescan_at - time.time(), 0), timeout)
 
-        api_url = PackageAwareStructureAPI.generate_api_url(pa_context)
+                for key, events in selector.select(timeout):
+                    if key.fileobj is server_socket:
+                        self.accept(server_socket, selector)
+                    else:
+                        self.read_report(key.fileobj, selector)
 
-        api_response = None
+                self.reap_children()
 
-        for i in range(0, PackageAwareStructureAPI.API_RETRY_COUNT):
-            try:
-                
-                api_response = PackageAwareStructureAPIResponse(
-                    requests.post(
-                        url=api_url,
-                        data=json.dumps({
-                            "project": pa_context.project_name,
-                            "name": datetime.now().strftime("%m/%d/%Y, %H:%M:%S")
-                        }),
-                        headers={'x-pa-apikey': pa_context.api_key}
-                    )
-                )
-                break
+                if self.rescan_interval > 0 and time.time() >= next_rescan_at:
+                    # A pass is skipped while the previous one is still going
+                    if "rescan" not in self.children.values():
+                        self.start_rescans(server_socket, selector)
+                    next_rescan_at = time.time() + self.rescan_interval
 
-            except Exception as e:
-                PackageAware.console_log("Structure API Exception Occurred. "
-                      "Attempt " + str(i + 1) + " of " + str(PackageAwareStructureAPI.API_RETRY_COUNT))
+        except KeyboardInterrupt:
+            pass
 
-        return api_response
+        finally:
+            selector.close()
+            server_socket.close()
 
+            try:
+                os.remove(self.socket_path)
+            except OSError:
+                pass
 
-class PackageAwareContext:
+        # Runs still going finish on their own and answer their clients
+        PackageAware.console_log("Package Aware daemon stopped")
 
-    def __init__(self):
-        self.base_uri = None
-        self.source_code_path = None
-        self.project_name = None
-        self.client_id = None
-        self.api_key = None
+        return 0
 
-    def reset(self):
-        self.base_uri = None
-        self.source_code_path = None
-        self.project_name = None
-        self.client_id = None
-        self.api_key = None
+    @staticmethod
+    def stop(signal_number, frame):
+        raise KeyboardInterrupt()
 
-    def load(self, args):
+    def accept(self, server_socket, selector):
 
-        # Prioritize context from environment variables
-        # Any environment variables that are not set will
-        # automatically be searched in the script arguments
-        self.load_from_env_var()
+        try:
+            connection, address = server_socket.accept()
+        except (BlockingIOError, InterruptedError):
+            return
 
-        if not self.is_valid():
+        connection.setblocking(True)
 
-            # Attempt to get MISSING context from parameters
-            self.load_from_parameters(args)
+        with connection:
+            self.fork("run", server_socket, selector, lambda: self.serve_connection(connection))
 
-            if not self.is_valid():
+    def fork(self, kind, server_socket, selector, work):
 
-                return False
+        # Runs work() in a child process that reports back through a pipe, then exits
+        report_read, report_write = os.pipe()
 
-        return True
+        # No log line is half written while the process is copied
+        with PackageAware.LOG.lock:
+            pid = os.fork()
 
-    def load_from_env_var(self):
+        if pid == 0:
 
-        self.reset()
+            exit_status = 0
 
-        try:
-            if self.base_uri is None:
-                self.base_uri = os.environ["PACKAGE_AWARE_API_BASE_URI"]
-                PackageAware.console_log("PACKAGE_AWARE_API_BASE_URI Environment Variable Loaded")
-        except Exception as e:
-            pass
+            try:
+                import signal
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
 
-        try:
-            if self.source_code_path is None:
-                self.source_code_path = os.environ['PACKAGE_AWARE_ROOT_CODE_PATH']
-                PackageAware.console_log("PACKAGE_AWARE_ROOT_CODE_PATH Environment Variable Loaded")
-        except Exception as e:
-            pass
+                os.close(report_read)
+                selector.close()
+                server_socket.close()
+                for report_file in self.reports:
+                    report_file.close()
 
-        try:
-            if self.project_name is None:
-                self.project_name = os.environ['PACKAGE_AWARE_PROJECT_NAME']
-                PackageAware.console_log("PACKAGE_AWARE_PROJECT_NAME Environment Variable Loaded")
-        except Exception as e:
-            pass
+                # The console flush thread does not survive the fork: the first line starts a new one
+                PackageAware.LOG.flush_thread = None
 
-        try:
-            if self.client_id is None:
-                self.client_id = os.environ['PACKAGE_AWARE_CLIENT_ID']
-                PackageAware.console_log("PACKAGE_AWARE_CLIENT_ID Environment Variable Loaded")
-        except Exception as e:
-            pass
+                report = work()
 
-        try:
-            if self.api_key is None:
-                self.api_key = os.environ['PACKAGE_AWARE_API_KEY']
-                PackageAware.console_log("PACKAGE_AWARE_API_KEY Environment Variable Loaded")
-        except Exception as e:
-            pass
+                with os.fdopen(report_write, "w", encoding="utf-8") as report_file:
+                    report_file.write(json.dumps(report))
 
-    def load_from_parameters(self, args):
+            except BaseException:
+                exit_status = 1
 
-        self.reset()
+            finally:
+                PackageAware.LOG.flush()
+                os._exit(exit_status)
 
-        if args.base_uri is not None:
-            self.base_uri = str(args.base_uri)
-            PackageAware.console_log("PACKAGE_AWARE_API_BASE_URI Parameter Loaded")
+        os.close(report_write)
 
-        if args.source_code_path is not None:
-            self.source_code_path = str(args.source_code_path)
-            PackageAware.console_log("PACKAGE_AWARE_ROOT_CODE_PATH Parameter Loaded")
+        report_file = os.fdopen(report_read, "rb")
+        os.set_blocking(report_file.fileno(), False)
 
-        if args.project_name is not None:
-            self.project_name = str(args.project_name)
-            PackageAware.console_log("PACKAGE_AWARE_PROJECT_NAME Parameter Loaded")
+        self.children[pid] = kind
+        self.reports[report_file] = b""
 
-        if args.client_id is not None:
-            self.client_id = str(args.client_id)
-            PackageAware.console_log("PACKAGE_AWARE_CLIENT_ID Parameter Loaded")
+        import selectors
+        selector.register(report_file, selectors.EVENT_READ)
 
-        if args.base_uri is not None:
-            self.api_key = str(args.api_key)
-            PackageAware.console_log("PACKAGE_AWARE_API_KEY Parameter Loaded")
+    def read_report(self, report_file, selector):
 
-    def is_valid(self):
+        # What a child sends back: hash cache changes and, for a run, whether it is watched
+        try:
+            data = os.read(report_file.fileno(), 65536)
+        except (BlockingIOError, InterruptedError):
+            return
 
-        if self.base_uri is None or len(self.base_uri) == 0:
-            return False
+        if len(data) > 0:
+            self.reports[report_file] += data
+            return
 
-        if self.source_code_path is None or len(self.source_code_path) == 0:
-            return False
+        selector.unregister(report_file)
+        report_file.close()
 
-        if self.project_name is None or len(self.project_name) == 0:
-            return False
+        report_data = self.reports.pop(report_file)
 
-        if self.client_id is None or len(self.client_id) == 0:
-            return False
+        # A child that died before reporting
+        if len(report_data) == 0:
+            return
 
-        if self.api_key is None or len(self.api_key) == 0:
-            return False
+        try:
+            report = json.loads(report_data.decode("utf-8"))
+        except ValueError:
+            return
 
-        return True
+        self.hash_cache.apply_changes(report.get("hash_cache", {}))
 
-    def print_invalid(self):
+        if report.get("watch") is not None:
+            self.watch(report["watch"])
 
-        if self.base_uri is None or len(self.base_uri) == 0:
-            PackageAware.console_log("REQUIRED PARAMETER IS MISSING: PACKAGE_AWARE_API_BASE_URI")
+    def reap_children(self):
 
-        if self.source_code_path is None or len(self.source_code_path) == 0:
-            PackageAware.console_log("REQUIRED PARAMETER IS MISSING: PACKAGE_AWARE_ROOT_CODE_PATH")
+        while len(self.children) > 0:
 
-        if self.project_name is None or len(self.project_name) == 0:
-            PackageAware.console_log("REQUIRED PARAMETER IS MISSING: PACKAGE_AWARE_PROJECT_NAME")
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children = {}
+                return
 
-        if self.client_id is None or len(self.client_id) == 0:
-            PackageAware.console_log("REQUIRED PARAMETER IS MISSING: PACKAGE_AWARE_CLIENT_ID")
-            PackageAware.console_log("CLIENT_ID, if you do not already have one, will be provided with a subscription to PackageAware.io services.")
+            if pid == 0:
+                return
 
-        if self.api_key is None or len(self.api_key) == 0:
-            PackageAware.console_log("REQUIRED PARAMETER IS MISSING: PACKAGE_AWARE_API_KEY")
-            PackageAware.console_log("API_KEY, if you do not already have one, will be provided with a subscription to PackageAware.io services.")
+            self.children.pop(pid, None)
 
+    def serve_connection(self, connection):
 
-class PackageAwareManifestAPI:
+        # In the forked process of one request
+        connection_file = connection.makefile("rw", encoding="utf-8", newline="\n")
 
-    API_RETRY_COUNT = 3
+        try:
+            connection.settimeout(PackageAwareDaemon.REQUEST_TIMEOUT_SECONDS)
+            request = json.loads(connection_file.readline())
+            connection.settimeout(None)
+        except (OSError, ValueError):
+            # Not a run: a liveness check or a client that went away
+            return {}
 
-    URI_TEMPLATE = "{pa_base_uri}" \
-                   "clients/{pa_client_id}" \
-                   "/projects/{pa_project_id}" \
-                   "/analysis/{pa_analysis_id}" \
-                   "/manifests/{pa_manifest_name}"
+        exit_code, watched = self.run_request(request, PackageAwareDaemonStream(connection_file))
 
-    def __init__(self):
-        pass
+        try:
+            connection_file.write(json.dumps({"exit_code": exit_code}) + "\n")
+            connection_file.flush()
+        except (OSError, ValueError):
+            pass
 
-    @staticmethod
-    def generate_api_url(pa_context, project_id, analysis_id, manifest_name):
+        return {"hash_cache": self.hash_cache.take_changes(), "watch": request if watched else None}
 
-        manifest_for_url = urllib.parse.quote(manifest_name)
+    def run_request(self, request, stream):
 
-        api_url = PackageAwareManifestAPI.URI_TEMPLATE
-        api_url = api_url.replace("{pa_base_uri}", pa_context.base_uri)
-        api_url = api_url.replace("{pa_client_id}", pa_context.client_id)
-        api_url = api_url.replace("{pa_project_id}", project_id)
-        api_url = api_url.replace("{pa_analysis_id}", analysis_id)
-        api_url = api_url.replace("{pa_manifest_name}", manifest_for_url)
+        # Runs a request in this process. Returns its exit code and whether it is rescanned.
+        global args
 
-        return api_url
+        package_aware = None
 
-    @staticmethod
-    def exec(pa_context, project_id, analysis_id, manifest_name, manifest_content):
+        saved_state = self.enter_run(request, stream)
 
-        api_url = PackageAwareManifestAPI.generate_api_url(pa_context, project_id, analysis_id, manifest_name)
+        try:
+            args = self.parser.parse_args(request.get("argv", []))
 
-        response = None
+            if args.daemon:
+                PackageAware.console_log("ERROR: --daemon cannot be run through a daemon.", PackageAwareLog.ERROR)
+                return 1, False
 
-        for i in range(0, PackageAwareManifestAPI.API_RETRY_COUNT):
-            try:
-                PackageAware.console_log("*** Putting manifest: " + manifest_name)
+            package_aware = PackageAware()
+            package_aware.hash_cache = self.hash_cache
 
-                response = requests.put(
-                    url=api_url,
-                    data=manifest_content,
-                    headers={'x-pa-apikey': package_aware.context.api_key}
-                )
+            package_aware.script.load_script_arguments()
+            package_aware.run_script(args)
 
-                PackageAware.console_log("Manifest Put Executed: " + manifest_name)
+            exit_code = 0
 
-                break
+        except SystemExit as e:
+            exit_code = PackageAwareDaemon.exit_code(e.code)
 
-            except Exception as e:
-                PackageAware.console_log("Manifest API Exception Occurred. "
-                      "Attempt " + str(i + 1) + " of " + str(PackageAwareManifestAPI.API_RETRY_COUNT))
+        except Exception as e:
+            PackageAware.console_log("ERROR: The daemon could not complete the run: " + str(e),
+                                     PackageAwareLog.ERROR)
+            exit_code = 1
 
-        return response
+        finally:
+            PackageAware.LOG.close()
+            self.leave_run(saved_state)
 
+        return exit_code, package_aware is not None and PackageAwareDaemon.is_watched(package_aware)
 
-class PackageAware:
+    @staticmethod
+    def exit_code(code):
 
-    MANIFEST_FILES = [
-        {'file_pattern': 'Gemfile', 'package_manager': 'Ruby'},
-        {'file_pattern': 'requirements.txt', 'package_manager': 'Python'},
-        {'file_pattern': 'package.json', 'package_manager': 'NPM'},
-        {'file_pattern': 'pom.xml', 'package_manager': 'Java'},
-        {'file_pattern': 'pipfile', 'package_manager': 'Python'},
-        {'file_pattern': 'Packages.config', 'package_manager': 'NuGet'},
-        {'file_pattern': '*.csproj', 'package_manager': 'NuGet'}
-    ]
+        # sys.exit(None) is success, sys.exit("message") (argparse) is failure
+        if code is None:
+            return 0
 
-    def __init__(self):
-        self.context = PackageAwareContext()
-        self.script = PackageAwareAnalysisScript()
+        if isinstance(code, int):
+            return code
 
-    def find_manifest_files(self, file_pattern):
-        return glob.glob(
-            self.context.source_code_path + '/**/' + file_pattern,
-            recursive=True
-        )
+        return 1
 
-    def send_manifests(self, project_id, analysis_id, dirs_to_exclude, files_to_exclude):
+    def enter_run(self, request, stream):
 
-        manifests_found_count = 0
+        # Working directory, PACKAGE_AWARE_* environment and console of the run
+        saved_state = {
+            "cwd": os.getcwd(),
+            "environ": dict((k, v) for k, v in os.environ.items() if k.startswith(PackageAwareDaemonClient.ENV_PREFIX)),
+            "stdout": sys.stdout,
+            "stderr": sys.stderr
+        }
 
-        code_root = PackageAware.get_current_directory()
+        for key in saved_state["environ"]:
+            del os.environ[key]
 
-        PackageAware.console_log("------------------------")
-        PackageAware.console_log("Begin Recursive Manifest Search")
-        PackageAware.console_log("------------------------")
+        for key, value in request.get("env", {}).items():
+            if key.startswith(PackageAwareDaemonClient.ENV_PREFIX):
+                os.environ[key] = value
 
-        for manifest_file in PackageAware.MANIFEST_FILES:
+        PackageAware.LOG.redirect(stream)
 
-            package_manager = manifest_file['package_manager']
+        # argparse errors and anything else printed by the run go to the client too
+        sys.stdout = stream
+        sys.stderr = stream
 
-            manifest_name = manifest_file['file_pattern']
+        if request.get("cwd") is not None:
+            os.chdir(request["cwd"])
 
-            PackageAware.console_log("Looking for " + package_manager + " " + manifest_name + "...")
+        return saved_state
 
-            files = self.find_manifest_files(manifest_file['file_pattern'])
+    def leave_run(self, saved_state):
 
-            # iterate each
-            # avoid directories to exclude
-            for file_name in files:
+        PackageAware.LOG.redirect(None)
+        PackageAware.LOG.configure(*self.log_settings)
 
-                pure_filename = os.path.basename(file_name)
-                pure_directory = os.path.dirname(file_name)
+        sys.stdout = saved_state["stdout"]
+        sys.stderr = saved_state["stderr"]
 
-                if pure_directory.startswith("./"):
-                    pure_directory = code_root + pure_directory[2:]
-                elif pure_directory == ".":
-                    pure_directory = code_root
+        for key in [k for k in os.environ.keys() if k.startswith(PackageAwareDaemonClient.ENV_PREFIX)]:
+            del os.environ[key]
 
-                # Directories to Exclude
-                if pure_directory in dirs_to_exclude:
-                    # skip this manifest
-                    PackageAware.console_log("Skipping file due to dirs_to_exclude: " + file_name)
-                    continue
+        os.environ.update(saved_state["environ"])
 
-                # Files to Exclude
-                full_file_path = pure_directory
-                if full_file_path.find("/") >= 0:
-                    if not full_file_path.endswith("/"):
-                        full_file_path += "/" + pure_filename
-                else:
-                    if not full_file_path.endswith("\\"):
-                        full_file_path += "\\" + pure_filename
+        os.chdir(saved_state["cwd"])
 
-                if full_file_path in files_to_exclude:
-                    # skip this manifest
-                    PackageAware.console_log("Skipping file due to files_to_exclude: " + file_name)
-                    continue
+    @staticmethod
+    def is_watched(package_aware):
 
-                # log the manifest
-                PackageAware.console_log("Found manifest file: " + file_name)
+        # Runs that discover manifests are rescanned; batch runs and async_result are not
+        script = package_aware.script
 
-                # call the api with the manifest file content as the body
+        return script.project_list_file is None and \
+            script.mode in (PackageAwareModeOfOperation.RUN_AND_WAIT, PackageAwareModeOfOperation.ASYNC_INIT)
 
-                try:
+    def watch(self, request):
 
-                    with open(file_name, 'r') as the_file:
+        watch_key = json.dumps([request.get("cwd"), request.get("argv", [])])
 
-                        content = the_file.read()
+        self.watched_runs.pop(watch_key, None)
+        self.watched_runs[watch_key] = request
 
-                        if len(content.strip()) > 0:
+        while len(self.watched_runs) > PackageAwareDaemon.MAX_WATCHED_RUNS:
+            del self.watched_runs[next(iter(self.watched_runs))]
 
-                            response = PackageAwareManifestAPI.exec(
-                                pa_context=package_aware.context,
-                                project_id=project_id,
-                                analysis_id=analysis_id,
-                                manifest_name=manifest_name,
-                                manifest_content=content
-                            )
+    def start_rescans(self, server_socket, selector):
 
-                            PackageAware.console_log("Add manifest status code: " + str(response.status_code))
+        watched_requests = list(self.watched_runs.values())
 
-                            manifests_found_count += 1
+        if len(watched_requests) == 0:
+            return
 
-                        else:
-                            PackageAware.console_log("WARNING: Manifest file is empty: " + file_name)
+        def rescan_all():
+            for request in watched_requests:
+                self.rescan(request)
+            return {"hash_cache": self.hash_cache.take_changes()}
 
-                except Exception as e:
-                    PackageAware.console_log("Could not send manifest: " + file_name + " due to error: " + str(e))
+        self.fork("rescan", server_socket, selector, rescan_all)
 
-        return manifests_found_count
+    def rescan(self, request):
 
-    @staticmethod
-    def recursive_glob(treeroot, pattern):
-        results = []
-        for base, dirs, files in os.walk(treeroot):
-            goodfiles = fnmatch.filter(files, pattern)
-            results.extend(os.path.join(base, f) for f in goodfiles)
-        return results
+        # The discovery of an earlier run: updates its discovery index and hashes its manifests
+        global args
 
-    @staticmethod
-    def get_current_directory():
-        current_folder = os.getcwd()
-        plt = platform.system().lower()
-        if plt != "windows":
-            if current_folder[-1:] != "/":
-                current_folder += "/"
-        else:
-            if current_folder[-1:] != "\\":
-                current_folder += "\\"
+        source_code_path = None
+        manifest_count = 0
+        error = None
 
-        return current_folder
+        reused_before = self.hash_cache.reused_count
+        hashed_before = self.hash_cache.hashed_count
 
-    @staticmethod
-    def console_log(message):
-        print(str(datetime.utcnow()) + " PACKAGE AWARE: " + message)
+        saved_state = self.enter_run(request, PackageAwareDaemonStream())
 
-    def analysis_result_exec(self, report_status_url, analysis_result_max_wait, analysis_result_polling_interval):
+        try:
+            args = self.parser.parse_args(request.get("argv", []))
 
-        analysis_start_time = datetime.utcnow()
+            package_aware = PackageAware()
+            package_aware.hash_cache = self.hash_cache
 
-        while True:
+            package_aware.script.load_script_arguments()
 
-            if (datetime.utcnow() - analysis_start_time).seconds > analysis_result_max_wait:
-                PackageAware.console_log(
-                    "Analysis Result Max Wait Time Reached (" + str(analysis_result_max_wait) + ")"
-                )
-                sys.exit(1)
+            if package_aware.context.load(args, require_api=False):
 
-            response = PackageAwareAnalysisResultAPI.exec(self.context, report_status_url)
+                source_code_path = package_aware.context.source_code_path
 
-            content_object = json.loads(response.content)
+                package_aware.discovery_backend = package_aware.script.discovery_backend
+                package_aware.discovery_workers = package_aware.script.discovery_workers
+                package_aware.changed_since = package_aware.script.changed_since
 
-            if response.status_code == 200:
+                if package_aware.script.discovery_index_enabled:
+                    package_aware.discovery_index = PackageAwareDiscoveryIndex(
+                        os.path.join(package_aware.script.workspace_folder, PackageAwareDiscoveryIndex.INDEX_FILE_NAME)
+                    )
+                    package_aware.discovery_index.load()
 
-                analysis_status = str(content_object["status"])
+                manifest_files = package_aware.find_manifest_files(
+                    package_aware.script.directories_to_exclude, package_aware.script.files_to_exclude
+                )
+                manifest_count = len(manifest_files)
 
-                if analysis_status.lower() == "finished":
-                    PackageAware.console_log("------------------------")
-                    PackageAware.console_log("Analysis Completed Successfully")
-                    PackageAware.console_log("------------------------")
-                    sys.exit(0)
-                elif analysis_status.lower().startswith("failed"):
-                    PackageAware.console_log("------------------------")
-                    PackageAware.console_log("Analysis complete - Failures reported.")
-
-                    # Additional Messaging based on type of failure...
-                    if analysis_status.lower().find("violation") >= 0:
-                        PackageAware.console_log("FAILURE: Violations reported.")
-                    elif analysis_status.lower().find("vulnerabilit") >= 0:
-                        PackageAware.console_log("FAILURE: Vulnerabilities reported.")
-                    else:
-                        # Unknown failure - no additional messaging-out
-                        pass
-                    PackageAware.console_log("------------------------")
+                # --changed-since finds a subset: hashes of the other manifests stay
+                if package_aware.changed_since is None:
+                    self.hash_cache.forget_missing(manifest_files, source_code_path)
 
-                    # Fail with error
-                    sys.exit(1)
+                source_code_path = os.path.abspath(source_code_path)
 
-                elif analysis_status.lower() == "error":
-                    PackageAware.console_log(
-                        "Analysis Error. Will retry in " +
-                        str(analysis_result_polling_interval) + " seconds."
-                    )
-                    time.sleep(analysis_result_polling_interval)
-                    continue
-                else:
-                    # Status code that is not pertinent to the result
-                    PackageAware.console_log(
-                        "Analysis Ongoing. Will retry in " +
-                        str(analysis_result_polling_interval) + " seconds."
-                    )
-                    time.sleep(analysis_result_polling_interval)
-                    continue
-            else:
-                PackageAware.console_log("------------------------")
-                PackageAware.console_log("ERROR: API Response Status Code: " + str(response.status_code))
-                PackageAware.console_log("------------------------")
-                sys.exit(1)
+        except (SystemExit, Exception) as e:
+            error = e
 
+        finally:
+            self.leave_run(saved_state)
 
-class PackageAwareAnalysisStartAPI:
+        if error is not None:
+            # Not the arguments: they may hold the API key
+            PackageAware.console_log("Rescan of a run in " + str(request.get("cwd")) + " failed: " + str(error),
+                                     PackageAwareLog.WARNING)
 
-    API_RETRY_COUNT = 3
+        elif source_code_path is not None:
+            PackageAware.console_log(
+                "Rescanned " + source_code_path + ": " + str(manifest_count) + " manifests, " +
+                str(self.hash_cache.hashed_count - hashed_before) + " hashed, " +
+                str(self.hash_cache.reused_count - reused_before) + " unchanged"
+            )
 
-    URI_TEMPLATE = "{pa_base_uri}clients/{pa_client_id}/projects/{pa_project_id}/analysis/{pa_analysis_id}"
 
-    def __init__(self):
-        pass
+class PackageAwareDaemonClient:
 
-    @staticmethod
-    def generate_api_url(pa_context, project_id, analysis_id):
-        api_url = PackageAwareAnalysisStartAPI.URI_TEMPLATE
-        api_url = api_url.replace("{pa_base_uri}", pa_context.base_uri)
-        api_url = api_url.replace("{pa_client_id}", pa_context.client_id)
-        api_url = api_url.replace("{pa_project_id}", project_id)
-        api_url = api_url.replace("{pa_analysis_id}", analysis_id)
+    # The thin client side of PackageAwareDaemon: forwards this run and relays its output
 
-        return api_url
+    ENV_PREFIX = "PACKAGE_AWARE_"
 
-    @staticmethod
-    def exec(pa_context, project_id, analysis_id):
+    CONNECT_TIMEOUT_SECONDS = 5
 
-        url = PackageAwareAnalysisStartAPI.generate_api_url(pa_context, project_id, analysis_id)
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
 
-        response = None
+    def connect(self):
 
-        for i in range(0, PackageAwareAnalysisStartAPI.API_RETRY_COUNT):
-            try:
-                response = requests.put(
-                    url=url,
-                    data="{}",
-                    headers={'x-pa-apikey': pa_context.api_key, 'content-length': str(0)}
-                )
+        # A connected socket, or None when no daemon listens on socket_path
+        import socket
 
-                break
+        if not hasattr(socket, "AF_UNIX"):
+            return None
 
-            except Exception as e:
-                PackageAware.console_log("Analysis Start API Exception Occurred. "
-                      "Attempt " + str(i + 1) + " of " + str(PackageAwareAnalysisStartAPI.API_RETRY_COUNT))
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(PackageAwareDaemonClient.CONNECT_TIMEOUT_SECONDS)
 
-        return response
+        try:
+            connection.connect(self.socket_path)
+        except OSError:
+            connection.close()
+            return None
 
+        # A run takes as long as it takes
+        connection.settimeout(None)
 
-class PackageAwareAnalysisResultAPI:
+        return connection
 
-    API_RETRY_COUNT = 3
+    def is_running(self):
 
-    def __init__(self):
+        connection = self.connect()
 
-        pass
+        if connection is None:
+            return False
 
-    @staticmethod
-    def exec(pa_context, result_uri):
+        connection.close()
+        return True
 
-        response = None
+    def run(self, argv, failure_exit_code=1):
 
-        for i in range(0, PackageAwareAnalysisResultAPI.API_RETRY_COUNT):
-            try:
-                response = requests.get(
-                    url=result_uri,
-                    headers={'x-pa-apikey': pa_context.api_key}
-                )
+        # The exit code of the run in the daemon, None when there is no daemon to run it
+        connection = self.connect()
 
-                break
+        if connection is None:
+            return None
 
-            except Exception as e:
-                PackageAware.console_log(
-                    "Analysis Result API Exception Occurred. "
-                      "Attempt " + str(i + 1) + " of " + str(PackageAwareAnalysisResultAPI.API_RETRY_COUNT)
-                )
+        request = {
+            "argv": argv,
+            "cwd": os.getcwd(),
+            "env": dict((k, v) for k, v in os.environ.items() if k.startswith(PackageAwareDaemonClient.ENV_PREFIX))
+        }
 
-        return response
+        with connection:
+            connection_file = connection.makefile("rw", encoding="utf-8", newline="\n")
 
+            try:
+                connection_file.write(json.dumps(request) + "\n")
+                connection_file.flush()
 
-class PackageAwareOnFailure:
+                for line in connection_file:
+                    message = json.loads(line)
 
-    FAIL_THE_BUILD = "fail_the_build"
-    CONTINUE_ON_FAILURE = "continue_on_failure"
+                    if "output" in message:
+                        sys.stdout.write(message["output"])
+                        sys.stdout.flush()
+                    elif "exit_code" in message:
+                        return message["exit_code"]
 
+            except (OSError, ValueError) as e:
+                PackageAware.console_log("ERROR: Daemon connection failed: " + str(e), PackageAwareLog.ERROR)
 
-class PackageAwareModeOfOperation:
+        PackageAware.console_log("ERROR: The daemon closed the connection before the run finished.",
+                                 PackageAwareLog.ERROR)
 
-    RUN_AND_WAIT = "run_and_wait"
-    ASYNC_INIT = "async_init"
-    ASYNC_RESULT = "async_result"
+        return failure_exit_code
 
 
 class PackageAwareAnalysisScript:
 
     MIN_ANALYSIS_RESULT_POLLING_INTERVAL = 10
+    MAX_UPLOAD_WORKERS = 32
+    MAX_DISCOVERY_WORKERS = 64
     ASYNC_RESULT_FILE_NAME = "package_aware_async.json"
     PA_WORKSPACE_FOLDER = "package_aware/workspace"
 
@@ -575,17 +5478,66 @@ class PackageAwareAnalysisScript:
 
         self.mode = None
         self.on_failure = None
+        self.engine = None
+        self.dry_run = None
+        self.dedup_enabled = None
 
         self.directories_to_exclude = None
         self.files_to_exclude = None
 
         self.working_directory = None
+        self.workspace_folder = None
+
+        self.upload_cache_enabled = None
+        self.discovery_index_enabled = None
+        self.verdict_cache_enabled = None
+        self.verdict_cache_ttl = None
+        self.resume = None
+        self.ignore_files_enabled = None
+        self.metrics_format = None
+        self.discovery_backend = None
+        self.discovery_workers = None
+        self.changed_since = None
+
+        self.upload_workers = None
+        self.http_pool_size = None
+
+        self.project_list_file = None
+        self.batch_workers = None
+
+        self.daemon = None
+        self.daemon_socket = None
+        self.daemon_rescan_interval = None
+
+        self.manifest_content_encoding = None
+        self.compression_min_bytes = None
+
+        self.retry_max_attempts = None
+        self.retry_budget = None
+
+        self.rate_limit = None
+        self.max_in_flight = None
+        self.rate_limit_adaptive = None
 
         self.analysis_result_max_wait = None
         self.analysis_result_polling_interval = None
+        self.analysis_result_initial_polling_interval = None
 
     def load_script_arguments(self):
 
+        # LOGGING
+        # Configured first so every line below goes out in the chosen format
+        # Default: info level, text format, every event printed
+        log_level = PackageAwareLog.INFO
+        if args.log_level is not None:
+            log_level = PackageAwareLog.LEVELS_BY_NAME[args.log_level]
+
+        PackageAware.LOG.configure(
+            level=log_level,
+            log_format=args.log_format if args.log_format is not None else PackageAwareLog.FORMAT_TEXT,
+            summarize_events=args.quiet
+        )
+
         if args.mode is not None:
             self.mode = str(args.mode)
         else:
@@ -600,6 +5552,31 @@ class PackageAwareAnalysisScript:
 
         PackageAware.console_log("ON_FAILURE: " + self.on_failure)
 
+        # DRY RUN
+        # Default: disabled
+        # Lists the manifests that would be uploaded; no API call is made
+        self.dry_run = bool(args.dry_run)
+
+        if self.dry_run:
+            PackageAware.console_log("DRY_RUN: ENABLED")
+
+        # ENGINE
+        # Default: sync
+        # asyncio needs the optional aiohttp and yarl packages (requirements-asyncio.txt), otherwise sync is used
+        self.engine = PackageAwareEngine.SYNC
+        if args.engine is not None:
+            self.engine = args.engine
+
+            if self.engine == PackageAwareEngine.ASYNCIO and not PackageAwareImports.is_available("aiohttp"):
+                PackageAware.console_log(
+                    "The asyncio engine requires the aiohttp package (pip install -r requirements-asyncio.txt). "
+                    "Using the sync engine.",
+                    PackageAwareLog.WARNING
+                )
+                self.engine = PackageAwareEngine.SYNC
+
+        PackageAware.console_log("ENGINE: " + self.engine)
+
         self.directories_to_exclude = []
         temp_dirs_to_exclude = []
         if args.directories_to_exclude is not None and len(args.directories_to_exclude.strip()) > 0:
@@ -607,7 +5584,7 @@ class PackageAwareAnalysisScript:
             temp_dirs_to_exclude = args.directories_to_exclude.split(",")
 
             for dir in temp_dirs_to_exclude:
-                self.directories_to_exclude.append(self.code_root + dir)
+                self.directories_to_exclude.append(PackageAwareExclusions.under_root(self.code_root, dir))
         else:
             PackageAware.console_log("DIRS_TO_EXCLUDE: <NONE>")
 
@@ -618,10 +5595,154 @@ class PackageAwareAnalysisScript:
             temp_files_to_exclude = args.files_to_exclude.split(",")
 
             for a_file in temp_files_to_exclude:
-                self.files_to_exclude.append(self.code_root + a_file)
+                self.files_to_exclude.append(PackageAwareExclusions.under_root(self.code_root, a_file))
         else:
             PackageAware.console_log("FILES_TO_EXCLUDE: <NONE>")
 
+        # IGNORE FILES
+        # Default: disabled
+        # .gitignore and .packageawareignore rules exclude directories and manifests below them
+        self.ignore_files_enabled = bool(args.ignore_files)
+
+        PackageAware.console_log("IGNORE_FILES: " + ("ENABLED" if self.ignore_files_enabled else "DISABLED"))
+
+        # UPLOAD WORKERS
+        # Default: 1 (sequential uploads)
+        # Minimum: 1
+        # Maximum: MAX_UPLOAD_WORKERS
+        self.upload_workers = 1
+        if args.upload_workers is not None:
+            self.upload_workers = min(
+                max(args.upload_workers, 1),
+                PackageAwareAnalysisScript.MAX_UPLOAD_WORKERS
+            )
+
+        PackageAware.console_log("UPLOAD_WORKERS: " + str(self.upload_workers))
+
+        # PROJECT LIST (BATCH MODE)
+        # Default: <NONE> (a single project from the context)
+        self.project_list_file = None
+        if args.project_list is not None and len(args.project_list.strip()) > 0:
+            self.project_list_file = args.project_list.strip()
+
+        PackageAware.console_log("PROJECT_LIST: " + (self.project_list_file or "<NONE>"))
+
+        # BATCH WORKERS
+        # Default: PackageAwareBatch.DEFAULT_WORKERS projects in flight
+        # Minimum: 1
+        self.batch_workers = PackageAwareBatch.DEFAULT_WORKERS
+        if args.batch_workers is not None:
+            self.batch_workers = max(args.batch_workers, 1)
+
+        if self.project_list_file is not None:
+            PackageAware.console_log("BATCH_WORKERS: " + str(self.batch_workers))
+
+        # DAEMON
+        # Default: <NONE> (every run in its own process)
+        # --daemon serves runs on DAEMON_SOCKET, which must be set
+        self.daemon = bool(args.daemon)
+        self.daemon_socket = None
+        if args.daemon_socket is not None and len(args.daemon_socket.strip()) > 0:
+            self.daemon_socket = args.daemon_socket.strip()
+
+        if self.daemon_socket is not None:
+            PackageAware.console_log("DAEMON_SOCKET: " + self.daemon_socket)
+
+        # DAEMON RESCAN INTERVAL
+        # Default: PackageAwareDaemon.DEFAULT_RESCAN_INTERVAL seconds
+        # Minimum: 0 (no rescans)
+        self.daemon_rescan_interval = PackageAwareDaemon.DEFAULT_RESCAN_INTERVAL
+        if args.daemon_rescan_interval is not None:
+            self.daemon_rescan_interval = max(args.daemon_rescan_interval, 0)
+
+        if self.daemon:
+            PackageAware.console_log("DAEMON_RESCAN_INTERVAL: " + str(self.daemon_rescan_interval))
+
+        # HTTP POOL SIZE
+        # Default: enough connections for every upload worker (of every project in flight)
+        # Minimum: 1
+        self.http_pool_size = max(PackageAwareApiClient.DEFAULT_POOL_SIZE, self.upload_workers)
+        if self.project_list_file is not None:
+            self.http_pool_size = max(self.http_pool_size, self.upload_workers * self.batch_workers)
+        if args.http_pool_size is not None:
+            self.http_pool_size = max(args.http_pool_size, 1)
+
+        PackageAware.console_log("HTTP_POOL_SIZE: " + str(self.http_pool_size))
+
+        # MANIFEST CONTENT ENCODING
+        # Default: identity (uncompressed)
+        # zstd needs the optional zstandard package, otherwise gzip is used
+        self.manifest_content_encoding = None
+        if args.manifest_content_encoding is not None and \
+                args.manifest_content_encoding != PackageAwareApiClient.CONTENT_ENCODING_IDENTITY:
+
+            self.manifest_content_encoding = args.manifest_content_encoding
+
+            if self.manifest_content_encoding == PackageAwareApiClient.CONTENT_ENCODING_ZSTD and \
+                    not PackageAwareImports.is_available("zstandard"):
+                PackageAware.console_log(
+                    "zstd compression requires the zstandard package. Using gzip instead.",
+                    PackageAwareLog.WARNING
+                )
+                self.manifest_content_encoding = PackageAwareApiClient.CONTENT_ENCODING_GZIP
+
+        PackageAware.console_log(
+            "MANIFEST_CONTENT_ENCODING: " +
+            (self.manifest_content_encoding or PackageAwareApiClient.CONTENT_ENCODING_IDENTITY)
+        )
+
+        # COMPRESSION MIN BYTES
+        # Default: DEFAULT_COMPRESSION_MIN_BYTES
+        # Minimum: 0 (compress every manifest)
+        self.compression_min_bytes = PackageAwareApiClient.DEFAULT_COMPRESSION_MIN_BYTES
+        if args.compression_min_bytes is not None:
+            self.compression_min_bytes = max(args.compression_min_bytes, 0)
+
+        if self.manifest_content_encoding is not None:
+            PackageAware.console_log("COMPRESSION_MIN_BYTES: " + str(self.compression_min_bytes))
+
+        # RETRY MAX ATTEMPTS
+        # Default: DEFAULT_MAX_ATTEMPTS
+        # Minimum: 1 (no retries)
+        self.retry_max_attempts = PackageAwareRetryPolicy.DEFAULT_MAX_ATTEMPTS
+        if args.retry_max_attempts is not None:
+            self.retry_max_attempts = max(args.retry_max_attempts, 1)
+
+        PackageAware.console_log("RETRY_MAX_ATTEMPTS: " + str(self.retry_max_attempts))
+
+        # RETRY BUDGET
+        # Default: DEFAULT_RETRY_BUDGET seconds of backoff for the whole run
+        # Minimum: 0 (no waiting between attempts, so no retries)
+        self.retry_budget = PackageAwareRetryPolicy.DEFAULT_RETRY_BUDGET
+        if args.retry_budget is not None:
+            self.retry_budget = max(args.retry_budget, 0)
+
+        PackageAware.console_log("RETRY_BUDGET: " + str(self.retry_budget))
+
+        # RATE LIMIT
+        # Default: none
+        # Minimum: 0 (none)
+        self.rate_limit = PackageAwareRateLimiter.DEFAULT_REQUESTS_PER_SECOND
+        if args.rate_limit is not None:
+            self.rate_limit = max(args.rate_limit, 0)
+
+        PackageAware.console_log("RATE_LIMIT: " + (str(self.rate_limit) + "/s" if self.rate_limit > 0 else "<NONE>"))
+
+        # MAX IN FLIGHT
+        # Default: none (upload workers and the connection pool bound it)
+        # Minimum: 0 (none)
+        self.max_in_flight = PackageAwareRateLimiter.DEFAULT_MAX_IN_FLIGHT
+        if args.max_in_flight is not None:
+            self.max_in_flight = max(args.max_in_flight, 0)
+
+        PackageAware.console_log("MAX_IN_FLIGHT: " + (str(self.max_in_flight) if self.max_in_flight > 0 else "<NONE>"))
+
+        # RATE LIMIT ADAPTIVE
+        # Default: disabled
+        self.rate_limit_adaptive = bool(args.rate_limit_adaptive)
+
+        PackageAware.console_log("RATE_LIMIT_ADAPTIVE: " + ("ENABLED" if self.rate_limit_adaptive else "DISABLED"))
+
         # WORKING DIRECTORY & ASYNC RESUlT FILE
         if args.working_directory is not None:
             self.working_directory = args.working_directory.strip()
@@ -666,9 +5787,129 @@ class PackageAwareAnalysisScript:
             self.working_directory = ""
             self.async_result_file = self.code_root + PackageAwareAnalysisScript.ASYNC_RESULT_FILE_NAME
 
+        if len(self.working_directory) > 0:
+            self.workspace_folder = os.path.dirname(self.async_result_file)
+
         PackageAware.console_log("WORKING_DIRECTORY: " + self.working_directory)
         PackageAware.console_log("ASYNC_RESULT_FILE: " + self.async_result_file)
 
+        # UPLOAD CACHE
+        # Requires a working directory to persist between runs
+        self.upload_cache_enabled = self.workspace_folder is not None and not args.no_cache
+
+        PackageAware.console_log("UPLOAD_CACHE: " + ("ENABLED" if self.upload_cache_enabled else "DISABLED"))
+
+        # DEDUPLICATION
+        # Default: enabled
+        # Identical manifests are uploaded once per analysis
+        self.dedup_enabled = not args.no_dedup
+
+        PackageAware.console_log("DEDUPLICATION: " + ("ENABLED" if self.dedup_enabled else "DISABLED"))
+
+        # DISCOVERY INDEX
+        # Opt-in, requires a working directory to persist between runs
+        self.discovery_index_enabled = False
+        if args.discovery_index:
+            if self.workspace_folder is not None:
+                self.discovery_index_enabled = True
+            else:
+                PackageAware.console_log(
+                    "The discovery index requires a working directory (-wd). Ignoring.",
+                    PackageAwareLog.WARNING
+                )
+
+        PackageAware.console_log("DISCOVERY_INDEX: " + ("ENABLED" if self.discovery_index_enabled else "DISABLED"))
+
+        # REUSE RESULT
+        # Opt-in, requires a working directory to persist between runs
+        # Default TTL: 86400 seconds
+        self.verdict_cache_enabled = False
+        if args.reuse_result:
+            if self.workspace_folder is not None:
+                self.verdict_cache_enabled = True
+            else:
+                PackageAware.console_log(
+                    "Reusing the last result requires a working directory (-wd). Ignoring.",
+                    PackageAwareLog.WARNING
+                )
+
+        self.verdict_cache_ttl = PackageAwareVerdictCache.DEFAULT_TTL_SECONDS
+        if args.reuse_result_ttl is not None:
+            self.verdict_cache_ttl = max(args.reuse_result_ttl, 0)
+
+        PackageAware.console_log(
+            "REUSE_RESULT: " +
+            ("ENABLED (TTL " + str(self.verdict_cache_ttl) + " seconds)" if self.verdict_cache_enabled else "DISABLED")
+        )
+
+        # RESUME
+        # Default: disabled (every run creates a new analysis)
+        # The upload journal lives in the working directory, so one is required
+        self.resume = False
+        if args.resume:
+            if self.workspace_folder is not None:
+                self.resume = True
+            else:
+                PackageAware.console_log(
+                    "Resuming an analysis requires a working directory (-wd). Ignoring.",
+                    PackageAwareLog.WARNING
+                )
+
+        PackageAware.console_log("RESUME: " + ("ENABLED" if self.resume else "DISABLED"))
+
+        # METRICS
+        # Default: none
+        # Written to the working directory, so one is required
+        self.metrics_format = PackageAwareMetrics.FORMAT_NONE
+        if args.metrics_format is not None and args.metrics_format != PackageAwareMetrics.FORMAT_NONE:
+            if self.workspace_folder is not None:
+                self.metrics_format = args.metrics_format
+            else:
+                PackageAware.console_log(
+                    "Metrics export requires a working directory (-wd). Ignoring.",
+                    PackageAwareLog.WARNING
+                )
+
+        PackageAware.console_log("METRICS: " + self.metrics_format)
+
+        # CHANGED SINCE
+        # Default: <NONE> (every manifest)
+        self.changed_since = None
+        if args.changed_since is not None and len(args.changed_since.strip()) > 0:
+            self.changed_since = args.changed_since.strip()
+
+        PackageAware.console_log("CHANGED_SINCE: " + (self.changed_since or "<NONE>"))
+
+        # DISCOVERY BACKEND
+        # Default: walk, or auto when CHANGED_SINCE is set
+        self.discovery_backend = PackageAwareDiscoveryBackend.WALK
+        if args.discovery_backend is not None:
+            self.discovery_backend = args.discovery_backend
+        elif self.changed_since is not None:
+            self.discovery_backend = PackageAwareDiscoveryBackend.AUTO
+
+        if self.changed_since is not None and self.discovery_backend == PackageAwareDiscoveryBackend.WALK:
+            PackageAware.console_log(
+                "--changed-since needs the git discovery backend. Ignoring.",
+                PackageAwareLog.WARNING
+            )
+            self.changed_since = None
+
+        PackageAware.console_log("DISCOVERY_BACKEND: " + self.discovery_backend)
+
+        # DISCOVERY WORKERS
+        # Default: 1 (directories listed one after the other)
+        # Minimum: 1
+        # Maximum: MAX_DISCOVERY_WORKERS
+        self.discovery_workers = 1
+        if args.discovery_workers is not None:
+            self.discovery_workers = min(
+                max(args.discovery_workers, 1),
+                PackageAwareAnalysisScript.MAX_DISCOVERY_WORKERS
+            )
+
+        PackageAware.console_log("DISCOVERY_WORKERS: " + str(self.discovery_workers))
+
         # ANALYSIS RESULT MAX WAIT
         # Default: 300 (5 minutes)
         # Minimum: Any
@@ -691,6 +5932,55 @@ class PackageAwareAnalysisScript:
 
         PackageAware.console_log("ANALYSIS_RESULT_POLLING_INTERVAL: " + str(self.analysis_result_polling_interval))
 
+        # ANALYSIS RESULT INITIAL POLLING INTERVAL
+        # Default: 2 seconds, growing towards ANALYSIS_RESULT_POLLING_INTERVAL
+        # Minimum: 1 second
+        # Maximum: ANALYSIS_RESULT_POLLING_INTERVAL (fixed interval polling)
+        self.analysis_result_initial_polling_interval = PackageAwarePollingSchedule.DEFAULT_INITIAL_INTERVAL
+        if args.analysis_result_initial_polling_interval is not None:
+            self.analysis_result_initial_polling_interval = max(
+                args.analysis_result_initial_polling_interval,
+                PackageAwarePollingSchedule.MIN_INITIAL_INTERVAL
+            )
+        self.analysis_result_initial_polling_interval = min(
+            self.analysis_result_initial_polling_interval,
+            self.analysis_result_polling_interval
+        )
+
+        PackageAware.console_log(
+            "ANALYSIS_RESULT_INITIAL_POLLING_INTERVAL: " + str(self.analysis_result_initial_polling_interval)
+        )
+
+    def create_retry_policy(self, metrics=None):
+        return PackageAwareRetryPolicy(
+            max_attempts=self.retry_max_attempts, retry_budget=self.retry_budget, metrics=metrics
+        )
+
+    def create_rate_limiter(self, metrics=None):
+
+        # None when nothing is limited: requests go out without passing through a limiter
+        if self.rate_limit <= 0 and self.max_in_flight <= 0 and not self.rate_limit_adaptive:
+            return None
+
+        return PackageAwareRateLimiter(
+            requests_per_second=self.rate_limit, max_in_flight=self.max_in_flight,
+            adaptive=self.rate_limit_adaptive, metrics=metrics
+        )
+
+    def failure_exit_code(self):
+
+        if self.on_failure == PackageAwareOnFailure.FAIL_THE_BUILD:
+            return 1
+
+        return 0
+
+    def write_async_result_file(self, report_status_url, project_name=None):
+
+        # Write file here for RESULT process to pick up when it runs later
+        PackageAwareAsyncWorkspace(self.async_result_file).add(project_name, report_status_url)
+
+        PackageAware.console_log("Write Analysis URL To File: " + self.async_result_file)
+
     @staticmethod
     def register_arguments():
 
@@ -717,9 +6007,33 @@ class PackageAwareAnalysisScript:
                             required=False
                             )
 
+        parser.add_argument("--dry-run", "--list-manifests", dest="dry_run",
+                            help="List the manifests an analysis would upload, with their size and SHA-256, "
+                                 "and exit. Nothing is sent: only the source code path is required.",
+                            action="store_true",
+                            required=False
+                            )
+
+        parser.add_argument("-e", "--engine", dest="engine",
+                            help="Execution engine: "
+                                 "sync: One request at a time ** Default Value, "
+                                 "asyncio: Discovery, uploads and polling on one event loop "
+                                 "(requires aiohttp and yarl: pip install -r requirements-asyncio.txt, "
+                                 "otherwise sync)",
+                            type=str,
+                            choices=[PackageAwareEngine.SYNC, PackageAwareEngine.ASYNCIO],
+                            default=None,
+                            required=False
+                            )
+
         parser.add_argument("-dte", dest="directories_to_exclude",
-                            help="Listing of directories (relative to ./) to exclude from the search for manifest files.\n"
+                            help="Listing of directories (relative to ./) to exclude from the search for manifest files. "
+                                 "Nothing below an excluded directory is searched, including directories "
+                                 "reached through a symlink inside it. "
+                                 "Entries may be glob patterns: * and ? match within one directory name, "
+                                 "** matches any number of directories.\n"
                                  "Example - Correct: bin/start/\n"
+                                 "Example - Correct: **/node_modules,services/*/test\n"
                                  "Example - Incorrect: ./bin/start/\n"
                                  "Example - Incorrect: /bin/start",
                             type=str,
@@ -727,14 +6041,175 @@ class PackageAwareAnalysisScript:
                             )
 
         parser.add_argument("-fte", dest="files_to_exclude",
-                            help="Listing of files (relative to ./) to exclude from the search for manifest files.\n"
+                            help="Listing of files (relative to ./) to exclude from the search for manifest files. "
+                                 "Entries may be glob patterns, as for -dte.\n"
                                  "Example - Correct: bin/start/requirements.txt\n"
+                                 "Example - Correct: **/test*/requirements.txt\n"
                                  "Example - Incorrect: ./bin/start/requirements.txt\n"
                                  "Example - Incorrect: /bin/start/requirements.txt",
                             type=str,
                             required=False
                             )
 
+        parser.add_argument("--ignore-files", dest="ignore_files",
+                            help="Honor .gitignore and .packageawareignore files: directories and manifests they "
+                                 "ignore are not searched or uploaded. Rules follow .gitignore syntax, including "
+                                 "! to include a path again.",
+                            action="store_true",
+                            required=False
+                            )
+
+        parser.add_argument("-j", "--upload-workers", dest="upload_workers",
+                            help="Number of manifests uploaded concurrently. Default 1, maximum " +
+                                 str(PackageAwareAnalysisScript.MAX_UPLOAD_WORKERS) + ".",
+                            type=int,
+                            default=None,
+                            required=False
+                            )
+
+        parser.add_argument("-hps", "--http-pool-size", dest="http_pool_size",
+                            help="Number of keep-alive connections kept open to the API. "
+                                 "Default: the larger of " + str(PackageAwareApiClient.DEFAULT_POOL_SIZE) +
+                                 " and the number of upload workers.",
+                            type=int,
+                            default=None,
+                            required=False
+                            )
+
+        parser.add_argument("-mce", "--manifest-content-encoding", dest="manifest_content_encoding",
+                            help="Compression of manifest request bodies: "
+                                 "identity: Uncompressed ** Default Value, "
+                                 "gzip: gzip, "
+                                 "zstd: zstd (requires the zstandard package, otherwise gzip). "
+                                 "Uncompressed bodies are sent again if the server rejects the encoding.",
+                            type=str,
+                            choices=[
+                                PackageAwareApiClient.CONTENT_ENCODING_IDENTITY,
+                                PackageAwareApiClient.CONTENT_ENCODING_GZIP,
+                                PackageAwareApiClient.CONTENT_ENCODING_ZSTD
+                            ],
+                            default=None,
+                            required=False
+                            )
+
+        parser.add_argument("--compression-min-bytes", dest="compression_min_bytes",
+                            help="Manifests smaller than this many bytes are sent uncompressed. Default " +
+                                 str(PackageAwareApiClient.DEFAULT_COMPRESSION_MIN_BYTES) + ".",
+                            type=int,
+                            default=None,
+                            required=False
+                            )
+
+        parser.add_argument("--retry-max-attempts", dest="retry_max_attempts",
+                            help="Attempts per API call, including the first. Exceptions and "
+                                 "429/502/503/504 responses are retried with exponential backoff and jitter, "
+                                 "honoring Retry-After. Default " +
+                                 str(PackageAwareRetryPolicy.DEFAULT_MAX_ATTEMPTS) + ".",
+                            type=int,
+                            default=None,
+                            required=False
+                            )
+
+        parser.add_argument("--retry-budget", dest="retry_budget",
+                            help="Total seconds all API calls of the run may spend waiting to retry. Default " +
+                                 str(PackageAwareRetryPolicy.DEFAULT_RETRY_BUDGET) + ".",
+                            type=int,
+                            default=None,
+                            required=False
+                            )
+
+        parser.add_argument("--rate-limit", dest="rate_limit",
+                            help="Most API requests per second, on average, for the whole run (every project "
+                                 "of a batch and every upload worker together). Default: no limit.",
+                            type=float,
+                            default=None,
+                            required=False
+                            )
+
+        parser.add_argument("--max-in-flight", dest="max_in_flight",
+                            help="Most API requests waiting for a response at a time, for the whole run. "
+                                 "Default: no limit.",
+                            type=int,
+                            default=None,
+                            required=False
+                            )
+
+        parser.add_argument("--rate-limit-adaptive", dest="rate_limit_adaptive",
+                            help="Pace API requests by the quota the server reports (X-RateLimit-Remaining / "
+                                 "X-RateLimit-Reset), hold every request while a Retry-After runs and slow "
+                                 "down on 429s, never faster than --rate-limit.",
+                            action="store_true",
+                            required=False
+                            )
+
+        parser.add_argument("--project-list", dest="project_list",
+                            help="Batch mode: path to a JSON list of projects to analyze in one run, e.g. "
+                                 "[{\"project_name\": \"api\", \"source_code_path\": \"./services/api\", "
+                                 "\"directories_to_exclude\": \"services/api/test\"}]. "
+                                 "Excludes default to -dte / -fte. Supported in run_and_wait and async_init modes; "
+                                 "async_result then waits on every project.",
+                            type=str,
+                            required=False
+                            )
+
+        parser.add_argument("--batch-workers", dest="batch_workers",
+                            help="Batch mode: number of projects analyzed concurrently. "
+                                 "Default: " + str(PackageAwareBatch.DEFAULT_WORKERS),
+                            type=int,
+                            default=None,
+                            required=False
+                            )
+
+        parser.add_argument("--daemon", dest="daemon",
+                            help="Run as a daemon serving the runs of --daemon-socket clients from one warm "
+                                 "process: HTTP connections stay open between runs and the discovery of recent "
+                                 "runs is repeated in the background, hashing changed manifests ahead of time.",
+                            action="store_true",
+                            required=False
+                            )
+
+        parser.add_argument("--daemon-socket", dest="daemon_socket",
+                            help="Unix socket of the daemon. With --daemon: the socket to listen on. Otherwise: "
+                                 "send this run to the daemon listening there, or run it in this process when "
+                                 "there is none.",
+                            type=str,
+                            default=None,
+                            required=False
+                            )
+
+        parser.add_argument("--daemon-rescan-interval", dest="daemon_rescan_interval",
+                            help="Seconds between the daemon's background rescans, 0 to disable. "
+                                 "Default: " + str(PackageAwareDaemon.DEFAULT_RESCAN_INTERVAL),
+                            type=int,
+                            default=None,
+                            required=False
+                            )
+
+        parser.add_argument("--log-level", dest="log_level",
+                            help="Lowest level of the messages printed. Default: info",
+                            type=str,
+                            choices=["debug", "info", "warning", "error"],
+                            default=None,
+                            required=False
+                            )
+
+        parser.add_argument("--log-format", dest="log_format",
+                            help="text: One line per message ** Default Value, "
+                                 "jsonl: One JSON object per line with time, level, message and event.",
+                            type=str,
+                            choices=[PackageAwareLog.FORMAT_TEXT, PackageAwareLog.FORMAT_JSONL],
+                            default=None,
+                            required=False
+                            )
+
+        parser.add_argument("-q", "--quiet", dest="quiet",
+                            help="Summary mode: count per-file messages (manifests found, directories and files "
+                                 "excluded, uploads) instead of printing them, and print the totals at the end. "
+                                 "Warnings and errors are still printed.",
+                            action="store_true",
+                            required=False
+                            )
+
         parser.add_argument("-wd", dest="working_directory",
                             help="Absolute path where Package Aware may write and read persistent files for the given build.\n"
                                  "Example - Correct: /tmp/workspace/\n"
@@ -744,6 +6219,108 @@ class PackageAwareAnalysisScript:
                             required=False
                             )
 
+        parser.add_argument("--no-cache", dest="no_cache",
+                            help="Do not read or write the manifest upload cache kept in the working directory.",
+                            action="store_true",
+                            required=False
+                            )
+
+        parser.add_argument("--no-dedup", dest="no_dedup",
+                            help="Upload every manifest, even when another manifest of the analysis has the same "
+                                 "content. By default each distinct manifest body is uploaded once: identical copies "
+                                 "are not sent again and copies under another manifest name reference the first "
+                                 "upload when the server supports it.",
+                            action="store_true",
+                            required=False
+                            )
+
+        parser.add_argument("--metrics", dest="metrics_format",
+                            help="Write per-phase timings, API call / retry / status code counts and byte counts "
+                                 "of the run to the working directory: "
+                                 "none ** Default Value, "
+                                 "json: " + PackageAwareMetrics.JSON_FILE_NAME + ", "
+                                 "prometheus: " + PackageAwareMetrics.PROMETHEUS_FILE_NAME +
+                                 " (for the node_exporter textfile collector), "
+                                 "all: both files.",
+                            type=str,
+                            choices=[
+                                PackageAwareMetrics.FORMAT_NONE,
+                                PackageAwareMetrics.FORMAT_JSON,
+                                PackageAwareMetrics.FORMAT_PROMETHEUS,
+                                PackageAwareMetrics.FORMAT_ALL
+                            ],
+                            default=None,
+                            required=False
+                            )
+
+        parser.add_argument("--discovery-index", dest="discovery_index",
+                            help="Keep an index of directory modification times and the manifests found in them "
+                                 "in the working directory, and only list directories that changed since the "
+                                 "last run.",
+                            action="store_true",
+                            required=False
+                            )
+
+        parser.add_argument("--reuse-result", dest="reuse_result",
+                            help="run_and_wait only: remember the result of the last finished analysis in the "
+                                 "working directory together with a fingerprint of every manifest. When the "
+                                 "manifests are unchanged and the result is younger than --reuse-result-ttl, exit "
+                                 "with that result without calling the API.",
+                            action="store_true",
+                            required=False
+                            )
+
+        parser.add_argument("--reuse-result-ttl", dest="reuse_result_ttl",
+                            help="Seconds a remembered result may be reused. Default " +
+                                 str(PackageAwareVerdictCache.DEFAULT_TTL_SECONDS) + ".",
+                            type=int,
+                            default=None,
+                            required=False
+                            )
+
+        parser.add_argument("--resume", dest="resume",
+                            help="run_and_wait / async_init: continue the analysis an interrupted run with the "
+                                 "same working directory, project and source path left unfinished. Only the "
+                                 "manifests it did not upload are sent and an analysis it started is not started "
+                                 "again. Without such a run, a new analysis is created.",
+                            action="store_true",
+                            required=False
+                            )
+
+        parser.add_argument("--discovery", dest="discovery_backend",
+                            help="How manifests are found: "
+                                 "walk: Walk the file system ** Default Value, "
+                                 "git: Manifests tracked in the git index (untracked files are skipped), "
+                                 "auto: git when source_code_path is in a git work tree, otherwise walk. "
+                                 "git and auto fall back to walk when git is not available.",
+                            type=str,
+                            choices=[
+                                PackageAwareDiscoveryBackend.WALK,
+                                PackageAwareDiscoveryBackend.GIT,
+                                PackageAwareDiscoveryBackend.AUTO
+                            ],
+                            default=None,
+                            required=False
+                            )
+
+        parser.add_argument("--discovery-workers", dest="discovery_workers",
+                            help="Directories listed concurrently by the walk. Raise it when the source tree is "
+                                 "on a network file system where every directory listing waits on the server. "
+                                 "Manifests are found in the same order either way. Default: 1, maximum " +
+                                 str(PackageAwareAnalysisScript.MAX_DISCOVERY_WORKERS) + ".",
+                            type=int,
+                            default=None,
+                            required=False
+                            )
+
+        parser.add_argument("--changed-since", dest="changed_since",
+                            help="Only consider tracked manifests added or modified since this git ref "
+                                 "(commit, branch or tag), including uncommitted changes. "
+                                 "Uses the git discovery backend.",
+                            type=str,
+                            required=False
+                            )
+
         parser.add_argument("-armw", dest="analysis_result_max_wait",
                             help="Maximum seconds to wait for Analysis Result. Default 300.",
                             type=int,
@@ -753,12 +6330,22 @@ class PackageAwareAnalysisScript:
 
         parser.add_argument("-arpi", dest="analysis_result_polling_interval",
                             help="Polling interval (in seconds) for analysis result completion (success/failure). "
+                                 "Polls start at the initial polling interval and back off up to this value. "
                                  "Min value: 10",
                             type=int,
                             default=10,
                             required=False
                             )
 
+        parser.add_argument("-arpii", dest="analysis_result_initial_polling_interval",
+                            help="Interval (in seconds) before the first analysis result polls. "
+                                 "Default " + str(PackageAwarePollingSchedule.DEFAULT_INITIAL_INTERVAL) +
+                                 ". Set it to the polling interval for fixed interval polling.",
+                            type=int,
+                            default=None,
+                            required=False
+                            )
+
         # CONTEXT PARAMETERS
 
         parser.add_argument("-buri", dest="base_uri",
@@ -806,162 +6393,37 @@ if __name__ == "__main__":
     # Initialize Package Aware
     package_aware = PackageAware()
 
+    # Buffered log lines (and summary mode totals) are written out however the run ends
+    atexit.register(PackageAware.LOG.close)
+
     # Register and load script arguments
     parser = package_aware.script.register_arguments()
     args = parser.parse_args()
-    package_aware.script.load_script_arguments()
-
-    if not package_aware.context.load(args):
-
-        PackageAware.console_log("Could not find required Environment/Script Variables. "
-                                 "One or more are missing or empty:")
-
-        package_aware.context.print_invalid()
-
-        if package_aware.script.on_failure == PackageAwareOnFailure.FAIL_THE_BUILD:
-            sys.exit(1)
-        else:
-            sys.exit(0)
-
-    # Ensure Working Directory is present if mode is ASYNC
-    if package_aware.script.mode in(PackageAwareModeOfOperation.ASYNC_INIT, PackageAwareModeOfOperation.ASYNC_RESULT):
-        if len(package_aware.script.working_directory) == 0:
-            PackageAware.console_log("Working Directory is required when mode is ASYNC. Exiting.")
-            if package_aware.script.on_failure == PackageAwareOnFailure.FAIL_THE_BUILD:
-                sys.exit(1)
-            else:
-                sys.exit(0)
-
-    if package_aware.script.mode in (PackageAwareModeOfOperation.RUN_AND_WAIT, PackageAwareModeOfOperation.ASYNC_INIT):
-
-        # Make API call and store response
-        structure_response = PackageAwareStructureAPI.exec(package_aware.context)
-
-        if structure_response.original_response is None:
-            PackageAware.console_log("A Structure API error occurred: Could not execute API.")
-            if package_aware.script.on_failure == PackageAwareOnFailure.FAIL_THE_BUILD:
-                sys.exit(1)
-            else:
-                sys.exit(0)
-
-        if structure_response.original_response.status_code != 201:
-            print("PACKAGE_AWARE: A Structure API error occurred: Response Code " +
-                  str(structure_response.original_response.status_code)
-            )
-            if package_aware.script.on_failure == PackageAwareOnFailure.FAIL_THE_BUILD:
-                sys.exit(1)
-            else:
-                sys.exit(0)
-
-        # ## STRUCTURE API CALL SUCCESSFUL - CONTINUE
 
-        PackageAware.console_log("------------------------")
-        PackageAware.console_log("Analysis Structure Request Created")
-        PackageAware.console_log("------------------------")
-        PackageAware.console_log("Analysis Id: " + structure_response.analysis_id)
-        PackageAware.console_log("Project Id:  " + structure_response.project_id)
+    # Hand the run to a daemon when one listens on --daemon-socket; otherwise run it here
+    if args.daemon_socket is not None and not args.daemon:
 
-        manifests_found_count = package_aware.send_manifests(
-            structure_response.project_id,
-            structure_response.analysis_id,
-            package_aware.script.directories_to_exclude,
-            package_aware.script.files_to_exclude
+        daemon_exit_code = PackageAwareDaemonClient(args.daemon_socket.strip()).run(
+            sys.argv[1:],
+            0 if args.on_failure == PackageAwareOnFailure.CONTINUE_ON_FAILURE else 1
         )
 
-        if manifests_found_count > 0:
-
-            # api_start_url = package_aware.context.base_uri + \
-            #                 "clients/" + package_aware.context.client_id + \
-            #                 "/projects/" + project_id + \
-            #                 "/analysis/" + analysis_id
-
-            PackageAware.console_log("------------------------")
-            PackageAware.console_log("Starting Analysis")
-            PackageAware.console_log("------------------------")
-
-            response = PackageAwareAnalysisStartAPI.exec(
-                pa_context=package_aware.context,
-                project_id=structure_response.project_id,
-                analysis_id=structure_response.analysis_id
-            )
-
-            PackageAware.console_log("Analysis Start API Response Code: " + str(response.status_code))
-
-            if response.status_code != 200:
-                PackageAware.console_log("An error occurred: " + str(response.content))
-                if package_aware.script.on_failure == PackageAwareOnFailure.FAIL_THE_BUILD:
-                    sys.exit(1)
-                else:
-                    sys.exit(0)
-            else:
-
-                # NOTE: This is the only route where the initiate request was successful
-
-                PackageAware.console_log(
-                    "Analysis request is running, once completed, access the report using the links below"
-                )
-                PackageAware.console_log("ReportUrl: " + structure_response.report_url)
-                PackageAware.console_log("EmbedUrl: " + structure_response.embed_url)
-
-                if package_aware.script.mode == PackageAwareModeOfOperation.RUN_AND_WAIT:
-
-                    package_aware.analysis_result_exec(
-                        structure_response.report_status_url,
-                        package_aware.script.analysis_result_max_wait,
-                        package_aware.script.analysis_result_polling_interval
-                    )
-
-                elif package_aware.script.mode == PackageAwareModeOfOperation.ASYNC_INIT:
-
-                    # Write file here for RESULT process to pick up when it runs later
-                    file_contents = {"report_status_url": structure_response.report_status_url}
-                    file = open(package_aware.script.async_result_file, "w")
-                    file.write(json.dumps(file_contents))
-                    file.close()
-
-                    PackageAware.console_log("Write Analysis URL To File: " + package_aware.script.async_result_file)
-
-                sys.exit(0)
-        else:
-            PackageAware.console_log("Could not locate any manifests under " + package_aware.context.source_code_path)
-            if package_aware.script.on_failure == PackageAwareOnFailure.FAIL_THE_BUILD:
-                sys.exit(1)
-            else:
-                sys.exit(0)
-
-    elif package_aware.script.mode == PackageAwareModeOfOperation.ASYNC_RESULT:
-
-        # Sit and wait for ASYNC RESULT
-
-        try:
-
-            with open(package_aware.script.async_result_file, 'r') as the_file:
-
-                async_result_content = the_file.read()
-                async_result_values = json.loads(async_result_content)
-
-                package_aware.console_log("Getting Analysis Result For: " + async_result_values["report_status_url"])
+        if daemon_exit_code is not None:
+            sys.exit(daemon_exit_code)
 
-                package_aware.analysis_result_exec(
-                    async_result_values["report_status_url"],
-                    package_aware.script.analysis_result_max_wait,
-                    package_aware.script.analysis_result_polling_interval
-                )
-
-            sys.exit(0)
+        PackageAware.console_log("No daemon is listening on " + args.daemon_socket + ". Running in this process.",
+                                 PackageAwareLog.WARNING)
 
-        except FileNotFoundError as e:
-            PackageAware.console_log("ERROR: The async file (containing the report URL) could not be found. Exiting.")
-            if package_aware.script.on_failure == PackageAwareOnFailure.FAIL_THE_BUILD:
-                sys.exit(1)
-            else:
-                sys.exit(0)
-    else:
+    package_aware.script.load_script_arguments()
 
-        PackageAware.console_log("ERROR: Mode argument is not a valid Package Aware Mode.")
+    if package_aware.script.daemon:
 
-        if package_aware.script.on_failure == PackageAwareOnFailure.FAIL_THE_BUILD:
+        if package_aware.script.daemon_socket is None:
+            PackageAware.console_log("ERROR: --daemon requires --daemon-socket. Exiting.", PackageAwareLog.ERROR)
             sys.exit(1)
-        else:
-            sys.exit(0)
 
+        sys.exit(PackageAwareDaemon(
+            package_aware.script.daemon_socket, parser, package_aware.script.daemon_rescan_interval
+        ).serve())
+
+    package_aware.run_script(args)
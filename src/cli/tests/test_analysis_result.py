@@ -0,0 +1,78 @@
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from packageaware import PackageAware, PackageAwarePollingSchedule  # noqa: E402
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, content_object=None, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = json.dumps(content_object or {}).encode("utf-8")
+
+
+class AnalysisResultExitCodeTest(unittest.TestCase):
+
+    def exit_code(self, response):
+        return PackageAware.analysis_result_exit_code(response, 10)
+
+    def test_finished_analysis_passes(self):
+        self.assertEqual(self.exit_code(FakeResponse(200, {"status": "Finished"})), 0)
+
+    def test_failed_analysis_fails(self):
+        self.assertEqual(self.exit_code(FakeResponse(200, {"status": "failed_violations"})), 1)
+
+    def test_running_or_errored_analysis_keeps_polling(self):
+        self.assertIsNone(self.exit_code(FakeResponse(200, {"status": "running"})))
+        self.assertIsNone(self.exit_code(FakeResponse(200, {"status": "error"})))
+
+    def test_unexpected_status_code_fails(self):
+        self.assertEqual(self.exit_code(FakeResponse(500)), 1)
+
+    def test_missing_response_fails(self):
+        self.assertEqual(self.exit_code(None), 1)
+
+
+class PollingScheduleTest(unittest.TestCase):
+
+    def test_polls_start_fast_and_back_off_to_the_polling_interval(self):
+        schedule = PackageAwarePollingSchedule(2, 10)
+
+        delays = [schedule.next_delay() for _ in range(0, 6)]
+
+        self.assertEqual(delays[:3], [2, 3.0, 4.5])
+        self.assertEqual(delays[-1], 10)
+
+    def test_retry_after_from_the_server_wins(self):
+        schedule = PackageAwarePollingSchedule(2, 10)
+
+        self.assertEqual(schedule.next_delay(FakeResponse(200, headers={"Retry-After": "30"})), 30.0)
+
+
+class ConditionalStatusTest(unittest.TestCase):
+
+    def test_not_modified_reuses_the_last_status(self):
+        running = FakeResponse(200, {"status": "running"}, {"ETag": '"v1"'})
+
+        response, last_status_response = PackageAware.resolve_status_response(FakeResponse(304), running)
+
+        self.assertIs(response, running)
+        self.assertEqual(PackageAware.status_etag(last_status_response), '"v1"')
+
+    def test_new_status_replaces_the_last_one(self):
+        running = FakeResponse(200, {"status": "running"}, {"ETag": '"v1"'})
+        finished = FakeResponse(200, {"status": "finished"}, {"ETag": '"v2"'})
+
+        response, last_status_response = PackageAware.resolve_status_response(finished, running)
+
+        self.assertIs(response, finished)
+        self.assertIs(last_status_response, finished)
+
+
+if __name__ == "__main__":
+    unittest.main()
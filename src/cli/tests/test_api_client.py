@@ -0,0 +1,156 @@
+import asyncio
+import gzip
+import io
+import os
+import sys
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import packageaware  # noqa: E402
+from packageaware import (  # noqa: E402
+    PackageAware, PackageAwareAnalysisResultAPI, PackageAwareAnalysisScript, PackageAwareApiClient,
+    PackageAwareAsyncApiClient, PackageAwareContext, PackageAwareImports, PackageAwareStructureAPI
+)
+
+
+class RecordingHandler(BaseHTTPRequestHandler):
+
+    # Keep-alive server recording the client port and headers of every request
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def answer(self, status_code):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.server.requests.append((self.client_address[1], dict(self.headers)))
+
+        body = b'{"status": "running"}'
+        self.send_response(status_code)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.answer(200)
+
+    def do_POST(self):
+        self.answer(400)
+
+
+class ApiClientCompressionTest(unittest.TestCase):
+
+    def setUp(self):
+        context = PackageAwareContext()
+        context.api_key = "key"
+
+        self.client = PackageAwareApiClient(
+            context,
+            content_encoding=PackageAwareApiClient.CONTENT_ENCODING_GZIP,
+            compression_min_bytes=100
+        )
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_api_key_is_sent_by_default(self):
+        self.assertEqual(self.client.session.headers['x-pa-apikey'], "key")
+
+    def test_small_bodies_are_sent_uncompressed(self):
+        self.assertIsNone(self.client.select_content_encoding(99))
+        self.assertEqual(self.client.select_content_encoding(100), PackageAwareApiClient.CONTENT_ENCODING_GZIP)
+
+    def test_gzip_body_round_trips(self):
+        body = b"<Project>" + b"<PackageReference />" * 200 + b"</Project>"
+
+        compressed = PackageAwareApiClient.compress_body(body, PackageAwareApiClient.CONTENT_ENCODING_GZIP)
+
+        self.assertLess(len(compressed), len(body))
+        self.assertEqual(gzip.decompress(compressed), body)
+
+    def test_rejected_encoding_is_disabled_for_the_run(self):
+        self.client.disable_compression(PackageAwareApiClient.CONTENT_ENCODING_GZIP)
+
+        self.assertIsNone(self.client.select_content_encoding(10000))
+
+
+
+class ApiClientSessionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), RecordingHandler)
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.context = PackageAwareContext()
+        self.context.base_uri = "http://127.0.0.1:" + str(self.server.server_address[1]) + "/"
+        self.context.client_id = "client"
+        self.context.project_name = "project"
+        self.context.api_key = "key"
+
+        self.client = PackageAwareApiClient(self.context)
+        self.addCleanup(self.client.close)
+
+    def test_calls_reuse_one_session_and_its_connection(self):
+        session = self.client.session
+
+        PackageAwareStructureAPI.exec(self.context, self.client)
+        PackageAwareAnalysisResultAPI.exec(self.context, self.client, self.context.base_uri + "status/1")
+        PackageAwareAnalysisResultAPI.exec(self.context, self.client, self.context.base_uri + "status/1")
+
+        self.assertIs(self.client.session, session)
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(len(set(port for port, headers in self.server.requests)), 1)
+
+    def test_api_key_header_is_sent_with_every_request(self):
+        PackageAwareStructureAPI.exec(self.context, self.client)
+        PackageAwareAnalysisResultAPI.exec(self.context, self.client, self.context.base_uri + "status/1", etag='"a"')
+
+        self.assertEqual([headers.get("x-pa-apikey") for port, headers in self.server.requests], ["key", "key"])
+
+    def test_pool_size_follows_the_upload_workers(self):
+        self.addCleanup(setattr, PackageAware.LOG, "stream", PackageAware.LOG.stream)
+        PackageAware.LOG.redirect(io.StringIO())
+
+        saved_args = getattr(packageaware, "args", None)
+        self.addCleanup(setattr, packageaware, "args", saved_args)
+
+        script = PackageAwareAnalysisScript()
+        packageaware.args = PackageAwareAnalysisScript.register_arguments().parse_args(["-j", "16"])
+        script.load_script_arguments()
+
+        client = PackageAwareApiClient(self.context, pool_size=script.http_pool_size)
+        self.addCleanup(client.close)
+
+        self.assertEqual(script.http_pool_size, 16)
+        self.assertEqual(client.session.get_adapter(self.context.base_uri)._pool_maxsize, 16)
+
+
+    @unittest.skipIf(not PackageAwareImports.is_available("aiohttp"), "aiohttp is not installed")
+    def test_async_client_reuses_one_session_with_the_same_headers(self):
+
+        async def run_calls():
+            client = PackageAwareAsyncApiClient(self.context, pool_size=8)
+            await client.open()
+            try:
+                await PackageAwareStructureAPI.async_exec(self.context, client)
+                await PackageAwareAnalysisResultAPI.async_exec(self.context, client, self.context.base_uri + "status/1")
+            finally:
+                await client.close()
+
+            return client
+
+        client = asyncio.run(run_calls())
+
+        self.assertEqual((client.pool_size, client.owns_session), (8, True))
+        self.assertEqual([headers.get("x-pa-apikey") for port, headers in self.server.requests], ["key", "key"])
+        self.assertEqual(len(set(port for port, headers in self.server.requests)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
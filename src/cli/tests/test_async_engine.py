@@ -0,0 +1,117 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+CLI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+sys.path.insert(0, CLI_DIR)
+sys.path.insert(0, os.path.join(CLI_DIR, "..", "benchmark"))
+
+from packageaware import PackageAwareImports  # noqa: E402
+from stub_server import BenchmarkStubServer, BenchmarkStubState  # noqa: E402
+
+
+@unittest.skipUnless(PackageAwareImports.is_available("aiohttp"), "--engine asyncio needs aiohttp")
+class AsyncEngineTest(unittest.TestCase):
+
+    # Runs the CLI with --engine asyncio against the benchmark stub server
+
+    MANIFESTS = 5
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+        self.source = os.path.join(self.root, "source")
+        for number in range(AsyncEngineTest.MANIFESTS):
+            self.write(os.path.join("service_" + str(number), "requirements.txt"), "package-" + str(number) + "\n")
+
+        self.state = BenchmarkStubState(failing_projects=["failing"])
+        self.server = BenchmarkStubServer(0, self.state)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def write(self, relative_path, content):
+        path = os.path.join(self.source, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as the_file:
+            the_file.write(content)
+
+    def run_cli(self, mode, project_name="project"):
+
+        completed = subprocess.run(
+            [
+                sys.executable, os.path.join(CLI_DIR, "packageaware.py"),
+                "-e", "asyncio", "-m", mode,
+                "-buri", "http://127.0.0.1:" + str(self.server.server_address[1]) + "/api/",
+                "-cid", "client", "-pn", project_name, "-akey", "key",
+                "-scp", self.source, "-wd", os.path.join(self.root, "workspace"),
+                "-arpii", "1", "-armw", "30"
+            ],
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=60
+        )
+
+        output = completed.stdout.decode("utf-8")
+
+        self.assertIn("ENGINE: asyncio", output)
+
+        return completed.returncode, output
+
+    def requests(self, endpoint):
+        return self.state.stats["requests"].get(endpoint, 0)
+
+    def test_run_and_wait(self):
+        exit_code, output = self.run_cli("run_and_wait")
+
+        self.assertEqual(exit_code, 0, output)
+        self.assertIn("Analysis Completed Successfully", output)
+        self.assertEqual(self.requests("manifest"), AsyncEngineTest.MANIFESTS)
+        self.assertEqual(self.requests("start"), 1)
+
+    def test_run_and_wait_reports_violations(self):
+        exit_code, output = self.run_cli("run_and_wait", project_name="failing")
+
+        self.assertEqual(exit_code, 1, output)
+        self.assertIn("FAILURE: Violations reported.", output)
+
+    def test_async_init_then_async_result(self):
+        exit_code, output = self.run_cli("async_init")
+
+        self.assertEqual(exit_code, 0, output)
+        self.assertEqual(self.requests("status"), 0)
+
+        exit_code, output = self.run_cli("async_result")
+
+        self.assertEqual(exit_code, 0, output)
+        self.assertIn("Analysis Completed Successfully", output)
+        self.assertGreater(self.requests("status"), 0)
+
+    def test_a_503_is_retried(self):
+        # The Structure API call and its first retry get a 503: the third attempt goes through
+        self.state.fail_first = 2
+
+        exit_code, output = self.run_cli("run_and_wait")
+
+        self.assertEqual(exit_code, 0, output)
+        self.assertEqual(self.state.stats["status_codes"]["503"], 2)
+        self.assertEqual(self.requests("structure"), 3)
+        self.assertEqual(self.requests("manifest"), AsyncEngineTest.MANIFESTS)
+
+    def test_discovery_ends_with_a_failed_structure_call(self):
+        self.state.fail_first = 3
+
+        exit_code, output = self.run_cli("run_and_wait")
+
+        self.assertEqual(exit_code, 1, output)
+        self.assertIn("A Structure API error occurred: Response Code 503", output)
+        self.assertNotIn("never retrieved", output)
+        self.assertNotIn("Task was destroyed", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
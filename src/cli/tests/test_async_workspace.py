@@ -0,0 +1,188 @@
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from packageaware import (  # noqa: E402
+    PackageAware, PackageAwareApiClient, PackageAwareAnalysisResultAPI, PackageAwareAsyncWorkspace
+)
+
+
+class FakeResponse:
+
+    def __init__(self, status):
+        self.status_code = 200
+        self.headers = {}
+        self.content = json.dumps({"status": status}).encode("utf-8")
+
+
+class AsyncWorkspaceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.async_result_file = os.path.join(self.root, "workspace", "package_aware_async.json")
+        self.workspace = PackageAwareAsyncWorkspace(self.async_result_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_legacy_file_holds_one_analysis(self):
+        os.makedirs(os.path.dirname(self.async_result_file))
+        with open(self.async_result_file, "w") as the_file:
+            the_file.write(json.dumps({"report_status_url": "http://api/status/1"}))
+
+        self.assertEqual(self.workspace.load(), [{"project_name": None, "report_status_url": "http://api/status/1"}])
+
+    def test_each_project_keeps_its_latest_analysis(self):
+        self.workspace.add("api", "http://api/status/1")
+        self.workspace.add("web", "http://api/status/2")
+        self.workspace.add("api", "http://api/status/3")
+
+        self.assertEqual(
+            [(a["project_name"], a["report_status_url"]) for a in self.workspace.load()],
+            [("web", "http://api/status/2"), ("api", "http://api/status/3")]
+        )
+
+        # Older readers still find the latest analysis at the top level
+        with open(self.async_result_file) as the_file:
+            self.assertEqual(json.loads(the_file.read())["report_status_url"], "http://api/status/3")
+
+        self.assertFalse(os.path.exists(self.workspace.lock_file))
+
+    def test_analyses_past_the_age_bound_are_not_waited_on(self):
+        self.workspace.add("api", "http://api/status/1")
+        self.workspace.add("web", "http://api/status/2")
+
+        with open(self.async_result_file) as the_file:
+            async_result_values = json.loads(the_file.read())
+        async_result_values["analyses"][0]["started_at"] -= PackageAwareAsyncWorkspace.MAX_AGE_SECONDS + 1
+        with open(self.async_result_file, "w") as the_file:
+            the_file.write(json.dumps(async_result_values))
+
+        self.addCleanup(setattr, PackageAware.LOG, "stream", PackageAware.LOG.stream)
+        PackageAware.LOG.redirect(io.StringIO())
+
+        self.assertEqual([a["project_name"] for a in self.workspace.load()], ["web"])
+
+    def test_reported_analyses_are_removed(self):
+        self.workspace.add("api", "http://api/status/1")
+        self.workspace.add("web", "http://api/status/2")
+
+        self.workspace.remove(["http://api/status/1"])
+        self.assertEqual([a["project_name"] for a in self.workspace.load()], ["web"])
+
+        self.workspace.remove(["http://api/status/2"])
+        self.assertFalse(os.path.exists(self.async_result_file))
+
+    def write_lock(self, pid):
+        os.makedirs(os.path.dirname(self.workspace.lock_file), exist_ok=True)
+        with open(self.workspace.lock_file, "w") as the_file:
+            the_file.write(json.dumps({"pid": pid, "host": platform.node(), "token": 1}))
+
+    @unittest.skipUnless(os.name == "posix", "the holder of a lock is only checked on POSIX")
+    def test_the_lock_of_a_dead_process_is_taken_over(self):
+        finished = subprocess.Popen([sys.executable, "-c", "pass"])
+        finished.wait()
+        self.write_lock(finished.pid)
+
+        self.addCleanup(setattr, PackageAware.LOG, "stream", PackageAware.LOG.stream)
+        PackageAware.LOG.redirect(io.StringIO())
+
+        self.workspace.add("api", "http://api/status/1")
+
+        self.assertEqual(len(self.workspace.load()), 1)
+        self.assertFalse(os.path.exists(self.workspace.lock_file))
+
+    def test_the_lock_of_a_live_process_is_waited_for(self):
+        self.write_lock(os.getpid())
+
+        with mock.patch.object(PackageAwareAsyncWorkspace, "LOCK_TIMEOUT_SECONDS", 0.2):
+            with self.assertRaises(TimeoutError):
+                self.workspace.add("api", "http://api/status/1")
+
+        self.assertTrue(os.path.exists(self.workspace.lock_file))
+        self.assertFalse(os.path.exists(self.async_result_file))
+
+    def test_an_old_lock_is_taken_over(self):
+        self.write_lock(os.getpid())
+        stale_time = time.time() - PackageAwareAsyncWorkspace.LOCK_STALE_SECONDS - 1
+        os.utime(self.workspace.lock_file, (stale_time, stale_time))
+
+        self.addCleanup(setattr, PackageAware.LOG, "stream", PackageAware.LOG.stream)
+        PackageAware.LOG.redirect(io.StringIO())
+
+        self.workspace.add("api", "http://api/status/1")
+
+        self.assertEqual(len(self.workspace.load()), 1)
+
+
+class WaitForAnalysisResultsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.package_aware = PackageAware()
+        self.package_aware.client = PackageAwareApiClient(self.package_aware.context)
+        self.polled_urls = []
+
+    def tearDown(self):
+        self.package_aware.client.close()
+
+    def wait(self, statuses, workspace=None):
+
+        def exec_status(pa_context, pa_client, result_uri, etag=None):
+            self.polled_urls.append(result_uri)
+            return FakeResponse(statuses[result_uri].pop(0))
+
+        if workspace is None:
+            analyses = [{"project_name": url, "report_status_url": url} for url in statuses]
+        else:
+            analyses = workspace.load()
+            self.package_aware.async_workspace = workspace
+
+        with mock.patch.object(PackageAwareAnalysisResultAPI, "exec", exec_status), \
+                mock.patch("time.sleep"):
+            return self.package_aware.wait_for_analysis_results(analyses, 60, 0.01, 0.01)
+
+    def test_succeeds_once_every_analysis_finished(self):
+        self.assertEqual(self.wait({
+            "a": ["running", "running", "finished"],
+            "b": ["finished"],
+        }), 0)
+
+        self.assertEqual(self.polled_urls.count("b"), 1)
+
+    def test_first_failure_decides_without_waiting_for_the_rest(self):
+        self.assertEqual(self.wait({
+            "a": ["running", "running", "running", "finished"],
+            "b": ["running", "failed_vulnerabilities"],
+        }), 1)
+
+        self.assertEqual(self.polled_urls.count("a"), 2)
+
+    def test_only_analyses_still_running_are_left_for_the_next_async_result(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+
+        workspace = PackageAwareAsyncWorkspace(os.path.join(root, "package_aware_async.json"))
+        for url in ("a", "b", "c"):
+            workspace.add(url, url)
+
+        self.assertEqual(self.wait({
+            "a": ["running", "running"],
+            "b": ["running", "failed_violations"],
+            "c": ["finished"],
+        }, workspace), 1)
+
+        self.assertEqual([a["report_status_url"] for a in workspace.load()], ["a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
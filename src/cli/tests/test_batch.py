@@ -0,0 +1,86 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from packageaware import PackageAware, PackageAwareBatch, PackageAwareEngine, PackageAwareOnFailure  # noqa: E402
+
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+        self.package_aware = PackageAware()
+        self.package_aware.context.base_uri = "http://localhost/"
+        self.package_aware.context.client_id = "client"
+        self.package_aware.context.api_key = "key"
+        self.package_aware.script.code_root = self.root + os.sep
+        self.package_aware.script.engine = PackageAwareEngine.SYNC
+        self.package_aware.script.on_failure = PackageAwareOnFailure.FAIL_THE_BUILD
+        self.package_aware.script.directories_to_exclude = [self.root + os.sep + "global"]
+        self.package_aware.script.files_to_exclude = []
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write_project_list(self, project_list):
+        project_list_file = os.path.join(self.root, "projects.json")
+        with open(project_list_file, "w") as the_file:
+            the_file.write(json.dumps(project_list))
+        return project_list_file
+
+    def test_project_list_requires_name_and_path(self):
+        project_list_file = self.write_project_list([{"project_name": "api"}])
+
+        with self.assertRaises(ValueError):
+            PackageAwareBatch.load_project_list(project_list_file)
+
+    def test_project_gets_its_own_context_and_excludes(self):
+        batch = PackageAwareBatch(self.package_aware, [])
+
+        project_aware = batch.create_project({
+            "project_name": "api",
+            "source_code_path": "services/api",
+            "directories_to_exclude": "services/api/test, services/api/docs"
+        })
+
+        self.assertEqual(project_aware.context.project_name, "api")
+        self.assertEqual(project_aware.context.source_code_path, "services/api")
+        self.assertEqual(project_aware.context.api_key, "key")
+        self.assertEqual(project_aware.script.directories_to_exclude, [
+            self.root + os.sep + "services/api/test", self.root + os.sep + "services/api/docs"
+        ])
+        # Global excludes are untouched, and used when a project has none
+        self.assertEqual(self.package_aware.script.directories_to_exclude, [self.root + os.sep + "global"])
+        self.assertEqual(
+            batch.create_project({"project_name": "web", "source_code_path": "web"}).script.directories_to_exclude,
+            [self.root + os.sep + "global"]
+        )
+
+    def test_any_failed_project_fails_the_batch(self):
+        projects = PackageAwareBatch.load_project_list(self.write_project_list([
+            {"project_name": "api", "source_code_path": "services/api"},
+            {"project_name": "web", "source_code_path": "services/web"},
+            {"project_name": "cli", "source_code_path": "services/cli"},
+        ]))
+
+        def run_analysis(project_aware):
+            if project_aware.context.project_name == "web":
+                raise RuntimeError("boom")
+            return 0
+
+        with mock.patch.object(PackageAware, "run_analysis", run_analysis):
+            self.assertEqual(PackageAwareBatch(self.package_aware, projects, workers=2).run(), 1)
+
+        with mock.patch.object(PackageAware, "run_analysis", lambda project_aware: 0):
+            self.assertEqual(PackageAwareBatch(self.package_aware, projects, workers=2).run(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,255 @@
+import io
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+CLI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+sys.path.insert(0, CLI_DIR)
+sys.path.insert(0, os.path.join(CLI_DIR, "..", "benchmark"))
+
+from packageaware import (  # noqa: E402
+    PackageAware, PackageAwareAnalysisScript, PackageAwareDaemon, PackageAwareDaemonClient, PackageAwareDaemonStream,
+    PackageAwareHashCache
+)
+from stub_server import BenchmarkStubServer, BenchmarkStubState  # noqa: E402
+
+
+class HashCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+        self.path = os.path.join(self.root, "requirements.txt")
+        self.write("requests==2.24.0\n")
+
+        # Every hash is trusted: the file is not written again within the test's mtime tick
+        self.hash_cache = PackageAwareHashCache(racy_window_ns=-10 * 1000 * 1000 * 1000)
+
+    def write(self, content):
+        with open(self.path, "w") as the_file:
+            the_file.write(content)
+
+    def manifest(self):
+        return {'path': self.path, 'manifest_name': 'requirements.txt'}
+
+    def test_unchanged_manifests_are_not_hashed_again(self):
+        first = self.manifest()
+        self.hash_cache.annotate([first])
+
+        second = self.manifest()
+        self.hash_cache.annotate([second])
+
+        self.assertEqual(second['sha256'], first['sha256'])
+        self.assertEqual(second['size'], 17)
+        self.assertEqual((self.hash_cache.hashed_count, self.hash_cache.reused_count), (1, 1))
+
+    def test_changed_manifests_are_hashed_again(self):
+        first = self.manifest()
+        self.hash_cache.annotate([first])
+
+        self.write("requests==2.25.0\nflask\n")
+
+        second = self.manifest()
+        self.hash_cache.annotate([second])
+
+        self.assertNotEqual(second['sha256'], first['sha256'])
+        self.assertEqual(self.hash_cache.hashed_count, 2)
+
+    def test_manifests_no_longer_found_are_forgotten(self):
+        self.hash_cache.annotate([self.manifest()])
+
+        self.hash_cache.forget_missing([], self.root)
+
+        self.assertEqual(self.hash_cache.entries, {})
+
+    def test_changes_of_a_forked_copy_are_applied_to_the_daemon(self):
+        daemon_cache = PackageAwareHashCache()
+        self.hash_cache.annotate([self.manifest()])
+        daemon_cache.apply_changes(self.hash_cache.take_changes())
+
+        self.assertEqual(daemon_cache.entries, self.hash_cache.entries)
+        self.assertEqual(self.hash_cache.take_changes(), {"updated": {}, "removed": []})
+
+        self.hash_cache.forget_missing([], self.root)
+        daemon_cache.apply_changes(self.hash_cache.take_changes())
+
+        self.assertEqual(daemon_cache.entries, {})
+
+
+class DaemonRequestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+        os.makedirs(os.path.join(self.root, "tree", "app"))
+        with open(os.path.join(self.root, "tree", "app", "package.json"), "w") as the_file:
+            the_file.write("{}")
+
+        self.socket_path = os.path.join(self.root, "daemon.sock")
+
+        self.daemon = PackageAwareDaemon(
+            self.socket_path, PackageAwareAnalysisScript.register_arguments(), rescan_interval=0
+        )
+
+        self.addCleanup(setattr, PackageAware.LOG, "stream", PackageAware.LOG.stream)
+
+    def request(self):
+        return {"argv": ["-scp", "./", "--dry-run"], "cwd": os.path.join(self.root, "tree"), "env": {}}
+
+    def test_runs_a_request_in_its_working_directory(self):
+        output = io.StringIO()
+        cwd = os.getcwd()
+
+        exit_code, watched = self.daemon.run_request(self.request(), PackageAwareDaemonStream(output))
+
+        self.assertEqual((exit_code, watched), (0, True))
+        self.assertIn(os.path.join(".", "app", "package.json"), output.getvalue())
+        self.assertIn("Dry run: 1 manifests (2 bytes) would be uploaded", output.getvalue())
+
+        self.assertEqual(os.getcwd(), cwd)
+
+    def test_client_without_a_daemon_runs_nothing(self):
+        self.assertIsNone(PackageAwareDaemonClient(self.socket_path).run(["--dry-run"]))
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX") and hasattr(os, "fork"), "the daemon needs Unix sockets and fork")
+class DaemonServeTest(unittest.TestCase):
+
+    # A daemon process serving clients that are processes of their own, as on a build host
+
+    ANALYSIS_SECONDS = 3
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+        self.tree = os.path.join(self.root, "tree")
+        os.makedirs(os.path.join(self.tree, "app"))
+        manifest_path = os.path.join(self.tree, "app", "package.json")
+        with open(manifest_path, "w") as the_file:
+            the_file.write("{}")
+
+        # Old enough for the hash cache to trust its hash
+        os.utime(manifest_path, (time.time() - 60, time.time() - 60))
+
+        self.socket_path = os.path.join(self.root, "daemon.sock")
+        self.daemon_log = os.path.join(self.root, "daemon.log")
+
+        self.state = BenchmarkStubState(
+            analysis_seconds=DaemonServeTest.ANALYSIS_SECONDS, failing_projects=["failing"]
+        )
+        self.server = BenchmarkStubServer(0, self.state)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def start_daemon(self, rescan_interval=0):
+
+        with open(self.daemon_log, "w") as log_file:
+            daemon = subprocess.Popen(
+                [
+                    sys.executable, os.path.join(CLI_DIR, "packageaware.py"), "--daemon",
+                    "--daemon-socket", self.socket_path, "--daemon-rescan-interval", str(rescan_interval)
+                ],
+                stdout=log_file, stderr=subprocess.STDOUT
+            )
+
+        self.addCleanup(daemon.wait, 10)
+        self.addCleanup(daemon.terminate)
+
+        client = PackageAwareDaemonClient(self.socket_path)
+
+        for attempt in range(100):
+            if client.is_running():
+                return
+            time.sleep(0.05)
+
+        self.fail("The daemon did not start")
+
+    def start_client(self, arguments):
+        return subprocess.Popen(
+            [sys.executable, os.path.join(CLI_DIR, "packageaware.py"), "--daemon-socket", self.socket_path] + arguments,
+            cwd=self.tree, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+        )
+
+    def analysis_arguments(self, project_name):
+        return [
+            "-scp", "./", "-buri", "http://127.0.0.1:" + str(self.server.server_address[1]) + "/api/",
+            "-pn", project_name, "-cid", "client", "-akey", "key", "-arpii", "1", "-armw", "60"
+        ]
+
+    def finish(self, client):
+        output, unused = client.communicate(timeout=60)
+        return client.returncode, output.decode("utf-8")
+
+    def read_daemon_log(self):
+        with open(self.daemon_log) as log_file:
+            return log_file.read()
+
+    def test_client_relays_output_and_exit_code(self):
+        self.start_daemon()
+
+        exit_code, output = self.finish(self.start_client(
+            ["-m", "not_a_mode"] + self.analysis_arguments("test")
+        ))
+
+        self.assertEqual(exit_code, 1, output)
+        self.assertIn("Mode argument is not a valid Package Aware Mode", output)
+
+    def test_concurrent_clients_run_side_by_side(self):
+        self.start_daemon()
+
+        passing = self.start_client(self.analysis_arguments("passing"))
+        failing = self.start_client(self.analysis_arguments("failing"))
+
+        passing_exit_code, passing_output = self.finish(passing)
+        failing_exit_code, failing_output = self.finish(failing)
+
+        # Each client gets the output and exit code of its own run
+        self.assertEqual(passing_exit_code, 0, passing_output)
+        self.assertIn("Analysis Completed Successfully", passing_output)
+        self.assertNotIn("Violations reported", passing_output)
+
+        self.assertEqual(failing_exit_code, 1, failing_output)
+        self.assertIn("FAILURE: Violations reported.", failing_output)
+        self.assertNotIn("Analysis Completed Successfully", failing_output)
+
+        report_urls = [
+            [line for line in output.splitlines() if "ReportUrl: " in line] for output in (passing_output, failing_output)
+        ]
+        self.assertEqual([len(urls) for urls in report_urls], [1, 1])
+        self.assertNotEqual(report_urls[0][0].split("ReportUrl: ")[1], report_urls[1][0].split("ReportUrl: ")[1])
+
+        # One run did not wait for the other: both analyses were started before either finished
+        started_at = sorted(self.state.analysis_started_at.values())
+        self.assertEqual(len(started_at), 2)
+        self.assertLess(started_at[1] - started_at[0], DaemonServeTest.ANALYSIS_SECONDS)
+
+    def test_rescans_reuse_the_hashes_of_earlier_runs(self):
+        self.start_daemon(rescan_interval=1)
+
+        exit_code, output = self.finish(self.start_client(["-scp", "./", "--dry-run"]))
+        self.assertEqual(exit_code, 0, output)
+
+        # The run hashed the manifest and sent its hash back to the daemon
+        rescanned = "Rescanned " + os.path.realpath(self.tree) + ": 1 manifests, 0 hashed, 1 unchanged"
+
+        for attempt in range(50):
+            if rescanned in self.read_daemon_log():
+                break
+            time.sleep(0.1)
+
+        self.assertIn(rescanned, self.read_daemon_log())
+
+
+if __name__ == "__main__":
+    unittest.main()
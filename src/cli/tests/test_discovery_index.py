@@ -0,0 +1,88 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from packageaware import PackageAware, PackageAwareDiscoveryIndex  # noqa: E402
+
+
+class DiscoveryIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.workspace = tempfile.mkdtemp()
+
+        self.write("requirements.txt")
+        self.write("app/package.json")
+        self.write("app/web/Web.csproj")
+        self.write("lib/Gemfile")
+
+        self.package_aware = PackageAware()
+        self.package_aware.context.source_code_path = self.root
+
+        # Everything written by the test is older than the scan, so it may be indexed
+        self.age_tree()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        shutil.rmtree(self.workspace)
+
+    def write(self, relative_path):
+        path = os.path.join(self.root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as the_file:
+            the_file.write("content\n")
+
+    def age_tree(self):
+        past = time.time() - 60
+        for base, dirs, files in os.walk(self.root):
+            os.utime(base, (past, past))
+
+    def find(self, use_index=True):
+        if use_index:
+            self.package_aware.discovery_index = PackageAwareDiscoveryIndex(
+                os.path.join(self.workspace, PackageAwareDiscoveryIndex.INDEX_FILE_NAME)
+            )
+            self.package_aware.discovery_index.load()
+        else:
+            self.package_aware.discovery_index = None
+
+        return self.package_aware.find_manifest_files()
+
+    def test_unchanged_tree_is_not_listed_again(self):
+        first = self.find()
+        second = self.find()
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.package_aware.discovery_index.scanned_count, 0)
+        self.assertEqual(self.package_aware.discovery_index.reused_count, 4)
+
+    def test_changed_directories_match_a_full_walk(self):
+        self.find()
+
+        self.write("app/web/packages.config")
+        self.write("app/web/Api.csproj")
+        self.write("tools/pom.xml")
+        os.remove(os.path.join(self.root, "lib", "Gemfile"))
+        self.age_tree()
+
+        indexed = self.find()
+
+        self.assertEqual(indexed, self.find(use_index=False))
+        self.assertIn(os.path.join(self.root, "tools", "pom.xml"), [m['path'] for m in indexed])
+
+    def test_recently_changed_directories_are_not_indexed(self):
+        self.write("app/new/pom.xml")
+
+        self.find()
+        self.find()
+
+        self.assertEqual(self.package_aware.discovery_index.scanned_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
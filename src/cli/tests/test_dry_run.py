@@ -0,0 +1,66 @@
+import hashlib
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+CLI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+sys.path.insert(0, CLI_DIR)
+
+from packageaware import PackageAware  # noqa: E402
+
+
+class DryRunTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+        self.write("requirements.txt", "requests==2.24.0\n")
+        self.write("app/package.json", "{}")
+        self.write("app/Gemfile", "  \n")
+
+        self.package_aware = PackageAware()
+        self.package_aware.context.source_code_path = self.root
+
+        self.log_stream = io.StringIO()
+        self.addCleanup(setattr, PackageAware.LOG, "stream", PackageAware.LOG.stream)
+        PackageAware.LOG.stream = self.log_stream
+
+    def write(self, relative_path, content):
+        path = os.path.join(self.root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as the_file:
+            the_file.write(content)
+
+    def test_lists_size_and_hash_without_a_client(self):
+        self.assertEqual(self.package_aware.list_manifests(), 0)
+        PackageAware.LOG.flush()
+
+        output = self.log_stream.getvalue()
+
+        self.assertIsNone(self.package_aware.client)
+        self.assertIn(
+            hashlib.sha256(b"requests==2.24.0\n").hexdigest() + "         17 Python " +
+            os.path.join(self.root, "requirements.txt"),
+            output
+        )
+        self.assertIn("Manifest file is empty and would not be uploaded: " + os.path.join(self.root, "app", "Gemfile"),
+                      output)
+        self.assertIn("Dry run: 2 manifests (19 bytes) would be uploaded. Nothing was sent.", output)
+
+    def test_http_libraries_are_not_imported_at_start_up(self):
+        imported = subprocess.run(
+            [sys.executable, "-c", "import sys, packageaware; print('requests' in sys.modules, 'aiohttp' in sys.modules)"],
+            cwd=CLI_DIR, stdout=subprocess.PIPE
+        ).stdout.decode("utf-8").strip()
+
+        self.assertEqual(imported, "False False")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,209 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from packageaware import PackageAware, PackageAwareExclusions  # noqa: E402
+
+
+class FindManifestFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+        self.write("requirements.txt")
+        self.write("app/package.json")
+        self.write("app/Web.csproj")
+        self.write("app/notes.txt")
+        self.write("bin/start/pom.xml")
+        self.write("bin/start/nested/Gemfile")
+        self.write("lib/Gemfile")
+        self.write(".hidden/package.json")
+        self.write("app/.cache/requirements.txt")
+
+        self.package_aware = PackageAware()
+        self.package_aware.context.source_code_path = self.root
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, relative_path):
+        path = os.path.join(self.root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as the_file:
+            the_file.write("content\n")
+
+    def path(self, relative_path):
+        return os.path.join(self.root, relative_path)
+
+    def write_ignore_file(self, relative_path, lines):
+        with open(self.path(relative_path), "w") as the_file:
+            the_file.write("\n".join(lines) + "\n")
+
+    def find(self, dirs_to_exclude=None, files_to_exclude=None):
+        return [
+            (os.path.relpath(m['path'], self.root), m['package_manager'], m['manifest_name'])
+            for m in self.package_aware.find_manifest_files(dirs_to_exclude, files_to_exclude)
+        ]
+
+    def test_finds_every_manifest_type_in_one_walk(self):
+        self.assertEqual(self.find(), [
+            (os.path.join("bin", "start", "nested", "Gemfile"), "Ruby", "Gemfile"),
+            (os.path.join("lib", "Gemfile"), "Ruby", "Gemfile"),
+            ("requirements.txt", "Python", "requirements.txt"),
+            (os.path.join("app", "package.json"), "NPM", "package.json"),
+            (os.path.join("bin", "start", "pom.xml"), "Java", "pom.xml"),
+            (os.path.join("app", "Web.csproj"), "NuGet", "*.csproj"),
+        ])
+
+    def test_excluded_directory_prunes_everything_below_it(self):
+        found = [m[0] for m in self.find(dirs_to_exclude=[self.path("bin") + os.sep])]
+
+        self.assertNotIn(os.path.join("bin", "start", "pom.xml"), found)
+        self.assertNotIn(os.path.join("bin", "start", "nested", "Gemfile"), found)
+        self.assertIn(os.path.join("lib", "Gemfile"), found)
+
+    def test_excluded_file_is_skipped(self):
+        found = [m[0] for m in self.find(files_to_exclude=[self.path("app/package.json")])]
+
+        self.assertNotIn(os.path.join("app", "package.json"), found)
+        self.assertIn(os.path.join("app", "Web.csproj"), found)
+
+    def test_glob_excludes_directories_at_any_depth(self):
+        found = [m[0] for m in self.find(dirs_to_exclude=[self.path("**/start")])]
+
+        self.assertNotIn(os.path.join("bin", "start", "pom.xml"), found)
+        self.assertNotIn(os.path.join("bin", "start", "nested", "Gemfile"), found)
+        self.assertIn(os.path.join("lib", "Gemfile"), found)
+
+    def test_single_star_stays_within_one_directory(self):
+        found = [m[0] for m in self.find(dirs_to_exclude=[self.path("*/nested")])]
+
+        self.assertIn(os.path.join("bin", "start", "nested", "Gemfile"), found)
+
+    def test_glob_excludes_files(self):
+        found = [m[0] for m in self.find(files_to_exclude=[self.path("**/Gemfile")])]
+
+        self.assertNotIn(os.path.join("lib", "Gemfile"), found)
+        self.assertNotIn(os.path.join("bin", "start", "nested", "Gemfile"), found)
+        self.assertIn("requirements.txt", found)
+
+    def test_ignore_files_are_only_read_when_enabled(self):
+        self.write_ignore_file(".gitignore", ["bin/"])
+
+        self.assertIn(os.path.join("bin", "start", "pom.xml"), [m[0] for m in self.find()])
+
+        self.package_aware.script.ignore_files_enabled = True
+
+        self.assertNotIn(os.path.join("bin", "start", "pom.xml"), [m[0] for m in self.find()])
+
+    def test_ignore_file_rules(self):
+        self.package_aware.script.ignore_files_enabled = True
+
+        # A name without a slash matches at any depth, ! includes a path again
+        self.write_ignore_file(".gitignore", ["Gemfile", "!lib/Gemfile", "# comment", "*.csproj"])
+        # Rules in a deeper directory apply relative to it and win over those above
+        self.write_ignore_file("app/.packageawareignore", ["/package.json", "!Web.csproj"])
+
+        found = [m[0] for m in self.find()]
+
+        self.assertNotIn(os.path.join("bin", "start", "nested", "Gemfile"), found)
+        self.assertIn(os.path.join("lib", "Gemfile"), found)
+        self.assertNotIn(os.path.join("app", "package.json"), found)
+        self.assertIn(os.path.join("app", "Web.csproj"), found)
+        self.assertIn("requirements.txt", found)
+
+    def test_directory_only_rule_does_not_match_files(self):
+        self.package_aware.script.ignore_files_enabled = True
+        self.write_ignore_file(".gitignore", ["requirements.txt/", "start/"])
+
+        found = [m[0] for m in self.find()]
+
+        self.assertIn("requirements.txt", found)
+        self.assertNotIn(os.path.join("bin", "start", "pom.xml"), found)
+
+    def test_hidden_directories_are_not_searched(self):
+        found = [m[0] for m in self.find()]
+
+        self.assertNotIn(os.path.join(".hidden", "package.json"), found)
+        self.assertNotIn(os.path.join("app", ".cache", "requirements.txt"), found)
+
+    @unittest.skipIf(not hasattr(os, "symlink"), "symlinks not supported")
+    def test_directory_symlinks_are_followed_once(self):
+        outside = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, outside)
+        with open(os.path.join(outside, "requirements.txt"), "w") as the_file:
+            the_file.write("content\n")
+
+        os.symlink(outside, self.path("app/link"))
+        os.symlink(self.root, self.path("lib/loop"))
+
+        found = [m[0] for m in self.find()]
+
+        self.assertIn(os.path.join("app", "link", "requirements.txt"), found)
+        self.assertEqual(len(found), len(set(found)))
+        self.assertFalse(any(p.startswith(os.path.join("lib", "loop")) for p in found))
+
+    @unittest.skipIf(not hasattr(os, "symlink"), "symlinks not supported")
+    def test_parallel_walk_matches_the_serial_walk(self):
+        for number in range(20):
+            self.write("services/service_" + str(number) + "/requirements.txt")
+            self.write("services/service_" + str(number) + "/deep/package.json")
+        os.symlink(self.path("services/service_3"), self.path("app/service_link"))
+        self.write_ignore_file(".gitignore", ["service_1*/"])
+        self.package_aware.script.ignore_files_enabled = True
+
+        serial_found = self.find(dirs_to_exclude=[self.path("**/service_2")])
+
+        self.package_aware.discovery_workers = 8
+
+        self.assertEqual(self.find(dirs_to_exclude=[self.path("**/service_2")]), serial_found)
+        self.assertNotIn(os.path.join("services", "service_12", "requirements.txt"), [m[0] for m in serial_found])
+
+
+class GlobCharactersInRootTest(unittest.TestCase):
+
+    # -dte / -fte entries are joined with the directory the script runs from
+    def setUp(self):
+        self.root = tempfile.mkdtemp(suffix="[v1]*" if os.name == "posix" else "[v1]")
+        self.addCleanup(shutil.rmtree, self.root)
+
+        for relative_path in ("app/package.json", "bin/pom.xml", "lib/Gemfile", "v/Gemfile"):
+            path = os.path.join(self.root, relative_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as the_file:
+                the_file.write("content\n")
+
+        self.package_aware = PackageAware()
+        self.package_aware.context.source_code_path = self.root
+
+    def find(self, dirs_to_exclude=None, files_to_exclude=None):
+        code_root = self.root + os.sep
+
+        return sorted(
+            os.path.relpath(m['path'], self.root) for m in self.package_aware.find_manifest_files(
+                [PackageAwareExclusions.under_root(code_root, a_dir) for a_dir in (dirs_to_exclude or [])],
+                [PackageAwareExclusions.under_root(code_root, a_file) for a_file in (files_to_exclude or [])]
+            )
+        )
+
+    def test_exact_paths_are_excluded(self):
+        self.assertEqual(
+            self.find(dirs_to_exclude=["bin"], files_to_exclude=[os.path.join("app", "package.json")]),
+            [os.path.join("lib", "Gemfile"), os.path.join("v", "Gemfile")]
+        )
+
+    def test_only_the_entry_is_a_pattern(self):
+        self.assertEqual(self.find(files_to_exclude=["*/Gemfile"]), [
+            os.path.join("app", "package.json"), os.path.join("bin", "pom.xml")
+        ])
+        self.assertEqual(self.find(dirs_to_exclude=["[lv]*"]), [
+            os.path.join("app", "package.json"), os.path.join("bin", "pom.xml")
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
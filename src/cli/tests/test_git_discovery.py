@@ -0,0 +1,114 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from packageaware import PackageAware, PackageAwareDiscoveryBackend  # noqa: E402
+
+
+@unittest.skipIf(shutil.which("git") is None, "git is not installed")
+class GitDiscoveryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+        self.git("init", "-q")
+        self.write("requirements.txt")
+        self.write("app/package.json")
+        self.write("app/Web.csproj")
+        self.write("bin/start/pom.xml")
+        self.write("lib/Gemfile")
+        self.write(".hidden/package.json")
+        self.git("add", "-A")
+        self.git("commit", "-q", "-m", "baseline")
+
+        self.package_aware = PackageAware()
+        self.package_aware.context.source_code_path = self.root
+        self.package_aware.discovery_backend = PackageAwareDiscoveryBackend.GIT
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def git(self, *arguments):
+        subprocess.check_call(
+            ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", "-C", self.root] + list(arguments)
+        )
+
+    def write(self, relative_path, content="content\n"):
+        path = os.path.join(self.root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as the_file:
+            the_file.write(content)
+
+    def path(self, relative_path):
+        return os.path.join(self.root, relative_path)
+
+    def find(self, dirs_to_exclude=None, files_to_exclude=None):
+        return [
+            os.path.relpath(m['path'], self.root)
+            for m in self.package_aware.find_manifest_files(dirs_to_exclude, files_to_exclude)
+        ]
+
+    def test_matches_the_file_system_walk_on_a_clean_tree(self):
+        git_found = self.package_aware.find_manifest_files()
+
+        self.package_aware.discovery_backend = PackageAwareDiscoveryBackend.WALK
+        self.assertEqual(git_found, self.package_aware.find_manifest_files())
+
+    def test_case_insensitive_types_match_the_file_system_walk(self):
+        self.write("lib/Pipfile")
+        self.write("web/packages.config")
+        self.write("web/yarn.lock")
+        self.git("add", "-A")
+        self.git("commit", "-q", "-m", "lockfiles")
+
+        git_found = self.package_aware.find_manifest_files()
+
+        self.assertIn(self.path("lib/Pipfile"), [m['path'] for m in git_found])
+
+        self.package_aware.discovery_backend = PackageAwareDiscoveryBackend.WALK
+        self.assertEqual(git_found, self.package_aware.find_manifest_files())
+
+    def test_untracked_manifests_are_skipped(self):
+        self.write("build/out/package.json")
+
+        self.assertNotIn(os.path.join("build", "out", "package.json"), self.find())
+
+    def test_exclusions_apply_to_tracked_manifests(self):
+        found = self.find(
+            dirs_to_exclude=[self.path("bin") + os.sep],
+            files_to_exclude=[self.path("lib/Gemfile")]
+        )
+
+        self.assertEqual(found, [
+            "requirements.txt",
+            os.path.join("app", "package.json"),
+            os.path.join("app", "Web.csproj"),
+        ])
+
+    def test_changed_since_keeps_only_changed_manifests(self):
+        self.write("app/package.json", "changed\n")
+        self.write("lib/Gemfile", "changed\n")
+        self.git("add", "lib/Gemfile")
+        self.git("commit", "-q", "-m", "gemfile")
+
+        self.package_aware.changed_since = "HEAD~1"
+
+        self.assertEqual(self.find(), [
+            os.path.join("lib", "Gemfile"),
+            os.path.join("app", "package.json"),
+        ])
+
+    def test_falls_back_to_the_walk_outside_a_work_tree(self):
+        shutil.rmtree(self.path(".git"))
+        self.write("build/out/package.json")
+
+        self.assertIn(os.path.join("build", "out", "package.json"), self.find())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import io
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from packageaware import PackageAwareLog  # noqa: E402
+
+
+class LogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.log = PackageAwareLog()
+        self.log.stream = io.StringIO()
+        # The background flush thread is not needed here
+        self.log.flush_thread = object()
+
+    def lines(self):
+        return self.log.stream.getvalue().splitlines()
+
+    def test_lines_are_buffered_until_flushed(self):
+        self.log.log("Found manifest file: ./package.json", event="manifest_found")
+
+        self.assertEqual(self.lines(), [])
+
+        self.log.flush()
+
+        self.assertEqual(len(self.lines()), 1)
+        self.assertTrue(self.lines()[0].endswith(" PACKAGE AWARE: Found manifest file: ./package.json"))
+
+    def test_warnings_are_written_at_once(self):
+        self.log.log("Analysis Id: 1")
+        self.log.log("WARNING: Manifest file is empty: ./Gemfile", PackageAwareLog.WARNING)
+
+        self.assertEqual(len(self.lines()), 2)
+
+    def test_level_filter(self):
+        self.log.configure(level=PackageAwareLog.WARNING)
+
+        self.log.log("Analysis Id: 1")
+        self.log.log("An error occurred", PackageAwareLog.ERROR)
+
+        self.assertEqual(len(self.lines()), 1)
+
+    def test_summary_mode_counts_per_file_events(self):
+        self.log.configure(summarize_events=True)
+
+        for name in ("a", "b", "c"):
+            self.log.log("Found manifest file: ./" + name, event="manifest_found")
+        self.log.log("Skipping directory due to dirs_to_exclude: ./skip", event="directory_excluded")
+        self.log.log("WARNING: Manifest file is empty: ./Gemfile", PackageAwareLog.WARNING, event="manifest_empty")
+        self.log.log("Analysis Id: 1")
+
+        self.log.close()
+
+        lines = self.lines()
+
+        self.assertEqual(len(lines), 3)
+        self.assertIn("WARNING: Manifest file is empty: ./Gemfile", lines[0])
+        self.assertIn("Analysis Id: 1", lines[1])
+        self.assertTrue(lines[2].endswith(
+            "Summary: 3 manifests found, 1 directories excluded, 1 empty manifests"
+        ))
+
+    def test_json_lines(self):
+        self.log.configure(log_format=PackageAwareLog.FORMAT_JSONL)
+
+        self.log.log("Found manifest file: ./package.json", event="manifest_found")
+        self.log.flush()
+
+        line = json.loads(self.lines()[0])
+
+        self.assertEqual(line["level"], "info")
+        self.assertEqual(line["event"], "manifest_found")
+        self.assertEqual(line["message"], "Found manifest file: ./package.json")
+        self.assertTrue(line["time"].endswith("Z"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from packageaware import PackageAware, PackageAwareApiClient, PackageAwareManifestAPI  # noqa: E402
+
+
+class ManifestContentTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, name, content):
+        path = os.path.join(self.root, name)
+        with open(path, "wb") as the_file:
+            the_file.write(content)
+        return path
+
+    def test_empty_and_whitespace_only_files_are_skipped(self):
+        self.assertIsNone(PackageAware.read_manifest(self.write("Gemfile", b"")))
+        self.assertIsNone(PackageAware.read_manifest(self.write("pom.xml", b" \r\n\t\n")))
+
+    def test_bytes_are_uploaded_and_hashed_as_they_are_on_disk(self):
+        raw = b"\xef\xbb\xbfrequests==2.24.0\r\ncaf\xe9\r\n"
+
+        content = PackageAware.read_manifest(self.write("requirements.txt", raw))
+
+        try:
+            self.assertEqual(bytes(content.body), raw)
+            self.assertEqual(content.sha256(), hashlib.sha256(raw).hexdigest())
+
+            client = PackageAwareApiClient(PackageAware().context)
+            manifest_label, body, headers, content_encoding = PackageAwareManifestAPI.prepare_request(
+                client, "requirements.txt", content.body, None, None
+            )
+            client.close()
+
+            self.assertEqual(bytes(body), raw)
+            self.assertIsNone(content_encoding)
+        finally:
+            content.close()
+
+        self.assertEqual(content.body, b"")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from packageaware import PackageAwareManifestDedup, PackageAwareUploadCache  # noqa: E402
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class ManifestDedupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def manifest(self, relative_path, manifest_name, content):
+        path = os.path.join(self.root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as the_file:
+            the_file.write(content)
+        return {'path': path, 'package_manager': 'Python', 'manifest_name': manifest_name}
+
+    def result(self, manifest_file, response, cached=False):
+        return {'path': manifest_file['path'], 'response': response, 'empty': False, 'error': None,
+                'cached': cached, 'size': 11}
+
+    def test_plan_groups_manifests_by_content(self):
+        first = self.manifest("a/requirements.txt", "requirements.txt", "flask==1.0\n")
+        copy = self.manifest("b/requirements.txt", "requirements.txt", "flask==1.0\n")
+        renamed = self.manifest("c/pipfile", "pipfile", "flask==1.0\n")
+        other = self.manifest("d/requirements.txt", "requirements.txt", "django==3.0\n")
+        empty = self.manifest("e/requirements.txt", "requirements.txt", "\n")
+
+        dedup = PackageAwareManifestDedup.plan([first, copy, renamed, other, empty])
+
+        self.assertEqual(dedup.uploads, [first, other, empty])
+        self.assertEqual(dedup.duplicates, [copy])
+        self.assertEqual(dedup.references, [renamed])
+        self.assertEqual(dedup.first_paths[copy['path']], first['path'])
+        self.assertEqual(first['size'], 11)
+
+    def test_copies_under_another_name_reference_the_first_upload(self):
+        first = self.manifest("a/requirements.txt", "requirements.txt", "flask==1.0\n")
+        renamed = self.manifest("c/pipfile", "pipfile", "flask==1.0\n")
+
+        dedup = PackageAwareManifestDedup.plan([first, renamed])
+
+        results_by_path = {first['path']: self.result(
+            first, FakeResponse(200, {PackageAwareUploadCache.MANIFEST_REF_HEADER: "ref-1"})
+        )}
+
+        referenced = dedup.with_reference(renamed, results_by_path)
+
+        self.assertEqual(referenced['manifest_ref'], "ref-1")
+        self.assertEqual(referenced['same_as'], first['path'])
+
+    def test_without_a_server_reference_the_copy_is_uploaded_in_full(self):
+        first = self.manifest("a/requirements.txt", "requirements.txt", "flask==1.0\n")
+        renamed = self.manifest("c/pipfile", "pipfile", "flask==1.0\n")
+
+        dedup = PackageAwareManifestDedup.plan([first, renamed])
+
+        self.assertIs(dedup.with_reference(renamed, {first['path']: self.result(first, FakeResponse(200))}), renamed)
+        self.assertIs(dedup.with_reference(renamed, {first['path']: self.result(first, FakeResponse(500))}), renamed)
+
+    def test_identical_copies_share_the_first_result_and_count_as_saved(self):
+        first = self.manifest("a/requirements.txt", "requirements.txt", "flask==1.0\n")
+        copy = self.manifest("b/requirements.txt", "requirements.txt", "flask==1.0\n")
+
+        dedup = PackageAwareManifestDedup.plan([first, copy])
+
+        first_result = self.result(first, FakeResponse(200))
+        copy_result = dedup.duplicate_result(copy, {first['path']: first_result})
+
+        dedup.record(first_result)
+        dedup.record(copy_result)
+
+        self.assertEqual(copy_result['path'], copy['path'])
+        self.assertIs(copy_result['response'], first_result['response'])
+        self.assertTrue(copy_result['duplicate'])
+        self.assertEqual((dedup.saved_uploads, dedup.saved_bytes), (1, 11))
+
+
+if __name__ == "__main__":
+    unittest.main()
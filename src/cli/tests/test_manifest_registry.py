@@ -0,0 +1,70 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from packageaware import PackageAware, PackageAwareManifestRegistry  # noqa: E402
+
+
+class ManifestRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = PackageAwareManifestRegistry([
+            {'file_pattern': 'Gemfile', 'package_manager': 'Ruby'},
+            {'file_pattern': 'pipfile', 'package_manager': 'Python', 'case_sensitive': False},
+            {'file_pattern': '*.csproj', 'package_manager': 'NuGet', 'case_sensitive': False},
+            {'file_pattern': '*.gradle', 'package_manager': 'Java'}
+        ])
+
+    def pattern(self, file_name):
+        manifest_type = self.registry.match(file_name)
+        return manifest_type['file_pattern'] if manifest_type is not None else None
+
+    def test_exact_names(self):
+        self.assertEqual(self.pattern("Gemfile"), "Gemfile")
+        self.assertIsNone(self.pattern("Gemfile.lock"))
+
+    @unittest.skipIf(os.path.normcase("A") == "a", "every name matches case-insensitively here")
+    def test_case_sensitive_names_only_match_their_spelling(self):
+        self.assertIsNone(self.pattern("gemfile"))
+        self.assertIsNone(self.pattern("settings.GRADLE"))
+
+    def test_case_insensitive_names_match_any_spelling(self):
+        self.assertEqual(self.pattern("Pipfile"), "pipfile")
+        self.assertEqual(self.pattern("PIPFILE"), "pipfile")
+        self.assertEqual(self.pattern("Web.CSProj"), "*.csproj")
+
+    def test_wildcards_resolve_to_their_own_type(self):
+        self.assertEqual(self.pattern("Web.csproj"), "*.csproj")
+        self.assertEqual(self.pattern("build.gradle"), "*.gradle")
+        self.assertIsNone(self.pattern("Web.csproj.user"))
+
+    def test_registering_a_type_changes_the_fingerprint(self):
+        fingerprint = self.registry.fingerprint()
+
+        self.registry.register({'file_pattern': 'go.mod', 'package_manager': 'Go'})
+
+        self.assertEqual(self.pattern("go.mod"), "go.mod")
+        self.assertNotEqual(self.registry.fingerprint(), fingerprint)
+
+    def test_results_are_grouped_by_registration_order(self):
+        manifest_files = [
+            {'path': "b/x.csproj", 'manifest_name': "*.csproj"},
+            {'path': "a/Gemfile", 'manifest_name': "Gemfile"},
+            {'path': "a/x.csproj", 'manifest_name': "*.csproj"}
+        ]
+
+        self.assertEqual(
+            [m['path'] for m in sorted(manifest_files, key=self.registry.sort_key())],
+            ["a/Gemfile", "a/x.csproj", "b/x.csproj"]
+        )
+
+    def test_lockfiles_are_registered(self):
+        for file_name in ["yarn.lock", "package-lock.json", "Pipfile.lock", "poetry.lock", "go.mod", "Cargo.lock",
+                          "build.gradle"]:
+            self.assertIsNotNone(PackageAware.match_manifest_file(file_name), file_name)
+
+
+if __name__ == "__main__":
+    unittest.main()
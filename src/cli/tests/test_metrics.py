@@ -0,0 +1,86 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from packageaware import PackageAwareMetrics, PackageAwareRetryPolicy  # noqa: E402
+
+
+class FakeResponse:
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+
+
+class MetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.metrics = PackageAwareMetrics()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_retry_policy_counts_attempts_retries_and_status_codes(self):
+        policy = PackageAwareRetryPolicy(max_attempts=3, metrics=self.metrics)
+        responses = [FakeResponse(503), FakeResponse(200)]
+
+        with mock.patch("time.sleep"):
+            policy.run("Manifest", lambda: responses.pop(0))
+
+        manifest_metrics = self.metrics.summary()["apis"]["Manifest"]
+
+        self.assertEqual(manifest_metrics["calls"], 1)
+        self.assertEqual(manifest_metrics["attempts"], 2)
+        self.assertEqual(manifest_metrics["retries"], 1)
+        self.assertEqual(manifest_metrics["status_codes"], {"503": 1, "200": 1})
+
+    def test_manifest_outcomes_and_bytes(self):
+        self.metrics.record_manifest({'empty': True, 'error': None, 'response': None, 'cached': False})
+        self.metrics.record_manifest(
+            {'empty': False, 'error': None, 'response': FakeResponse(200), 'cached': True, 'size': 10}
+        )
+        self.metrics.record_manifest(
+            {'empty': False, 'error': None, 'response': FakeResponse(500), 'cached': False, 'size': 5}
+        )
+
+        summary = self.metrics.summary()
+
+        self.assertEqual(summary["manifests"], {"found": 3, "uploaded": 0, "referenced": 1, "deduplicated": 0, "empty": 1, "failed": 1})
+        self.assertEqual(summary["bytes"]["manifest_read"], 15)
+
+    def test_phases_accumulate(self):
+        with mock.patch("time.perf_counter", side_effect=[1.0, 3.0, 10.0, 10.5]):
+            with self.metrics.phase("upload"):
+                pass
+            with self.metrics.phase("upload"):
+                pass
+
+        self.assertEqual(self.metrics.summary()["phases"], {"upload": 2.5})
+
+    def test_exports_json_and_prometheus_textfile(self):
+        self.metrics.record_phase("discovery", 0.5)
+
+        self.metrics.export(self.root, PackageAwareMetrics.FORMAT_ALL, 'web "app"', 1)
+
+        with open(os.path.join(self.root, PackageAwareMetrics.JSON_FILE_NAME)) as the_file:
+            summary = json.loads(the_file.read())
+
+        self.assertEqual(summary["exit_code"], 1)
+        self.assertEqual(summary["phases"], {"discovery": 0.5})
+
+        with open(os.path.join(self.root, PackageAwareMetrics.PROMETHEUS_FILE_NAME)) as the_file:
+            prometheus_text = the_file.read()
+
+        self.assertIn('packageaware_phase_seconds{project="web \\"app\\"",phase="discovery"} 0.5\n', prometheus_text)
+        self.assertIn('packageaware_exit_code{project="web \\"app\\""} 1.0\n', prometheus_text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from packageaware import PackageAwareApiClient, PackageAwareContext, PackageAwareRateLimiter  # noqa: E402
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = b""
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeSession:
+
+    def __init__(self, responses):
+        self.responses = responses
+
+    def request(self, method, url, data=None, headers=None):
+        return self.responses.pop(0)
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def limiter(self, **kwargs):
+        return PackageAwareRateLimiter(clock=self.clock, **kwargs)
+
+    def test_requests_beyond_the_burst_are_spaced_at_the_pace(self):
+        limiter = self.limiter(requests_per_second=2)
+
+        self.assertEqual([limiter.reserve() for request in range(4)], [0.0, 0.0, 0.5, 1.0])
+
+    def test_tokens_come_back_with_time(self):
+        limiter = self.limiter(requests_per_second=2)
+        limiter.reserve()
+        limiter.reserve()
+
+        self.clock.now += 0.5
+
+        self.assertEqual(limiter.reserve(), 0.0)
+        self.assertEqual(limiter.reserve(), 0.5)
+
+    def test_no_pace_means_no_wait(self):
+        limiter = self.limiter(max_in_flight=2)
+
+        self.assertEqual([limiter.reserve() for request in range(100)], [0.0] * 100)
+
+    def test_headers_are_ignored_unless_adaptive(self):
+        limiter = self.limiter(requests_per_second=10)
+
+        limiter.observe(FakeResponse(429, {"Retry-After": "30"}))
+
+        self.assertEqual(limiter.reserve(), 0.0)
+        self.assertEqual(limiter.requests_per_second, 10)
+
+    def test_the_quota_left_is_spread_until_its_reset(self):
+        limiter = self.limiter(adaptive=True)
+
+        limiter.observe(FakeResponse(200, {"X-RateLimit-Remaining": "10", "X-RateLimit-Reset": "5"}))
+
+        self.assertEqual(limiter.requests_per_second, 2.0)
+
+    def test_adaptive_pace_never_exceeds_the_configured_one(self):
+        limiter = self.limiter(requests_per_second=1, adaptive=True)
+
+        limiter.observe(FakeResponse(200, {"RateLimit-Remaining": "100", "RateLimit-Reset": "5"}))
+
+        self.assertEqual(limiter.requests_per_second, 1)
+
+    def test_a_used_up_quota_holds_every_request_until_its_reset(self):
+        limiter = self.limiter(adaptive=True)
+
+        limiter.observe(FakeResponse(200, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "4"}))
+
+        self.assertEqual(limiter.reserve(), 4.0)
+        self.assertEqual(limiter.reserve(), 4.0)
+
+    def test_retry_after_holds_every_request(self):
+        limiter = self.limiter(adaptive=True)
+
+        limiter.observe(FakeResponse(429, {"Retry-After": "3"}))
+        self.clock.now += 1
+
+        self.assertEqual(limiter.reserve(), 2.0)
+
+    def test_a_429_without_quota_halves_the_pace_and_successes_win_it_back(self):
+        limiter = self.limiter(requests_per_second=4, adaptive=True)
+
+        limiter.observe(FakeResponse(429))
+        self.assertEqual(limiter.requests_per_second, 2)
+
+        for response in range(10):
+            limiter.observe(FakeResponse(200))
+
+        self.assertEqual(limiter.requests_per_second, 4)
+
+    def test_in_flight_requests_are_capped(self):
+        limiter = self.limiter(max_in_flight=2)
+
+        in_flight = []
+        peak = []
+
+        async def send():
+            await limiter.async_acquire()
+            in_flight.append(1)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.pop()
+            limiter.async_release()
+
+        async def send_all():
+            await asyncio.gather(*[send() for request in range(6)])
+
+        asyncio.run(send_all())
+
+        self.assertEqual(max(peak), 2)
+
+    def test_client_requests_pass_through_the_limiter(self):
+        context = PackageAwareContext()
+        context.api_key = "key"
+
+        limiter = self.limiter(adaptive=True)
+        client = PackageAwareApiClient(
+            context,
+            session=FakeSession([FakeResponse(200, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "7"})]),
+            rate_limiter=limiter
+        )
+
+        client.request("GET", "https://api.example/")
+
+        self.assertEqual(limiter.reserve(), 7.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
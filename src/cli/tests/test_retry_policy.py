@@ -0,0 +1,80 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from packageaware import PackageAwareRetryPolicy  # noqa: E402
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class RetryPolicyTest(unittest.TestCase):
+
+    def policy(self, **kwargs):
+        kwargs.setdefault("base_delay", 0)
+        return PackageAwareRetryPolicy(**kwargs)
+
+    def run_with(self, policy, outcomes):
+        calls = []
+
+        def send_request():
+            outcome = outcomes[len(calls)]
+            calls.append(outcome)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        return policy.run("Test", send_request), len(calls)
+
+    def test_success_is_not_retried(self):
+        response, calls = self.run_with(self.policy(), [FakeResponse(200)])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(calls, 1)
+
+    def test_retryable_status_and_exceptions_are_retried(self):
+        response, calls = self.run_with(self.policy(), [FakeResponse(503), IOError("reset"), FakeResponse(201)])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(calls, 3)
+
+    def test_client_errors_are_not_retried(self):
+        response, calls = self.run_with(self.policy(), [FakeResponse(404)])
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(calls, 1)
+
+    def test_last_retryable_response_is_returned_when_attempts_run_out(self):
+        response, calls = self.run_with(self.policy(max_attempts=2), [FakeResponse(429), FakeResponse(429)])
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(calls, 2)
+
+    def test_retry_after_is_honored(self):
+        policy = self.policy()
+
+        self.assertEqual(policy.next_delay(0, FakeResponse(503, {"Retry-After": "7"})), 7.0)
+
+    def test_http_date_retry_after_in_the_past_means_no_wait(self):
+        self.assertEqual(PackageAwareRetryPolicy.parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)
+
+    def test_backoff_grows_exponentially_and_is_capped(self):
+        policy = PackageAwareRetryPolicy(max_attempts=20, retry_budget=10000, base_delay=1, max_delay=5)
+
+        for attempt in range(0, 10):
+            self.assertLessEqual(policy.next_delay(attempt), min(5, 2 ** attempt))
+
+    def test_exhausted_budget_stops_retries(self):
+        policy = self.policy(retry_budget=5)
+
+        self.assertIsNone(policy.next_delay(0, FakeResponse(503, {"Retry-After": "10"})))
+
+
+if __name__ == "__main__":
+    unittest.main()
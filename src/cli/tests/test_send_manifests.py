@@ -0,0 +1,163 @@
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from packageaware import (  # noqa: E402
+    PackageAware, PackageAwareApiClient, PackageAwareModeOfOperation, PackageAwareOnFailure, PackageAwareRetryPolicy
+)
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+
+class FakeSession:
+
+    # Answers the Structure, Manifest and Analysis Start APIs. Manifests whose content holds
+    # "fail" get a 500; every body sent is recorded
+    STRUCTURE = {
+        "Id": "an1", "projectId": "p1", "reportUrl": "http://report/an1", "embedUrl": "http://embed/an1",
+        "reportStatusUrl": "http://localhost/status/an1"
+    }
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.bodies = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.lock = threading.Lock()
+
+    def request(self, method, url, data=None, headers=None):
+
+        if url.endswith("/analysis/structure"):
+            return FakeResponse(201, json.dumps(FakeSession.STRUCTURE).encode("utf-8"))
+
+        if "/manifests/" not in url:
+            return FakeResponse(200)
+
+        body = bytes(data)
+
+        with self.lock:
+            self.bodies.append(body)
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+        time.sleep(self.delay)
+
+        with self.lock:
+            self.in_flight -= 1
+
+        return FakeResponse(500 if b"fail" in body else 200)
+
+
+class SendManifestsTest(unittest.TestCase):
+
+    MANIFESTS = 12
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+        for number in range(SendManifestsTest.MANIFESTS):
+            self.write(os.path.join("service_" + str(number), "requirements.txt"), "package-" + str(number) + "\n")
+
+        self.output = io.StringIO()
+        self.addCleanup(setattr, PackageAware.LOG, "stream", PackageAware.LOG.stream)
+        PackageAware.LOG.redirect(self.output)
+
+    def write(self, relative_path, content):
+        path = os.path.join(self.root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as the_file:
+            the_file.write(content)
+
+    def package_aware(self, session, on_failure=PackageAwareOnFailure.FAIL_THE_BUILD):
+
+        package_aware = PackageAware()
+
+        package_aware.context.base_uri = "http://localhost/"
+        package_aware.context.client_id = "client"
+        package_aware.context.project_name = "project"
+        package_aware.context.api_key = "key"
+        package_aware.context.source_code_path = self.root
+
+        package_aware.script.mode = PackageAwareModeOfOperation.ASYNC_INIT
+        package_aware.script.on_failure = on_failure
+        package_aware.script.dedup_enabled = False
+        package_aware.script.upload_workers = 4
+        package_aware.script.async_result_file = os.path.join(self.root, "workspace", "async.json")
+
+        package_aware.client = PackageAwareApiClient(
+            package_aware.context, session=session, retry_policy=PackageAwareRetryPolicy(max_attempts=1)
+        )
+
+        return package_aware
+
+    def send(self, session, upload_workers):
+        package_aware = self.package_aware(session)
+
+        sent_count = package_aware.send_manifests("p1", "an1", None, None, upload_workers)
+
+        return sent_count, package_aware.upload_failures, package_aware.metrics.summary()["manifests"]
+
+    def test_every_manifest_is_uploaded_once_with_workers(self):
+        session = FakeSession(delay=0.02)
+
+        sent_count, failures, manifests = self.send(session, upload_workers=4)
+
+        self.assertEqual(sent_count, SendManifestsTest.MANIFESTS)
+        self.assertEqual(sorted(session.bodies), sorted(
+            ("package-" + str(number) + "\n").encode("utf-8") for number in range(SendManifestsTest.MANIFESTS)
+        ))
+        self.assertGreater(session.peak_in_flight, 1)
+        self.assertLessEqual(session.peak_in_flight, 4)
+
+    def test_a_failing_manifest_is_reported_and_the_others_upload(self):
+        self.write(os.path.join("service_3", "requirements.txt"), "fail\n")
+
+        sent_count, failures, manifests = self.send(FakeSession(), upload_workers=4)
+
+        self.assertEqual((sent_count, failures), (SendManifestsTest.MANIFESTS - 1, 1))
+        self.assertEqual((manifests["uploaded"], manifests["failed"]), (SendManifestsTest.MANIFESTS - 1, 1))
+        self.assertIn(
+            "Could not send manifest: " + os.path.join(self.root, "service_3", "requirements.txt") +
+            " due to Response Code 500",
+            self.output.getvalue()
+        )
+
+    def test_counts_match_the_serial_path(self):
+        self.write(os.path.join("service_3", "requirements.txt"), "fail\n")
+        self.write(os.path.join("service_7", "requirements.txt"), "fail too\n")
+
+        self.assertEqual(self.send(FakeSession(), upload_workers=1), self.send(FakeSession(), upload_workers=6))
+
+    def test_a_failed_upload_fails_the_run_as_on_failure_says(self):
+        self.write(os.path.join("service_3", "requirements.txt"), "fail\n")
+
+        session = FakeSession()
+
+        self.assertEqual(self.package_aware(session).run_analysis(), 1)
+        self.assertEqual(len(session.bodies), SendManifestsTest.MANIFESTS)
+
+        self.assertEqual(
+            self.package_aware(FakeSession(), on_failure=PackageAwareOnFailure.CONTINUE_ON_FAILURE).run_analysis(), 0
+        )
+
+    def test_a_run_without_failures_succeeds(self):
+        self.assertEqual(self.package_aware(FakeSession()).run_analysis(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
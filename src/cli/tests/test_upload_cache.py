@@ -0,0 +1,78 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from packageaware import PackageAwareContext, PackageAwareUploadCache  # noqa: E402
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class UploadCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workspace = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.workspace, "workspace", PackageAwareUploadCache.CACHE_FILE_NAME)
+
+        self.context = PackageAwareContext()
+        self.context.base_uri = "https://api.example/"
+        self.context.client_id = "client"
+        self.context.project_name = "project"
+
+    def tearDown(self):
+        shutil.rmtree(self.workspace)
+
+    def saved_cache(self, response, content_hash="hash-1"):
+        cache = PackageAwareUploadCache(self.cache_file, self.context)
+        cache.record("app/package.json", content_hash, "package.json", response)
+        cache.save()
+
+        reloaded = PackageAwareUploadCache(self.cache_file, self.context)
+        reloaded.load()
+        return reloaded
+
+    def test_unchanged_manifest_is_found_with_its_server_reference(self):
+        cache = self.saved_cache(FakeResponse(200, {PackageAwareUploadCache.MANIFEST_REF_HEADER: "ref-1"}))
+
+        entry = cache.lookup("app/package.json", "hash-1", "package.json")
+
+        self.assertEqual(entry["manifest_ref"], "ref-1")
+
+    def test_changed_content_invalidates_the_entry(self):
+        cache = self.saved_cache(FakeResponse(200))
+
+        self.assertIsNone(cache.lookup("app/package.json", "hash-2", "package.json"))
+
+    def test_failed_upload_is_not_cached(self):
+        cache = self.saved_cache(FakeResponse(500))
+
+        self.assertIsNone(cache.lookup("app/package.json", "hash-1", "package.json"))
+
+    def test_expired_entry_is_ignored(self):
+        cache = self.saved_cache(FakeResponse(200))
+        for entry in cache.previous_entries.values():
+            entry["uploaded_at"] = time.time() - PackageAwareUploadCache.ENTRY_MAX_AGE_SECONDS - 1
+
+        self.assertIsNone(cache.lookup("app/package.json", "hash-1", "package.json"))
+
+    def test_cache_of_another_project_is_ignored(self):
+        self.saved_cache(FakeResponse(200))
+
+        self.context.project_name = "another-project"
+        cache = PackageAwareUploadCache(self.cache_file, self.context)
+        cache.load()
+
+        self.assertIsNone(cache.lookup("app/package.json", "hash-1", "package.json"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,208 @@
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from packageaware import (  # noqa: E402
+    PackageAware, PackageAwareContext, PackageAwareManifestDedup, PackageAwareStructureAPIResponse,
+    PackageAwareUploadJournal
+)
+
+
+class FakeResponse:
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class UploadJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+        self.source = os.path.join(self.root, "source")
+        os.makedirs(os.path.join(self.source, "app"))
+        self.write("requirements.txt", "requests==2.24.0\n")
+        self.write("app/package.json", "{}")
+
+        self.journal_file = os.path.join(self.root, "workspace", PackageAwareUploadJournal.JOURNAL_FILE_NAME)
+
+        self.context = PackageAwareContext()
+        self.context.base_uri = "https://api.example/"
+        self.context.client_id = "client"
+        self.context.project_name = "project"
+        self.context.source_code_path = self.source
+
+    def write(self, relative_path, content):
+        with open(os.path.join(self.source, relative_path), "w") as the_file:
+            the_file.write(content)
+
+    def manifests(self):
+        return [
+            {'path': os.path.join(self.source, "requirements.txt"), 'manifest_name': 'requirements.txt'},
+            {'path': os.path.join(self.source, "app", "package.json"), 'manifest_name': 'package.json'}
+        ]
+
+    def interrupted_run(self, started=False):
+
+        # Uploads the first manifest and dies without finishing the journal
+        structure_response = PackageAwareStructureAPIResponse(None)
+        structure_response.structure_id = "analysis-1"
+        structure_response.analysis_id = "analysis-1"
+        structure_response.project_id = "project-1"
+        structure_response.report_url = "https://app.example/report/analysis-1"
+        structure_response.embed_url = None
+        structure_response.report_status_url = "https://api.example/status/analysis-1"
+
+        journal = PackageAwareUploadJournal(self.journal_file, self.context)
+        journal.begin(structure_response)
+
+        package_aware = PackageAware()
+        package_aware.upload_journal = journal
+
+        manifest_file = self.manifests()[0]
+        package_aware.journal_upload(manifest_file, "0" * 64, FakeResponse(500))
+        package_aware.journal_upload(
+            manifest_file, PackageAwareManifestDedup.hash_manifest(dict(manifest_file)), FakeResponse(200)
+        )
+
+        if started:
+            journal.record_started()
+
+        journal.the_file.close()
+
+    def rewrite_journal(self, change):
+
+        # Applies change to every journal entry
+        with open(self.journal_file) as the_file:
+            entries = [json.loads(line) for line in the_file]
+
+        for entry in entries:
+            change(entry)
+
+        with open(self.journal_file, "w") as the_file:
+            the_file.write("".join(json.dumps(entry) + "\n" for entry in entries))
+
+    def assert_discarded(self, reason):
+        output = io.StringIO()
+        self.addCleanup(setattr, PackageAware.LOG, "stream", PackageAware.LOG.stream)
+        PackageAware.LOG.redirect(output)
+
+        journal = self.resumed()
+        PackageAware.LOG.flush()
+
+        self.assertIsNone(journal.structure)
+        self.assertEqual(len(journal.uploaded), 0)
+        self.assertIn("Discarding upload journal: " + self.journal_file + ": " + reason, output.getvalue())
+
+    def resumed(self):
+        journal = PackageAwareUploadJournal(self.journal_file, self.context)
+        journal.load()
+        return journal
+
+    def test_resumes_the_structure_and_uploads_of_the_interrupted_run(self):
+        self.interrupted_run()
+
+        journal = self.resumed()
+
+        self.assertEqual(journal.structure_response().analysis_id, "analysis-1")
+        self.assertEqual(journal.structure_response().report_status_url, "https://api.example/status/analysis-1")
+        self.assertEqual(len(journal.uploaded), 1)
+        self.assertFalse(journal.started)
+
+    def test_records_the_start_of_the_analysis(self):
+        self.interrupted_run(started=True)
+
+        self.assertTrue(self.resumed().started)
+
+    def test_only_manifests_not_uploaded_are_sent_again(self):
+        self.interrupted_run()
+
+        package_aware = PackageAware()
+        package_aware.upload_journal = self.resumed()
+
+        pending_files, resumed_count = package_aware.skip_uploaded_manifests(self.manifests())
+
+        self.assertEqual([m['manifest_name'] for m in pending_files], ['package.json'])
+        self.assertEqual(resumed_count, 1)
+
+    def test_changed_manifests_are_sent_again(self):
+        self.interrupted_run()
+        self.write("requirements.txt", "requests==2.25.0\n")
+
+        package_aware = PackageAware()
+        package_aware.upload_journal = self.resumed()
+
+        pending_files, resumed_count = package_aware.skip_uploaded_manifests(self.manifests())
+
+        self.assertEqual(len(pending_files), 2)
+        self.assertEqual(resumed_count, 0)
+
+    def test_another_project_does_not_resume_the_journal(self):
+        self.interrupted_run()
+        self.context.project_name = "other"
+
+        self.assertIsNone(PackageAwareUploadJournal(self.journal_file, self.context).load())
+
+    def test_a_partly_written_last_line_is_ignored(self):
+        self.interrupted_run()
+        with open(self.journal_file, "a") as the_file:
+            the_file.write('{"event": "star')
+
+        journal = self.resumed()
+
+        self.assertIsNotNone(journal.structure)
+        self.assertFalse(journal.started)
+
+    def test_a_journal_past_the_age_bound_is_discarded(self):
+        self.interrupted_run()
+
+        def age(entry):
+            if entry["event"] == "structure":
+                entry["created_at"] -= PackageAwareUploadJournal.MAX_AGE_SECONDS + 1
+
+        self.rewrite_journal(age)
+
+        self.assert_discarded("the analysis was created on ")
+
+    def test_entries_of_another_analysis_discard_the_journal(self):
+        self.interrupted_run()
+
+        def other_analysis(entry):
+            if entry["event"] == "manifest":
+                entry["structure_id"] = "analysis-2"
+
+        self.rewrite_journal(other_analysis)
+
+        self.assert_discarded("it holds entries of another analysis")
+
+    def test_a_structure_id_that_does_not_match_discards_the_journal(self):
+        self.interrupted_run()
+
+        def mismatch(entry):
+            if entry["event"] == "structure":
+                entry["structure_id"] = "analysis-2"
+
+        self.rewrite_journal(mismatch)
+
+        self.assert_discarded("its structure id does not match its analysis id")
+
+    def test_finished_journal_is_removed(self):
+        self.interrupted_run()
+
+        journal = self.resumed()
+        journal.resume()
+        journal.finish()
+
+        self.assertFalse(os.path.exists(self.journal_file))
+        self.assertIsNone(self.resumed().structure)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from packageaware import PackageAware, PackageAwareModeOfOperation, PackageAwareVerdictCache  # noqa: E402
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, content_object=None):
+        self.status_code = status_code
+        self.headers = {}
+        self.content = json.dumps(content_object or {}).encode("utf-8")
+
+
+class VerdictCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.workspace = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.addCleanup(shutil.rmtree, self.workspace)
+
+        self.write("requirements.txt", "flask==1.0\n")
+        self.write("app/package.json", "{}")
+
+        self.package_aware = PackageAware()
+        self.package_aware.context.base_uri = "http://localhost/api/"
+        self.package_aware.context.client_id = "client"
+        self.package_aware.context.project_name = "project"
+        self.package_aware.context.source_code_path = self.root
+
+        script = self.package_aware.script
+        script.mode = PackageAwareModeOfOperation.RUN_AND_WAIT
+        script.directories_to_exclude = []
+        script.files_to_exclude = []
+        script.verdict_cache_enabled = True
+        script.verdict_cache_ttl = 60
+
+        self.package_aware.open_workspace_state(self.workspace)
+
+    def write(self, relative_path, content):
+        path = os.path.join(self.root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as the_file:
+            the_file.write(content)
+
+    def fingerprint(self):
+        return PackageAwareVerdictCache.fingerprint(self.root, self.package_aware.find_manifest_files())
+
+    def test_fingerprint_follows_manifest_content(self):
+        fingerprint = self.fingerprint()
+
+        self.assertEqual(self.fingerprint(), fingerprint)
+
+        self.write("requirements.txt", "flask==2.0\n")
+
+        self.assertNotEqual(self.fingerprint(), fingerprint)
+
+    def test_unchanged_manifests_reuse_the_last_result_without_api_calls(self):
+        self.package_aware.verdict_cache.record(self.fingerprint(), "failed_violations", 1, "http://report")
+
+        # No client: any API call would fail
+        self.assertEqual(self.package_aware.run_analysis(), 1)
+
+    def test_result_expires_after_the_ttl(self):
+        fingerprint = self.fingerprint()
+        self.package_aware.verdict_cache.record(fingerprint, "finished", 0, "http://report")
+
+        self.assertIsNotNone(self.package_aware.verdict_cache.lookup(fingerprint))
+
+        self.package_aware.verdict_cache.ttl_seconds = 0
+        time.sleep(0.01)
+
+        self.assertIsNone(self.package_aware.verdict_cache.lookup(fingerprint))
+
+    def test_only_results_decided_by_the_server_are_recorded(self):
+        fingerprint = self.fingerprint()
+
+        # Timed out or errored: no status from the server
+        self.package_aware.record_verdict(fingerprint, 1, "http://report")
+        self.assertIsNone(self.package_aware.verdict_cache.lookup(fingerprint))
+
+        self.package_aware.last_analysis_status = PackageAware.finished_analysis_status(
+            FakeResponse(200, {"status": "Finished"})
+        )
+        self.package_aware.upload_failures = 1
+        self.package_aware.record_verdict(fingerprint, 0, "http://report")
+        self.assertIsNone(self.package_aware.verdict_cache.lookup(fingerprint))
+
+        self.package_aware.upload_failures = 0
+        self.package_aware.record_verdict(fingerprint, 0, "http://report")
+        self.assertEqual(self.package_aware.verdict_cache.lookup(fingerprint)["status"], "finished")
+
+    def test_finished_analysis_status(self):
+        self.assertEqual(PackageAware.finished_analysis_status(FakeResponse(200, {"status": "Finished"})), "finished")
+        self.assertEqual(
+            PackageAware.finished_analysis_status(FakeResponse(200, {"status": "failed_vulnerabilities"})),
+            "failed_vulnerabilities"
+        )
+        self.assertIsNone(PackageAware.finished_analysis_status(FakeResponse(200, {"status": "running"})))
+        self.assertIsNone(PackageAware.finished_analysis_status(FakeResponse(500)))
+        self.assertIsNone(PackageAware.finished_analysis_status(None))
+
+
+if __name__ == "__main__":
+    unittest.main()